@@ -16,7 +16,25 @@ class BGPConfig(PluginConfig):
     default_settings = {
         'device_ext_page': 'right',
         'top_level_menu' : False,
+        # Extra configuration renderers, {name: path to a Jinja2 template}
+        'config_renderers': {},
+        # Lifetime of the rendered configurations in the cache, in seconds
+        'config_cache_timeout': 86400,
+        # Limits of the GraphQL list queries: nesting depth and estimated
+        # number of rows read. None disables a limit.
+        'graphql_max_depth': 8,
+        'graphql_max_cost': 100000,
+        # Maximum number of routes in a simulation request to the REST API
+        'simulation_max_routes': 10000,
+        # Directory holding the data of the background imports until they
+        # end, shared by the web servers and the workers. Defaults to a
+        # directory in the system temporary directory.
+        'import_directory': None,
     }
 
+    def ready(self):
+        super().ready()
+        from . import signals  # noqa: F401
+
 
 config = BGPConfig # noqa
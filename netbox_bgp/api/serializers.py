@@ -1,7 +1,10 @@
-from rest_framework.serializers import HyperlinkedIdentityField, ValidationError
+from rest_framework.serializers import (
+    CharField, HyperlinkedIdentityField, JSONField, ListField, Serializer, ValidationError,
+)
 from rest_framework.relations import PrimaryKeyRelatedField
 from netbox.api.fields import ChoiceField, SerializedPKRelatedField
 from netbox.api.serializers import NetBoxModelSerializer
+from netbox.plugins import get_plugin_config
 from ipam.api.serializers import IPAddressSerializer, ASNSerializer, PrefixSerializer
 from tenancy.api.serializers import TenantSerializer
 from dcim.api.serializers import SiteSerializer, DeviceSerializer
@@ -21,6 +24,7 @@ from netbox_bgp.models import (
 )
 
 from netbox_bgp.choices import CommunityStatusChoices, SessionStatusChoices
+from netbox_bgp.engine import Route
 
 
 class RoutingPolicySerializer(NetBoxModelSerializer):
@@ -96,6 +100,36 @@ class BGPPeerGroupSerializer(NetBoxModelSerializer):
         brief_fields = ("id", "url", "display", "name", "description")
 
 
+class PeerGroupPolicyResolver:
+    """
+    Serializes the policies of each peer group once and hands them out to
+    every session of that group, keyed by peer_group_id.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self._policies = {}
+
+    def get_policies(self, peer_group, field_name):
+        key = (peer_group.pk, field_name)
+        if key not in self._policies:
+            self._policies[key] = [
+                RoutingPolicySerializer(
+                    pol,
+                    context={"request": self.context["request"]},
+                    nested=True,
+                ).data
+                for pol in getattr(peer_group, field_name).all()
+            ]
+        return self._policies[key]
+
+    def inherited(self, peer_group, field_name, exclude=()):
+        return [
+            pol for pol in self.get_policies(peer_group, field_name)
+            if pol["id"] not in exclude
+        ]
+
+
 class BGPSessionSerializer(NetBoxModelSerializer):
     url = HyperlinkedIdentityField(view_name="plugins-api:netbox_bgp-api:bgpsession-detail")
     status = ChoiceField(choices=SessionStatusChoices, required=False)
@@ -160,28 +194,21 @@ class BGPSessionSerializer(NetBoxModelSerializer):
     def to_representation(self, instance):
         ret = super().to_representation(instance)
 
-        if instance is not None:
-            if instance.peer_group:
-                for pol in instance.peer_group.import_policies.difference(
-                    instance.import_policies.all()
-                ):
-                    ret["import_policies"].append(
-                        RoutingPolicySerializer(
-                            pol,
-                            context={"request": self.context["request"]},
-                            nested=True,
-                        ).data
-                    )
-                for pol in instance.peer_group.export_policies.difference(
-                    instance.export_policies.all()
-                ):
-                    ret["export_policies"].append(
-                        RoutingPolicySerializer(
-                            pol,
-                            context={"request": self.context["request"]},
-                            nested=True,
-                        ).data
+        if instance is not None and instance.peer_group:
+            # One resolver is shared by every row serialized within the same context
+            if "peer_group_policies" not in self.context:
+                self.context["peer_group_policies"] = PeerGroupPolicyResolver(self.context)
+            resolver = self.context["peer_group_policies"]
+            for field_name in ("import_policies", "export_policies"):
+                if field_name not in ret:
+                    continue
+                ret[field_name].extend(
+                    resolver.inherited(
+                        instance.peer_group,
+                        field_name,
+                        exclude={pol["id"] for pol in ret[field_name]},
                     )
+                )
         return ret
 
 
@@ -335,3 +362,41 @@ class PrefixListRuleSerializer(NetBoxModelSerializer):
             "comments",
         )
         brief_fields = ("id", "display", "description")
+
+
+class RouteSimulationSerializer(Serializer):
+    routes = ListField(
+        child=JSONField(),
+        allow_empty=False,
+        help_text='Routes, e.g. {"prefix": "10.0.0.0/8", "communities": ["65000:1"], "as_path": [65001], "med": 0}',
+    )
+
+    def to_internal_value(self, data):
+        # Checked before the routes are validated one by one
+        max_routes = get_plugin_config('netbox_bgp', 'simulation_max_routes')
+        routes = data.get('routes') if isinstance(data, dict) else None
+        if max_routes and isinstance(routes, list) and len(routes) > max_routes:
+            raise ValidationError({
+                'routes': f"At most {max_routes} routes can be simulated at once, split them in batches"
+            })
+        return super().to_internal_value(data)
+
+    def validate_routes(self, value):
+        try:
+            return [Route.from_dict(route) for route in value]
+        except (TypeError, ValueError) as e:
+            raise ValidationError(str(e))
+
+
+class CommunityMatchSerializer(Serializer):
+    community_sets = ListField(
+        child=ListField(child=CharField()),
+        allow_empty=False,
+        help_text='Sets of communities carried by routes, e.g. [["65000:1", "65000:100:1"], ["65001:20"]]',
+    )
+
+
+class RenderedConfigSerializer(Serializer):
+    renderer = CharField(read_only=True)
+    content_hash = CharField(read_only=True)
+    config = CharField(read_only=True)
@@ -1,9 +1,13 @@
+from django.urls import path
+
 from netbox.api.routers import NetBoxRouter
 
 from .views import (
     BGPSessionViewSet, RoutingPolicyViewSet, BGPPeerGroupViewSet, CommunityViewSet,
     PrefixListViewSet, PrefixListRuleViewSet, RoutingPolicyRuleViewSet,
-    CommunityListViewSet, CommunityListRuleViewSet, RootView
+    CommunityListViewSet, CommunityListRuleViewSet, RootView, RoutingPolicySimulateView,
+    CommunityListMatchView, DeviceRenderConfigView, VirtualMachineRenderConfigView,
+    BGPSessionExportView, PrefixListRuleExportView, RoutingPolicyRuleExportView, ChangesView,
 )
 
 
@@ -21,4 +25,30 @@ router.register('prefix-list-rule', PrefixListRuleViewSet)
 router.register('community-list', CommunityListViewSet)
 router.register('community-list-rule', CommunityListRuleViewSet)
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('changes/', ChangesView.as_view(), name='changes'),
+    path('session/export/', BGPSessionExportView.as_view(), name='session-export'),
+    path('prefix-list-rule/export/', PrefixListRuleExportView.as_view(), name='prefixlistrule-export'),
+    path('routing-policy-rule/export/', RoutingPolicyRuleExportView.as_view(), name='routingpolicyrule-export'),
+    path(
+        'routing-policy/<int:pk>/simulate/',
+        RoutingPolicySimulateView.as_view(),
+        name='routingpolicy-simulate'
+    ),
+    path(
+        'community-list/<int:pk>/match/',
+        CommunityListMatchView.as_view(),
+        name='communitylist-match'
+    ),
+    path(
+        'config/device/<int:pk>/',
+        DeviceRenderConfigView.as_view(),
+        name='device-config'
+    ),
+    path(
+        'config/virtual-machine/<int:pk>/',
+        VirtualMachineRenderConfigView.as_view(),
+        name='virtualmachine-config'
+    ),
+]
+urlpatterns += router.urls
@@ -1,10 +1,38 @@
+import base64
+import hashlib
+import json
+import operator
+from datetime import timedelta, timezone as dt_timezone
+from functools import reduce
+
+from core.choices import ObjectChangeActionChoices
+from core.models import ObjectChange
+from dcim.models import Device
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max, Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from netbox.api.authentication import IsAuthenticatedOrLoginNotRequired
 from netbox.api.viewsets import NetBoxModelViewSet
+from netbox.config import get_config
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
 from rest_framework.routers import APIRootView
+from users.constants import CONSTRAINT_TOKEN_USER
+from utilities.api import get_annotations_for_serializer, get_prefetches_for_serializer
+from utilities.permissions import get_permission_for_model, permission_is_exempt
+from virtualization.models import VirtualMachine
 
 from .serializers import (
     BGPSessionSerializer, RoutingPolicySerializer, BGPPeerGroupSerializer,
     CommunitySerializer, PrefixListSerializer, PrefixListRuleSerializer,
-    RoutingPolicyRuleSerializer, CommunityListSerializer, CommunityListRuleSerializer
+    RoutingPolicyRuleSerializer, CommunityListSerializer, CommunityListRuleSerializer,
+    RouteSimulationSerializer, CommunityMatchSerializer, RenderedConfigSerializer,
 )
 from netbox_bgp.models import (
     BGPSession, RoutingPolicy, BGPPeerGroup,
@@ -16,61 +44,459 @@ from netbox_bgp.filtersets import (
     CommunityFilterSet, PrefixListFilterSet, PrefixListRuleFilterSet,
     RoutingPolicyRuleFilterSet, CommunityListFilterSet, CommunityListRuleFilterSet
 )
+from netbox_bgp.engine import compile_routing_policies, get_community_list_matchers
+from netbox_bgp.exporters import (
+    BGPSessionExporter, PrefixListRuleExporter, RoutingPolicyRuleExporter, gzip_stream,
+)
+from netbox_bgp.rendering import get_content_hash, get_renderers, load_context, render_context
 
 class RootView(APIRootView):
     def get_view_name(self):
         return 'BGP'
-    
 
-class BGPSessionViewSet(NetBoxModelViewSet):
-    queryset = BGPSession.objects.all()
+
+def etag_matches(request, etag):
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    return '*' in etags or etag in etags
+
+
+class ConditionalGetMixin:
+    """
+    Send an ETag with list and detail responses and answer 304 Not Modified
+    when the client already has it, before any object is serialized.
+
+    The ETag is computed with a single aggregate query, from the number of
+    objects matching the request and their latest last_updated, along with
+    the request URL, the accepted media type and the user (the objects are
+    restricted by permissions). Changes to the related objects nested in a
+    response, such as a device name, do not change it.
+    """
+
+    def get_etag(self, request, queryset):
+        # The annotations of the serializer are not needed to count the rows
+        stats = queryset.order_by().values('pk').aggregate(count=Count('pk'), last_updated=Max('last_updated'))
+        if not stats['count']:
+            return None
+        key = [
+            self.queryset.model._meta.label,
+            stats['count'],
+            stats['last_updated'].isoformat(),
+            request.user.pk,
+            request.get_full_path(),
+            request.headers.get('Accept', ''),
+        ]
+        return '"{}"'.format(hashlib.sha256(json.dumps(key).encode()).hexdigest()[:40])
+
+    def conditional_response(self, request, queryset, view, *args, **kwargs):
+        etag = self.get_etag(request, queryset)
+        if etag and etag_matches(request, etag):
+            return Response(status=304, headers={'ETag': etag})
+        response = view(request, *args, **kwargs)
+        if etag and response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # The rows the response would hold, restricted to those the user can view
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(request, queryset, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        queryset = self.get_queryset().filter(**{self.lookup_field: lookup})
+        return self.conditional_response(request, queryset, super().retrieve, *args, **kwargs)
+
+
+class BGPSessionViewSet(ConditionalGetMixin, NetBoxModelViewSet):
+    queryset = BGPSession.objects.select_related(
+        'site', 'tenant', 'device', 'virtualmachine',
+        'local_address', 'remote_address', 'local_as', 'remote_as',
+        'peer_group', 'prefix_list_in', 'prefix_list_out',
+    ).prefetch_related(
+        'tags', 'import_policies', 'export_policies',
+        'peer_group__import_policies', 'peer_group__export_policies',
+    )
     serializer_class = BGPSessionSerializer
     filterset_class = BGPSessionFilterSet
 
 
-class RoutingPolicyViewSet(NetBoxModelViewSet):
+class RoutingPolicyViewSet(ConditionalGetMixin, NetBoxModelViewSet):
     queryset = RoutingPolicy.objects.all()
     serializer_class = RoutingPolicySerializer
     filterset_class = RoutingPolicyFilterSet
 
 
-class RoutingPolicyRuleViewSet(NetBoxModelViewSet):
+class RoutingPolicySimulateView(GenericAPIView):
+    """
+    Apply a routing policy to a batch of routes and return, for each route, the
+    action, the matched rules and the rewritten attributes. Nothing is saved,
+    so viewing the policy is the only permission required.
+    """
+    queryset = RoutingPolicy.objects.all()
+    serializer_class = RouteSimulationSerializer
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+
+    def post(self, request, pk):
+        policy = get_object_or_404(RoutingPolicy.objects.restrict(request.user, 'view'), pk=pk)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        compiled = compile_routing_policies([policy])[policy.pk]
+        results = compiled.evaluate_many(serializer.validated_data['routes'])
+        return Response({
+            'warnings': compiled.warnings,
+            'results': [result.to_dict() for result in results],
+        })
+
+
+class RoutingPolicyRuleViewSet(ConditionalGetMixin, NetBoxModelViewSet):
     queryset = RoutingPolicyRule.objects.all()
     serializer_class = RoutingPolicyRuleSerializer
     filterset_class = RoutingPolicyRuleFilterSet
 
 
-class BGPPeerGroupViewSet(NetBoxModelViewSet):
+class BGPPeerGroupViewSet(ConditionalGetMixin, NetBoxModelViewSet):
     queryset = BGPPeerGroup.objects.all()
     serializer_class = BGPPeerGroupSerializer
     filterset_class = BGPPeerGroupFilterSet
 
 
-class CommunityViewSet(NetBoxModelViewSet):
+class CommunityViewSet(ConditionalGetMixin, NetBoxModelViewSet):
     queryset = Community.objects.all()
     serializer_class = CommunitySerializer
     filterset_class = CommunityFilterSet
 
 
-class CommunityListViewSet(NetBoxModelViewSet):
+class CommunityListViewSet(ConditionalGetMixin, NetBoxModelViewSet):
     queryset = CommunityList.objects.all()
     serializer_class = CommunityListSerializer
     filterset_class = CommunityListFilterSet
 
 
-class CommunityListRuleViewSet(NetBoxModelViewSet):
+class CommunityListMatchView(GenericAPIView):
+    """
+    Tell whether a community list matches each of the given community sets.
+    """
+    queryset = CommunityList.objects.all()
+    serializer_class = CommunityMatchSerializer
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+
+    def post(self, request, pk):
+        community_list = get_object_or_404(CommunityList.objects.restrict(request.user, 'view'), pk=pk)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        community_sets = serializer.validated_data['community_sets']
+        matcher = get_community_list_matchers([community_list])[community_list.pk]
+        return Response({
+            'results': [
+                {'communities': communities, 'match': match}
+                for communities, match in zip(community_sets, matcher.match_many(community_sets))
+            ],
+        })
+
+
+class CommunityListRuleViewSet(ConditionalGetMixin, NetBoxModelViewSet):
     queryset = CommunityListRule.objects.all()
     serializer_class = CommunityListRuleSerializer
     filterset_class = CommunityListRuleFilterSet
 
 
-class PrefixListViewSet(NetBoxModelViewSet):
+class PrefixListViewSet(ConditionalGetMixin, NetBoxModelViewSet):
     queryset = PrefixList.objects.all()
     serializer_class = PrefixListSerializer
     filterset_class = PrefixListFilterSet
 
 
-class PrefixListRuleViewSet(NetBoxModelViewSet):
+class PrefixListRuleViewSet(ConditionalGetMixin, NetBoxModelViewSet):
     queryset = PrefixListRule.objects.all()
     serializer_class = PrefixListRuleSerializer
     filterset_class = PrefixListRuleFilterSet
+
+
+class RenderConfigView(GenericAPIView):
+    """
+    Render the BGP configuration of a device or virtual machine. The renderer
+    is chosen with the `renderer` query parameter (frr by default). Only the
+    sessions the user is allowed to view are rendered.
+    """
+    serializer_class = RenderedConfigSerializer
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+    model = None
+    object_field = None
+
+    def get_queryset(self):
+        return self.model.objects.restrict(self.request.user, 'view')
+
+    def get(self, request, pk):
+        obj = get_object_or_404(self.get_queryset(), pk=pk)
+        renderer = request.query_params.get('renderer', 'frr')
+        if renderer not in get_renderers():
+            raise ValidationError({'renderer': f"Unknown renderer, choose from: {', '.join(get_renderers())}"})
+
+        context = load_context(
+            sessions=BGPSession.objects.restrict(request.user, 'view'),
+            **{self.object_field: obj}
+        )
+        # The content hash covers everything the configuration depends on
+        etag = '"{}"'.format(get_content_hash(renderer, context))
+        if etag_matches(request, etag):
+            return Response(status=304, headers={'ETag': etag})
+
+        content_hash, config = render_context(renderer, context)
+        serializer = self.get_serializer({
+            'renderer': renderer,
+            'content_hash': content_hash,
+            'config': config,
+        })
+        return Response(serializer.data, headers={'ETag': etag})
+
+
+class DeviceRenderConfigView(RenderConfigView):
+    model = Device
+    object_field = 'device'
+
+
+class VirtualMachineRenderConfigView(RenderConfigView):
+    model = VirtualMachine
+    object_field = 'virtualmachine'
+
+
+class ExportView(GenericAPIView):
+    """
+    Stream all the objects matching the filters as newline-delimited JSON, or
+    as CSV with `?output=csv`. The response is compressed with gzip when the
+    client accepts it.
+    """
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+    exporter = None
+    filterset_class = None
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+
+    def get_queryset(self):
+        return self.exporter.model.objects.restrict(self.request.user, 'view')
+
+    def get(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in self.content_types:
+            raise ValidationError({'output': f"Choose from: {', '.join(self.content_types)}"})
+        filterset = self.filterset_class(request.query_params, queryset=self.get_queryset(), request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        exporter = self.exporter()
+        content = getattr(exporter, output)(filterset.qs)
+        filename = f'{exporter.model._meta.model_name}.{output}'
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = StreamingHttpResponse(gzip_stream(content), content_type=self.content_types[output])
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = StreamingHttpResponse(content, content_type=self.content_types[output])
+        response['Vary'] = 'Accept-Encoding'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class BGPSessionExportView(ExportView):
+    exporter = BGPSessionExporter
+    filterset_class = BGPSessionFilterSet
+
+
+class PrefixListRuleExportView(ExportView):
+    exporter = PrefixListRuleExporter
+    filterset_class = PrefixListRuleFilterSet
+
+
+class RoutingPolicyRuleExportView(ExportView):
+    exporter = RoutingPolicyRuleExporter
+    filterset_class = RoutingPolicyRuleFilterSet
+
+
+class ChangesView(GenericAPIView):
+    """
+    Return the BGP objects created, updated and deleted since the `since`
+    timestamp, e.g. to keep a local copy in sync. Each response holds a
+    `cursor` to pass as `since` in the next request.
+
+    Objects are found by their last_updated timestamp and deletions in the
+    change log, both indexed, so the cost of a request depends on the number
+    of changes rather than on the size of the tables. Changes may be returned
+    more than once: the cursor stays a little behind the current time to
+    catch the transactions which were not yet committed. When a model has
+    more than `limit` changes, the cursor points at the last one returned,
+    by time and primary key, so that changes sharing a timestamp are paged
+    through too.
+    """
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+    viewsets = (
+        BGPSessionViewSet, BGPPeerGroupViewSet, RoutingPolicyViewSet, RoutingPolicyRuleViewSet,
+        PrefixListViewSet, PrefixListRuleViewSet, CommunityViewSet, CommunityListViewSet,
+        CommunityListRuleViewSet,
+    )
+    # Lag of the cursor behind the current time
+    commit_window = timedelta(seconds=60)
+    default_limit = 1000
+    # Lookups of the view permission constraints which can be applied to the
+    # data of deleted objects in the change log
+    deletion_lookups = ('exact', 'iexact', 'in')
+
+    @staticmethod
+    def encode_cursor(since, after):
+        data = json.dumps({'since': since.isoformat(), 'after': after})
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(value):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(value.encode()))
+            return parse_datetime(data['since']), {str(k): int(v) for k, v in data['after'].items()}
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None, {}
+
+    def get_since(self, request, now):
+        """
+        Return the time from which changes are returned and, for the models
+        (and "deleted") whose changes at that time were partly returned, the
+        primary key of the last one.
+        """
+        value = request.query_params.get('since')
+        since, after = (parse_datetime(value) if value else None), {}
+        if value and since is None:
+            since, after = self.decode_cursor(value)
+        if since is None:
+            raise ValidationError({'since': "An ISO 8601 timestamp or the cursor of a previous response is required"})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, dt_timezone.utc)
+        retention = get_config().CHANGELOG_RETENTION
+        if retention and since < now - timedelta(days=retention):
+            raise ValidationError({
+                'since': "Deletions this old are no longer in the change log, the objects must be fetched again"
+            })
+        return since, after
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            raise ValidationError({'limit': "An integer is required"})
+        return max(1, min(limit, get_config().MAX_PAGE_SIZE or limit))
+
+    @staticmethod
+    def get_time_filter(field, since, after):
+        if after is None:
+            return Q(**{f'{field}__gte': since})
+        # The changes at the time of the cursor were returned up to its key
+        return Q(**{f'{field}__gt': since}) | Q(**{field: since, 'pk__gt': after})
+
+    def get_deletion_filter(self, user, model):
+        """
+        Return the filter of the deletions of a model visible to the user, or
+        None if none are. Deleted objects are no longer in their table, so the
+        constraints of the view permissions are applied to their data in the
+        change log. Constraints spanning relations or using other lookups
+        cannot be, and hide the deletions they apply to.
+        """
+        permission = get_permission_for_model(model, 'view')
+        if user.is_superuser or permission_is_exempt(permission):
+            return Q()
+        if not user.is_authenticated or permission not in user.get_all_permissions():
+            return None
+
+        conditions = []
+        for constraint in user._object_perm_cache[permission]:
+            if not constraint:
+                return Q()
+            lookups = {}
+            for key, value in constraint.items():
+                name, _, lookup = key.partition('__')
+                try:
+                    field = model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    break
+                if not field.concrete or field.many_to_many or (lookup or 'exact') not in self.deletion_lookups:
+                    break
+                if isinstance(value, list):
+                    value = [user.pk if v == CONSTRAINT_TOKEN_USER else v for v in value]
+                elif value == CONSTRAINT_TOKEN_USER:
+                    value = user.pk
+                # The change log data holds the fields but the primary key
+                path = 'changed_object_id' if field.primary_key else f'prechange_data__{name}'
+                lookups[f'{path}__{lookup}' if lookup else path] = value
+            else:
+                conditions.append(Q(**lookups))
+        return reduce(operator.or_, conditions) if conditions else None
+
+    def get(self, request):
+        now = timezone.now()
+        since, after = self.get_since(request, now)
+        limit = self.get_limit(request)
+        requested = set(request.query_params.getlist('model'))
+        viewsets = {
+            viewset.queryset.model: viewset for viewset in self.viewsets
+            if not requested or viewset.queryset.model._meta.model_name in requested
+        }
+
+        created, updated, deleted = {}, {}, {}
+        # (time, key, pk) of the last change returned by the truncated lists
+        cursors = []
+        for model, viewset in viewsets.items():
+            serializer_class = viewset.serializer_class
+            name = model._meta.model_name
+            queryset = viewset.queryset.restrict(request.user, 'view').filter(
+                self.get_time_filter('last_updated', since, after.get(name))
+            ).prefetch_related(
+                *get_prefetches_for_serializer(serializer_class)
+            ).annotate(
+                **get_annotations_for_serializer(serializer_class)
+            ).order_by('last_updated', 'pk')
+            objects = list(queryset[:limit + 1])
+            if len(objects) > limit:
+                objects = objects[:limit]
+                cursors.append((objects[-1].last_updated, name, objects[-1].pk))
+            context = {'request': request}
+            created[name] = serializer_class(
+                [obj for obj in objects if obj.created >= since], many=True, context=context
+            ).data
+            updated[name] = serializer_class(
+                [obj for obj in objects if obj.created < since], many=True, context=context
+            ).data
+
+        # Deleted objects are only known to the change log
+        content_types, visible = {}, Q()
+        for model, content_type in ContentType.objects.get_for_models(*viewsets).items():
+            deletion_filter = self.get_deletion_filter(request.user, model)
+            if deletion_filter is not None:
+                content_types[content_type.pk] = model
+                visible |= Q(changed_object_type=content_type) & deletion_filter
+        deletions = []
+        if content_types:
+            deletions = list(ObjectChange.objects.filter(
+                visible,
+                self.get_time_filter('time', since, after.get('deleted')),
+                action=ObjectChangeActionChoices.ACTION_DELETE,
+            ).order_by('time', 'pk').values_list('changed_object_type', 'changed_object_id', 'time', 'pk')[:limit + 1])
+        if len(deletions) > limit:
+            deletions = deletions[:limit]
+            cursors.append((deletions[-1][2], 'deleted', deletions[-1][3]))
+        for model in content_types.values():
+            deleted[model._meta.model_name] = []
+        for content_type, object_id, _, _ in deletions:
+            deleted[content_types[content_type]._meta.model_name].append(object_id)
+
+        complete = not cursors
+        if cursors:
+            cursor = min(time for time, _, _ in cursors)
+            cursor_after = {key: pk for time, key, pk in cursors if time == cursor}
+        else:
+            cursor, cursor_after = max(since, now - self.commit_window), {}
+        return Response({
+            'since': since,
+            'cursor': self.encode_cursor(cursor, cursor_after),
+            'complete': complete,
+            'created': created,
+            'updated': updated,
+            'deleted': deleted,
+        })
@@ -88,3 +88,25 @@ class IPAddressFamilyChoices(ChoiceSet):
         (FAMILY_4, 'IPv4'),
         (FAMILY_6, 'IPv6'),
     )
+
+
+class PolicyDirectionChoices(ChoiceSet):
+
+    DIRECTION_IMPORT = 'import'
+    DIRECTION_EXPORT = 'export'
+
+    CHOICES = (
+        (DIRECTION_IMPORT, 'Import'),
+        (DIRECTION_EXPORT, 'Export'),
+    )
+
+
+class PolicySourceChoices(ChoiceSet):
+
+    SOURCE_SESSION = 'session'
+    SOURCE_PEER_GROUP = 'peer_group'
+
+    CHOICES = (
+        (SOURCE_SESSION, 'Session'),
+        (SOURCE_PEER_GROUP, 'Peer Group'),
+    )
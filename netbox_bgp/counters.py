@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import BGPSession
+
+
+__all__ = (
+    'get_session_counts',
+    'invalidate_session_counts',
+)
+
+COUNTS_KEY = 'netbox_bgp:session_counts:{}:{}'
+
+# The fields linking sessions to their parents, by parent model name
+PARENT_FIELDS = {
+    'device': 'device',
+    'virtualmachine': 'virtualmachine',
+}
+
+
+def get_session_counts(obj):
+    """
+    Return the number of sessions of a device or virtual machine by status, as
+    a {status: count} dict. Counts are cached until a session of the object
+    changes, so reading them costs one cache lookup.
+    """
+    field = PARENT_FIELDS[obj._meta.model_name]
+    key = COUNTS_KEY.format(field, obj.pk)
+    counts = cache.get(key)
+    if counts is None:
+        counts = dict(
+            BGPSession.objects.filter(**{field: obj.pk}).order_by().values_list('status').annotate(Count('pk'))
+        )
+        cache.set(key, counts, timeout=None)
+    return counts
+
+
+def invalidate_session_counts(device_ids=(), virtualmachine_ids=()):
+    keys = [
+        COUNTS_KEY.format(field, pk)
+        for field, pks in (('device', device_ids), ('virtualmachine', virtualmachine_ids))
+        for pk in set(pks) - {None}
+    ]
+    if keys:
+        cache.delete_many(keys)
+        # Counts read by other requests before the changes were committed
+        transaction.on_commit(lambda: cache.delete_many(keys))
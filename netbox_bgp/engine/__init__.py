@@ -0,0 +1,19 @@
+from .community_list import (
+    CommunityListMatcher, compile_community_lists, get_community_list_matchers, invalidate_community_lists,
+)
+from .prefix_list import PrefixListTrie, compile_prefix_lists, parse_prefix
+from .route_map import CompiledPolicy, Route, RouteResult, compile_routing_policies
+
+__all__ = (
+    'CommunityListMatcher',
+    'CompiledPolicy',
+    'PrefixListTrie',
+    'Route',
+    'RouteResult',
+    'compile_community_lists',
+    'compile_prefix_lists',
+    'compile_routing_policies',
+    'get_community_list_matchers',
+    'invalidate_community_lists',
+    'parse_prefix',
+)
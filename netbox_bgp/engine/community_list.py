@@ -0,0 +1,262 @@
+import re
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+__all__ = (
+    'CommunityListMatcher',
+    'compile_community_lists',
+    'compile_community_pattern',
+    'get_community_list_matchers',
+    'invalidate_community_lists',
+    'range_to_regex',
+)
+
+
+def _same_length_range(low, high):
+    # Regex alternatives matching the numbers between two strings of equal length
+    if len(low) == 1:
+        return [low if low == high else f'[{low}-{high}]']
+    if low[0] == high[0]:
+        return [low[0] + part for part in _same_length_range(low[1:], high[1:])]
+
+    rest = len(low) - 1
+    parts = []
+    first, last = int(low[0]), int(high[0])
+    if low[1:] != '0' * rest:
+        parts += [low[0] + part for part in _same_length_range(low[1:], '9' * rest)]
+        first += 1
+    tail = []
+    if high[1:] != '9' * rest:
+        tail = [high[0] + part for part in _same_length_range('0' * rest, high[1:])]
+        last -= 1
+    if first <= last:
+        digit = str(first) if first == last else f'[{first}-{last}]'
+        parts.append(digit + r'\d' * rest if rest < 3 else f'{digit}\\d{{{rest}}}')
+    return parts + tail
+
+
+def range_to_regex(low, high):
+    """
+    Return a regular expression (without anchors) matching the decimal
+    representation of the integers between low and high, inclusive.
+    """
+    if low < 0 or low > high:
+        raise ValueError(f"Invalid range: {low}-{high}")
+    parts = []
+    start = low
+    while start <= high:
+        end = min(high, 10 ** len(str(start)) - 1)
+        parts += _same_length_range(str(start), str(end))
+        start = end + 1
+    return parts[0] if len(parts) == 1 else f"(?:{'|'.join(parts)})"
+
+
+FIELD_RE = re.compile(r'^(?:[\d.*]+|\d+-\d+)$')
+
+# Bound on the memoized positions and verdicts of a matcher
+MEMO_SIZE = 65536
+
+
+def compile_community_pattern(value):
+    """
+    Return the regular expression (without anchors) matching a community value,
+    or None if the value is a literal community. Values are standard (a:b) or
+    large (a:b:c) communities where each field is a number, a range (100-199)
+    or a wildcard: "*" matches any number of digits and "." a single digit.
+    """
+    fields = value.strip().split(':')
+    if len(fields) not in (2, 3) or not all(FIELD_RE.match(field) for field in fields):
+        raise ValueError(f"Invalid community: {value}")
+    if all(field.isdigit() for field in fields):
+        return None
+
+    parts = []
+    for field in fields:
+        if '-' in field:
+            low, high = field.split('-')
+            parts.append(range_to_regex(int(low), int(high)))
+        elif field == '*':
+            parts.append(r'\d+')
+        else:
+            parts.append(field.replace('.', r'\d').replace('*', r'\d*'))
+    return ':'.join(parts)
+
+
+class CommunityListMatcher:
+    """
+    A compiled community list.
+
+    Rules are evaluated in order and the first rule matching one of the route's
+    communities decides: the list matches if that rule permits. A route matched
+    by no rule does not match the list.
+
+    Literal communities are looked up in a dict. Wildcard and range rules are
+    compiled into a single anchored regular expression with one capturing group
+    per rule; as alternatives are tried in order, the group which matched is
+    the first wildcard rule matching the community. The position of the first
+    rule matching each community is memoized, as are the verdicts per set of
+    communities.
+    """
+
+    def __init__(self, rules=()):
+        self._literals = {}
+        self._patterns = []
+        self._actions = []
+        self._regex = None
+        self._positions = {}
+        self._verdicts = {}
+        for action, community in rules:
+            self.add(action, community)
+
+    def add(self, action, community):
+        position = len(self._actions)
+        self._actions.append(action == 'permit')
+        try:
+            pattern = compile_community_pattern(community)
+        except ValueError:
+            # Values the model validator lets through but which are no valid
+            # pattern can still match a community verbatim
+            pattern = None
+        if pattern is None:
+            self._literals.setdefault(community.strip(), position)
+        else:
+            self._patterns.append((position, pattern))
+        self._regex = None
+        self._positions.clear()
+        self._verdicts.clear()
+
+    def _compile(self):
+        if not self._patterns:
+            return None
+        return re.compile(
+            '^(?:' + '|'.join(f'({pattern})' for _, pattern in self._patterns) + ')$'
+        )
+
+    def position(self, community):
+        """
+        Return the position of the first rule matching a community, or None.
+        """
+        try:
+            return self._positions[community]
+        except KeyError:
+            pass
+        position = self._literals.get(community)
+        if self._patterns:
+            if self._regex is None:
+                self._regex = self._compile()
+            match = self._regex.match(community)
+            if match is not None:
+                pattern_position = self._patterns[match.lastindex - 1][0]
+                if position is None or pattern_position < position:
+                    position = pattern_position
+        if len(self._positions) >= MEMO_SIZE:
+            self._positions.clear()
+        self._positions[community] = position
+        return position
+
+    def matches(self, communities):
+        """
+        Return True if the list matches a route carrying the given communities
+        (any iterable of strings, ideally a frozenset).
+        """
+        try:
+            return self._verdicts[communities]
+        except (KeyError, TypeError):
+            pass
+        first = None
+        for community in communities:
+            position = self.position(community)
+            if position is not None and (first is None or position < first):
+                first = position
+        verdict = first is not None and self._actions[first]
+        if isinstance(communities, frozenset):
+            if len(self._verdicts) >= MEMO_SIZE:
+                self._verdicts.clear()
+            self._verdicts[communities] = verdict
+        return verdict
+
+    def match_many(self, community_sets):
+        """
+        Return a list of booleans telling whether the list matches each set.
+        """
+        matches = self.matches
+        return [matches(frozenset(communities)) for communities in community_sets]
+
+    def __len__(self):
+        return len(self._actions)
+
+
+def compile_community_lists(community_lists):
+    """
+    Compile several community lists at once, reading all of their rules in a
+    single query. Accepts CommunityList instances or primary keys and returns
+    a {pk: CommunityListMatcher} mapping.
+    """
+    from netbox_bgp.models import CommunityListRule
+
+    pks = [getattr(community_list, 'pk', community_list) for community_list in community_lists]
+    matchers = {pk: CommunityListMatcher() for pk in pks}
+    rules = CommunityListRule.objects.filter(
+        community_list__in=pks
+    ).select_related('community').order_by('community_list', 'pk')
+    for rule in rules:
+        matchers[rule.community_list_id].add(rule.action, rule.community.value)
+    return matchers
+
+
+#
+# Compiled matchers are kept per process and validated against a version
+# stored in the shared cache, which the signals change whenever a rule or a
+# community used by the list is modified.
+#
+
+VERSION_KEY = 'netbox_bgp.community_list.{}.version'
+_compiled = {}
+
+
+def _bump_versions(keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def invalidate_community_lists(pks):
+    keys = [VERSION_KEY.format(pk) for pk in pks]
+    if keys:
+        _bump_versions(keys)
+        # Matchers compiled by other processes before the changes were committed
+        transaction.on_commit(lambda: _bump_versions(keys))
+
+
+def get_community_list_matchers(community_lists):
+    """
+    Return a {pk: CommunityListMatcher} mapping like compile_community_lists(),
+    reusing the matchers compiled earlier by this process when the lists have
+    not changed since. Costs one cache lookup when nothing changed.
+    """
+    pks = [getattr(community_list, 'pk', community_list) for community_list in community_lists]
+    keys = {pk: VERSION_KEY.format(pk) for pk in pks}
+    versions = cache.get_many(keys.values())
+
+    missing = {pk: uuid.uuid4().hex for pk in pks if keys[pk] not in versions}
+    if missing:
+        # add() keeps a version set concurrently by another process
+        for pk, version in missing.items():
+            if not cache.add(keys[pk], version, timeout=None):
+                version = cache.get(keys[pk], version)
+            versions[keys[pk]] = version
+
+    matchers = {}
+    stale = []
+    for pk in pks:
+        version, matcher = _compiled.get(pk, (None, None))
+        if version == versions[keys[pk]]:
+            matchers[pk] = matcher
+        else:
+            stale.append(pk)
+    if stale:
+        for pk, matcher in compile_community_lists(stale).items():
+            _compiled[pk] = (versions[keys[pk]], matcher)
+            matchers[pk] = matcher
+    return matchers
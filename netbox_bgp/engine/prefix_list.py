@@ -0,0 +1,203 @@
+import ipaddress
+import socket
+
+import netaddr
+
+
+__all__ = (
+    'PrefixListTrie',
+    'compile_prefix_lists',
+    'parse_prefix',
+)
+
+
+MAX_LENGTH = {
+    4: 32,
+    6: 128,
+}
+
+
+def parse_prefix(value):
+    """
+    Return a prefix as a (version, network, length) tuple. Accepts strings
+    ("10.0.0.0/8", "2001:db8::/32", or a bare address for a host route),
+    netaddr and ipaddress networks, or an already parsed tuple. Host bits are
+    cleared, as a router would do.
+    """
+    if isinstance(value, tuple):
+        version, network, length = value
+    elif isinstance(value, str):
+        address, _, length = value.strip().partition('/')
+        if ':' in address:
+            version, family = 6, socket.AF_INET6
+        else:
+            version, family = 4, socket.AF_INET
+        try:
+            network = int.from_bytes(socket.inet_pton(family, address), 'big')
+        except OSError:
+            raise ValueError(f"Invalid prefix: {value}")
+        length = int(length) if length else MAX_LENGTH[version]
+    elif isinstance(value, netaddr.IPNetwork):
+        version, network, length = value.version, value.value, value.prefixlen
+    elif isinstance(value, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        version, network, length = value.version, int(value.network_address), value.prefixlen
+    else:
+        raise TypeError(f"Unsupported prefix type: {type(value).__name__}")
+
+    host_bits = MAX_LENGTH[version] - length
+    if host_bits < 0 or length < 0:
+        raise ValueError(f"Invalid prefix length: {value}")
+    return version, network >> host_bits << host_bits, length
+
+
+class PrefixListTrie:
+    """
+    A compiled prefix list.
+
+    Rules are stored in a radix trie which only materialises the levels (prefix
+    lengths) that carry a rule. Each level maps the network bits down to that
+    length to the rules anchored there. Looking up a prefix walks the levels no
+    longer than the prefix, so the cost is bounded by the prefix length and in
+    practice is one dict probe per distinct rule length.
+
+    Semantics follow the usual prefix-list implementations: a rule without ge
+    and le only matches its exact prefix, ge alone extends the range up to the
+    maximum length of the family, le alone starts the range at the rule's own
+    length. The rule with the lowest index wins and anything unmatched is
+    implicitly denied.
+    """
+
+    def __init__(self, rules=()):
+        # {version: {length: {network >> host_bits: [(index, ge, le, permit), ...]}}}
+        self._levels = {4: {}, 6: {}}
+        self._plans = {}
+        self.rule_count = 0
+        for rule in rules:
+            self.add(*rule)
+
+    def add(self, index, action, prefix, ge=None, le=None):
+        """
+        Add a rule to the trie. `action` is either 'permit' or 'deny'.
+        """
+        version, network, length = parse_prefix(prefix)
+        bits = MAX_LENGTH[version]
+        if ge is None and le is None:
+            ge = le = length
+        else:
+            ge = length if ge is None else max(ge, length)
+            le = bits if le is None else le
+
+        level = self._levels[version].setdefault(length, {})
+        level.setdefault(network >> (bits - length), []).append((index, ge, le, action == 'permit'))
+        self.rule_count += 1
+        self._plans.clear()
+
+    @classmethod
+    def from_prefix_list(cls, prefix_list):
+        """
+        Compile a PrefixList instance from its rules.
+        """
+        return compile_prefix_lists([prefix_list.pk])[prefix_list.pk]
+
+    def _get_plan(self, version, length):
+        """
+        Return the levels to probe for a prefix of the given length, shortest
+        first, as (shift, {network >> shift: (index, permit)}) tuples. Each
+        table only keeps the first rule (by index) whose ge/le range covers the
+        length, so a probe is a single dict lookup. Plans are built lazily.
+        """
+        plan = []
+        bits = MAX_LENGTH[version]
+        for level_length, level in sorted(self._levels[version].items()):
+            if level_length > length:
+                break
+            table = {}
+            for key, entries in level.items():
+                for index, ge, le, permit in sorted(entries):
+                    if ge <= length <= le:
+                        table[key] = (index, permit)
+                        break
+            if table:
+                plan.append((bits - level_length, table))
+        plan = self._plans[version, length] = tuple(plan)
+        return plan
+
+    def _lookup(self, version, network, length):
+        plan = self._plans.get((version, length))
+        if plan is None:
+            plan = self._get_plan(version, length)
+        best = None
+        for shift, table in plan:
+            entry = table.get(network >> shift)
+            if entry is not None and (best is None or entry[0] < best[0]):
+                best = entry
+        return best
+
+    def match(self, prefix):
+        """
+        Return the (index, action) of the first rule matching the prefix, or None
+        if no rule matches.
+        """
+        entry = self._lookup(*parse_prefix(prefix))
+        if entry is None:
+            return None
+        return entry[0], 'permit' if entry[1] else 'deny'
+
+    def permits(self, prefix):
+        """
+        Return True if the prefix is permitted by the list.
+        """
+        entry = self._lookup(*parse_prefix(prefix))
+        return entry is not None and entry[1]
+
+    def classify(self, prefixes):
+        """
+        Return a list of booleans telling whether each prefix is permitted.
+        Results are memoized for the duration of the call, so repeated prefixes
+        (as found in full tables and announcement logs) are only looked up once.
+        """
+        plans = self._plans
+        get_plan = self._get_plan
+        seen = {}
+        results = []
+        append = results.append
+        for prefix in prefixes:
+            verdict = seen.get(prefix)
+            if verdict is None:
+                version, network, length = parse_prefix(prefix)
+                plan = plans.get((version, length))
+                if plan is None:
+                    plan = get_plan(version, length)
+                best = None
+                for shift, table in plan:
+                    entry = table.get(network >> shift)
+                    if entry is not None and (best is None or entry[0] < best[0]):
+                        best = entry
+                verdict = seen[prefix] = best is not None and best[1]
+            append(verdict)
+        return results
+
+    def __len__(self):
+        return self.rule_count
+
+    def __contains__(self, prefix):
+        return self.permits(prefix)
+
+
+def compile_prefix_lists(prefix_lists):
+    """
+    Compile several prefix lists at once, reading all of their rules in a
+    single query. Accepts PrefixList instances or primary keys and returns a
+    {pk: PrefixListTrie} mapping.
+    """
+    from netbox_bgp.models import PrefixListRule
+
+    pks = [getattr(prefix_list, 'pk', prefix_list) for prefix_list in prefix_lists]
+    tries = {pk: PrefixListTrie() for pk in pks}
+    rules = PrefixListRule.objects.filter(
+        prefix_list__in=pks
+    ).select_related('prefix').order_by('prefix_list', 'index')
+    for rule in rules:
+        network = rule.prefix_custom or rule.prefix.prefix
+        tries[rule.prefix_list_id].add(rule.index, rule.action, network, rule.ge, rule.le)
+    return tries
@@ -0,0 +1,486 @@
+import bisect
+import gc
+import re
+from contextlib import contextmanager
+
+from .community_list import CommunityListMatcher, get_community_list_matchers
+from .prefix_list import compile_prefix_lists, parse_prefix
+
+
+__all__ = (
+    'CompiledPolicy',
+    'Route',
+    'RouteResult',
+    'compile_routing_policies',
+)
+
+
+class Route:
+    """
+    The attributes of a route as seen by a routing policy.
+    """
+    __slots__ = (
+        'prefix', 'network', 'communities', 'as_path', 'med', 'local_pref', 'next_hop', 'origin', 'weight',
+    )
+
+    def __init__(self, prefix, communities=(), as_path=(), med=None, local_pref=None, next_hop=None,
+                 origin=None, weight=None):
+        self.prefix = prefix
+        self.network = parse_prefix(prefix)
+        self.communities = communities if isinstance(communities, frozenset) else frozenset(communities)
+        self.as_path = as_path if isinstance(as_path, tuple) else tuple(as_path)
+        self.med = med
+        self.local_pref = local_pref
+        self.next_hop = next_hop
+        self.origin = origin
+        self.weight = weight
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a route from its JSON representation, e.g.
+        {"prefix": "10.0.0.0/8", "communities": ["65000:1"], "as_path": [65001, 65002], "med": 10}
+        """
+        if isinstance(data, str):
+            return cls(data)
+        if not isinstance(data, dict) or 'prefix' not in data:
+            raise ValueError(f"A route must be a prefix or an object with a prefix: {data}")
+        as_path = data.get('as_path') or ()
+        if isinstance(as_path, str):
+            as_path = as_path.split()
+        communities = data.get('communities') or ()
+        if isinstance(communities, str):
+            communities = communities.split()
+        if not isinstance(communities, (list, tuple)) or not all(isinstance(c, str) for c in communities):
+            raise ValueError(f"Communities must be a list of strings: {communities}")
+        for attr in ('med', 'local_pref', 'weight'):
+            value = data.get(attr)
+            # Booleans are integers to Python but not to JSON
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+                raise ValueError(f"{attr} must be an integer: {value}")
+        return cls(
+            prefix=data['prefix'],
+            communities=communities,
+            as_path=tuple(map(int, as_path)),
+            med=data.get('med'),
+            local_pref=data.get('local_pref'),
+            next_hop=data.get('next_hop'),
+            origin=data.get('origin'),
+            weight=data.get('weight'),
+        )
+
+    def copy(self):
+        route = Route.__new__(Route)
+        route.prefix = self.prefix
+        route.network = self.network
+        route.communities = self.communities
+        route.as_path = self.as_path
+        route.med = self.med
+        route.local_pref = self.local_pref
+        route.next_hop = self.next_hop
+        route.origin = self.origin
+        route.weight = self.weight
+        return route
+
+    def to_dict(self):
+        data = {
+            'prefix': self.prefix,
+            'communities': sorted(self.communities),
+            'as_path': list(self.as_path),
+        }
+        for attr in ('med', 'local_pref', 'next_hop', 'origin', 'weight'):
+            value = getattr(self, attr)
+            if value is not None:
+                data[attr] = value
+        return data
+
+
+class RouteResult:
+    """
+    The outcome of a routing policy for a route: the action, the indexes of the
+    rules which matched and the route with its rewritten attributes.
+    """
+    __slots__ = ('route', 'permitted', 'rules')
+
+    def __init__(self, route, permitted, rules):
+        self.route = route
+        self.permitted = permitted
+        self.rules = rules
+
+    @property
+    def action(self):
+        return 'permit' if self.permitted else 'deny'
+
+    def to_dict(self):
+        return {
+            'prefix': self.route.prefix,
+            'action': self.action,
+            'rules': self.rules,
+            'attributes': self.route.to_dict(),
+        }
+
+
+@contextmanager
+def gc_paused():
+    """
+    Pause the cyclic garbage collector while evaluating a batch. Results only
+    hold acyclic objects, but allocating millions of them would otherwise
+    trigger a full collection every few thousand routes.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+#
+# Match statements
+#
+
+def never_matches(route):
+    return False
+
+
+def match_prefix_lists(tries):
+    def match(route):
+        for trie in tries:
+            entry = trie._lookup(*route.network)
+            if entry is not None and entry[1]:
+                return True
+        return False
+    return match
+
+
+def match_communities(values):
+    # Community values may hold wildcards and ranges
+    matcher = CommunityListMatcher(('permit', value) for value in values)
+
+    def match(route):
+        return matcher.matches(route.communities)
+    return match
+
+
+def match_community_lists(matchers):
+    def match(route):
+        for matcher in matchers:
+            if matcher.matches(route.communities):
+                return True
+        return False
+    return match
+
+
+def match_as_path(patterns):
+    # "_" is the usual delimiter wildcard of AS path regular expressions
+    regex = re.compile('|'.join(f"(?:{pattern.replace('_', '(?:^|$|[ ,{}()])')})" for pattern in patterns))
+    # AS paths repeat a lot across a table, so verdicts are memoized per path
+    verdicts = {}
+
+    def match(route):
+        verdict = verdicts.get(route.as_path)
+        if verdict is None:
+            verdict = verdicts[route.as_path] = regex.search(' '.join(map(str, route.as_path))) is not None
+        return verdict
+    return match
+
+
+def match_attribute(attr, values, cast=None):
+    values = {cast(value) if cast else value for value in values}
+
+    def match(route):
+        return getattr(route, attr) in values
+    return match
+
+
+# match_custom keys evaluated by the simulator, other keys are reported
+CUSTOM_MATCHES = {
+    'as-path': match_as_path,
+    'local-preference': lambda values: match_attribute('local_pref', values, int),
+    'metric': lambda values: match_attribute('med', values, int),
+    'origin': lambda values: match_attribute('origin', values),
+    'ip nexthop': lambda values: match_attribute('next_hop', values),
+    'ipv6 nexthop': lambda values: match_attribute('next_hop', values),
+}
+
+
+#
+# Set statements
+#
+
+def set_attribute(attr, cast=None):
+    def factory(value):
+        if cast:
+            value = cast(value)
+
+        def apply(route):
+            setattr(route, attr, value)
+        return apply
+    return factory
+
+
+def set_metric(value):
+    value = str(value).strip()
+    if value[0] in '+-':
+        delta = int(value)
+
+        def apply(route):
+            route.med = max((route.med or 0) + delta, 0)
+    else:
+        metric = int(value)
+
+        def apply(route):
+            route.med = metric
+    return apply
+
+
+def set_community(value):
+    values = value.split() if isinstance(value, str) else [str(v) for v in value]
+    if 'none' in values:
+        def apply(route):
+            route.communities = frozenset()
+        return apply
+    additive = 'additive' in values
+    communities = frozenset(v for v in values if v != 'additive')
+
+    def apply(route):
+        route.communities = route.communities | communities if additive else communities
+    return apply
+
+
+def set_community_additive(value):
+    values = value.split() if isinstance(value, str) else [str(v) for v in value]
+    return set_community(values + ['additive'])
+
+
+def set_community_delete(value):
+    communities = frozenset(value.split() if isinstance(value, str) else [str(v) for v in value])
+
+    def apply(route):
+        route.communities = route.communities - communities
+    return apply
+
+
+def set_as_path_prepend(value):
+    prepend = tuple(int(asn) for asn in (value.split() if isinstance(value, str) else value))
+
+    def apply(route):
+        route.as_path = prepend + route.as_path
+    return apply
+
+
+# set_actions keys applied by the simulator, other keys are reported
+SET_ACTIONS = {
+    'local-preference': set_attribute('local_pref', int),
+    'metric': set_metric,
+    'weight': set_attribute('weight', int),
+    'origin': set_attribute('origin'),
+    'ip next-hop': set_attribute('next_hop'),
+    'ipv6 next-hop': set_attribute('next_hop'),
+    'community': set_community,
+    'community additive': set_community_additive,
+    'community delete': set_community_delete,
+    'as-path prepend': set_as_path_prepend,
+}
+
+
+def as_list(value):
+    return value if isinstance(value, (list, tuple)) else [value]
+
+
+class CompiledRule:
+    __slots__ = ('index', 'permit', 'matchers', 'setters', 'continue_entry', 'next_position')
+
+    def __init__(self, index, permit, matchers=(), setters=(), continue_entry=None):
+        self.index = index
+        self.permit = permit
+        self.matchers = tuple(matchers)
+        self.setters = tuple(setters)
+        self.continue_entry = continue_entry
+        self.next_position = None
+
+
+class CompiledPolicy:
+    """
+    A routing policy compiled for simulation.
+
+    Rules are evaluated by index and all the match statements of a rule must
+    hold for it to match. A matching deny rule drops the route. A matching
+    permit rule applies its set actions and accepts the route, unless it has a
+    continue entry, in which case evaluation resumes at that entry with the
+    rewritten attributes. A route matched by no rule is denied.
+    """
+
+    def __init__(self, rules, warnings=()):
+        self.rules = sorted(rules, key=lambda rule: rule.index)
+        self.warnings = list(warnings)
+
+        indexes = [rule.index for rule in self.rules]
+        for rule in self.rules:
+            if rule.continue_entry is None:
+                continue
+            if rule.continue_entry <= rule.index:
+                self.warnings.append(
+                    f"Rule {rule.index}: ignoring continue to a previous entry ({rule.continue_entry})"
+                )
+                continue
+            # Jump to the entry, or to the next one if it doesn't exist
+            rule.next_position = bisect.bisect_left(indexes, rule.continue_entry)
+
+    def evaluate(self, route):
+        """
+        Apply the policy to a Route and return a RouteResult.
+        """
+        rules = self.rules
+        count = len(rules)
+        position = 0
+        matched = []
+        result = route
+        permitted = False
+        while position < count:
+            rule = rules[position]
+            for matcher in rule.matchers:
+                if not matcher(result):
+                    break
+            else:
+                matched.append(rule.index)
+                if not rule.permit:
+                    return RouteResult(route, False, matched)
+                if rule.setters:
+                    if result is route:
+                        result = route.copy()
+                    for setter in rule.setters:
+                        setter(result)
+                permitted = True
+                if rule.next_position is None:
+                    break
+                position = rule.next_position
+                continue
+            position += 1
+        return RouteResult(result if permitted else route, permitted, matched)
+
+    def evaluate_many(self, routes):
+        """
+        Apply the policy to a batch of routes, given as Route instances or in
+        their JSON representation, and return a list of RouteResults.
+        """
+        evaluate = self.evaluate
+        from_dict = Route.from_dict
+        with gc_paused():
+            return [
+                evaluate(route if isinstance(route, Route) else from_dict(route))
+                for route in routes
+            ]
+
+
+def get_custom_match(rule):
+    return rule.match_custom if isinstance(rule.match_custom, dict) else {}
+
+
+def compile_rule(rule, tries, community_lists, prefix_lists_by_name, warnings):
+    """
+    Turn a RoutingPolicyRule into a CompiledRule, reporting the statements
+    which cannot be simulated in warnings.
+    """
+    matchers = []
+    setters = []
+
+    custom = get_custom_match(rule)
+    if rule.match_custom and not custom:
+        warnings.append(f"Rule {rule.index}: ignoring match_custom, it is not an object")
+
+    # An IPv4 and an IPv6 prefix list on the same rule accept either family
+    prefix_lists = [tries[pl.pk] for pl in rule.match_ip_address.all()]
+    prefix_lists += [tries[pl.pk] for pl in rule.match_ipv6_address.all()]
+    for key in ('ip address', 'ipv6 address'):
+        for name in as_list(custom.get(key, [])):
+            if name not in prefix_lists_by_name:
+                warnings.append(f"Rule {rule.index}: unknown prefix list {name} never matches")
+            prefix_lists += [tries[pk] for pk in prefix_lists_by_name.get(name, [])]
+    if prefix_lists or 'ip address' in custom or 'ipv6 address' in custom:
+        matchers.append(match_prefix_lists(prefix_lists))
+
+    communities = [community.value for community in rule.match_community.all()]
+    communities += [str(value) for value in as_list(custom.get('community', []))]
+    if communities:
+        matchers.append(match_communities(communities))
+    matched_lists = [community_lists[cl.pk] for cl in rule.match_community_list.all()]
+    if matched_lists:
+        matchers.append(match_community_lists(matched_lists))
+
+    for key, value in custom.items():
+        if key in ('ip address', 'ipv6 address', 'community'):
+            continue
+        if key not in CUSTOM_MATCHES:
+            warnings.append(f"Rule {rule.index}: match {key} is not simulated and is ignored")
+            continue
+        try:
+            matchers.append(CUSTOM_MATCHES[key](as_list(value)))
+        except (TypeError, ValueError, AttributeError, re.error):
+            # Ignoring the statement would widen the rule
+            warnings.append(f"Rule {rule.index}: invalid value for match {key}: {value}, the rule never matches")
+            matchers.append(never_matches)
+
+    actions = rule.set_actions
+    if actions and not isinstance(actions, dict):
+        warnings.append(f"Rule {rule.index}: ignoring set_actions, it is not an object")
+    elif actions:
+        for key, value in actions.items():
+            if key not in SET_ACTIONS:
+                warnings.append(f"Rule {rule.index}: set {key} is not simulated and is ignored")
+                continue
+            try:
+                setters.append(SET_ACTIONS[key](value))
+            except (TypeError, ValueError, IndexError):
+                warnings.append(f"Rule {rule.index}: invalid value for set {key}: {value}")
+
+    return CompiledRule(rule.index, rule.action == 'permit', matchers, setters, rule.continue_entry)
+
+
+def compile_routing_policies(policies):
+    """
+    Compile several routing policies at once. Rules, the prefix lists and the
+    community lists they reference are read in a fixed number of queries
+    whatever the number of policies and rules. Accepts RoutingPolicy instances
+    or primary keys and returns a {pk: CompiledPolicy} mapping.
+    """
+    from netbox_bgp.models import PrefixList, RoutingPolicyRule
+
+    pks = [getattr(policy, 'pk', policy) for policy in policies]
+    rules = list(
+        RoutingPolicyRule.objects.filter(
+            routing_policy__in=pks
+        ).order_by('routing_policy', 'index').prefetch_match_statements()
+    )
+
+    # Prefix lists referenced by name in match_custom
+    custom_names = set()
+    for rule in rules:
+        custom = get_custom_match(rule)
+        for key in ('ip address', 'ipv6 address'):
+            custom_names.update(as_list(custom.get(key, [])))
+    prefix_lists_by_name = {}
+    if custom_names:
+        for pk, name in PrefixList.objects.filter(name__in=custom_names).values_list('pk', 'name'):
+            prefix_lists_by_name.setdefault(name, []).append(pk)
+
+    prefix_list_ids = {pk for names in prefix_lists_by_name.values() for pk in names}
+    community_list_ids = set()
+    for rule in rules:
+        prefix_list_ids.update(pl.pk for pl in rule.match_ip_address.all())
+        prefix_list_ids.update(pl.pk for pl in rule.match_ipv6_address.all())
+        community_list_ids.update(cl.pk for cl in rule.match_community_list.all())
+    tries = compile_prefix_lists(prefix_list_ids) if prefix_list_ids else {}
+    community_lists = get_community_list_matchers(community_list_ids) if community_list_ids else {}
+
+    compiled_rules = {pk: [] for pk in pks}
+    warnings = {pk: [] for pk in pks}
+    for rule in rules:
+        compiled_rules[rule.routing_policy_id].append(
+            compile_rule(rule, tries, community_lists, prefix_lists_by_name, warnings[rule.routing_policy_id])
+        )
+    return {
+        pk: CompiledPolicy(compiled_rules[pk], warnings[pk])
+        for pk in pks
+    }
@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+import zlib
+
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import OuterRef
+from extras.models import TaggedItem
+
+from .models import BGPSession, PrefixListRule, RoutingPolicyRule
+
+
+__all__ = (
+    'BGPSessionExporter',
+    'Exporter',
+    'PrefixListRuleExporter',
+    'RoutingPolicyRuleExporter',
+    'gzip_stream',
+)
+
+
+def related_values(model, field_name, target_field='pk'):
+    """
+    An array of a field of the objects linked by a many-to-many field, ordered
+    by their primary key. Computed by a subquery per row, which avoids the
+    fan-out of joining several relations.
+    """
+    field = model._meta.get_field(field_name)
+    through = field.remote_field.through
+    source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+    value = target if target_field == 'pk' else f'{target}__{target_field}'
+    return ArraySubquery(
+        through.objects.filter(**{source: OuterRef('pk')}).order_by(target).values(value)
+    )
+
+
+def tag_slugs(model):
+    return ArraySubquery(
+        TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(model),
+            object_id=OuterRef('pk'),
+        ).order_by('tag__slug').values('tag__slug')
+    )
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class Exporter:
+    """
+    Export the rows of a queryset as newline-delimited JSON or CSV, streamed
+    from a server-side cursor so that memory use does not depend on the
+    number of rows.
+
+    Columns are (name, expression) pairs evaluated by the database, named like
+    the fields of the import form of the model so that exported files can be
+    imported again.
+    """
+    model = None
+    chunk_size = 2000
+
+    def get_columns(self):
+        raise NotImplementedError
+
+    def iter_rows(self, queryset):
+        names, expressions = zip(*self.get_columns())
+        rows = queryset.order_by('pk').values_list(*expressions).iterator(chunk_size=self.chunk_size)
+        for row in rows:
+            yield dict(zip(names, row))
+
+    def ndjson(self, queryset):
+        dumps = json.JSONEncoder(default=_json_default, ensure_ascii=False).encode
+        lines, size = [], 0
+        for row in self.iter_rows(queryset):
+            line = dumps(row)
+            lines.append(line)
+            size += len(line)
+            # Rows are sent in blocks of about 64 kB
+            if size > 65536:
+                yield ('\n'.join(lines) + '\n').encode()
+                lines, size = [], 0
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode()
+
+    @staticmethod
+    def _csv_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, list):
+            return ','.join(str(item) for item in value)
+        if isinstance(value, dict):
+            return json.dumps(value, default=_json_default)
+        return _json_default(value)
+
+    def csv(self, queryset):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(name for name, _ in self.get_columns())
+        for row in self.iter_rows(queryset):
+            writer.writerow(self._csv_value(value) for value in row.values())
+            # Rows are sent in blocks of about 64 kB
+            if buffer.tell() > 65536:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+
+class BGPSessionExporter(Exporter):
+    model = BGPSession
+
+    def get_columns(self):
+        return (
+            ('id', 'pk'),
+            ('name', 'name'),
+            ('device', 'device__name'),
+            ('virtualmachine', 'virtualmachine__name'),
+            ('site', 'site__name'),
+            ('tenant', 'tenant__name'),
+            ('status', 'status'),
+            ('description', 'description'),
+            ('local_address', 'local_address__address'),
+            ('remote_address', 'remote_address__address'),
+            ('local_as', 'local_as__asn'),
+            ('remote_as', 'remote_as__asn'),
+            ('peer_group', 'peer_group__name'),
+            ('import_policies', related_values(BGPSession, 'import_policies', 'name')),
+            ('export_policies', related_values(BGPSession, 'export_policies', 'name')),
+            ('prefix_list_in', 'prefix_list_in__name'),
+            ('prefix_list_out', 'prefix_list_out__name'),
+            ('tags', tag_slugs(BGPSession)),
+            ('last_updated', 'last_updated'),
+        )
+
+
+class PrefixListRuleExporter(Exporter):
+    model = PrefixListRule
+
+    def get_columns(self):
+        return (
+            ('id', 'pk'),
+            ('prefix_list', 'prefix_list_id'),
+            ('index', 'index'),
+            ('action', 'action'),
+            ('prefix', 'prefix_id'),
+            ('prefix_custom', 'prefix_custom'),
+            ('ge', 'ge'),
+            ('le', 'le'),
+            ('description', 'description'),
+            ('comments', 'comments'),
+            ('tags', tag_slugs(PrefixListRule)),
+            ('last_updated', 'last_updated'),
+        )
+
+
+class RoutingPolicyRuleExporter(Exporter):
+    model = RoutingPolicyRule
+
+    def get_columns(self):
+        return (
+            ('id', 'pk'),
+            ('routing_policy', 'routing_policy_id'),
+            ('index', 'index'),
+            ('action', 'action'),
+            ('continue_entry', 'continue_entry'),
+            ('match_community', related_values(RoutingPolicyRule, 'match_community')),
+            ('match_community_list', related_values(RoutingPolicyRule, 'match_community_list')),
+            ('match_ip_address', related_values(RoutingPolicyRule, 'match_ip_address')),
+            ('match_ipv6_address', related_values(RoutingPolicyRule, 'match_ipv6_address')),
+            ('match_custom', 'match_custom'),
+            ('set_actions', 'set_actions'),
+            ('description', 'description'),
+            ('comments', 'comments'),
+            ('tags', tag_slugs(RoutingPolicyRule)),
+            ('last_updated', 'last_updated'),
+        )
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Compress a stream of bytes with gzip as it is produced.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
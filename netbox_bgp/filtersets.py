@@ -10,10 +10,70 @@ from .models import (
     BGPPeerGroup, PrefixList, PrefixListRule, CommunityList,
     CommunityListRule
 )
-from ipam.models import IPAddress, ASN
+from ipam.models import IPAddress, ASN, Prefix
 from dcim.models import Device, Site
 from virtualization.models import VirtualMachine
 
+from .choices import ActionChoices
+
+
+#
+# Quick search helpers
+#
+# Text columns are matched with icontains, compiled to
+# UPPER(column::text) LIKE UPPER(term). The pg_trgm GIN indexes of the models
+# are built on the same UPPER() expressions so that PostgreSQL serves these
+# searches from them. Numeric, ASN and IP terms are matched exactly instead of
+# being cast to text.
+
+def parse_integer(value):
+    value = value.strip()
+    if value.isdecimal():
+        return int(value)
+    return None
+
+
+def parse_asn(value):
+    """
+    Return the ASN given as '65000', 'AS65000' or in asdot notation ('1.10'), or None.
+    """
+    value = value.strip().upper()
+    if value.startswith('AS'):
+        value = value[2:]
+    if value.isdecimal():
+        asn = int(value)
+    else:
+        high, dot, low = value.partition('.')
+        if not (dot and high.isdecimal() and low.isdecimal()):
+            return None
+        if int(high) > 65535 or int(low) > 65535:
+            return None
+        asn = int(high) << 16 | int(low)
+    if 0 < asn < 2 ** 32:
+        return asn
+    return None
+
+
+def parse_ip(value):
+    try:
+        return netaddr.IPAddress(value.strip(), flags=netaddr.INET_PTON)
+    except (AddrFormatError, ValueError):
+        return None
+
+
+def parse_network(value):
+    try:
+        return str(netaddr.IPNetwork(value.strip()).cidr)
+    except (AddrFormatError, ValueError):
+        return None
+
+
+def search_action(value):
+    value = value.strip().lower()
+    if value in ActionChoices.values():
+        return Q(action=value)
+    return Q()
+
 class CommunityFilterSet(NetBoxModelFilterSet, TenancyFilterSet):
 
     class Meta:
@@ -59,10 +119,13 @@ class CommunityListRuleFilterSet(NetBoxModelFilterSet):
         if not value.strip():
             return queryset
         qs_filter = (
-                Q(action__icontains=value)
-                | Q(community_list__icontains=value)
-                | Q(community_list_id__icontains=value)
+                Q(description__icontains=value)
+                | Q(community_list__in=CommunityList.objects.filter(name__icontains=value))
+                | Q(community__in=Community.objects.filter(value__icontains=value))
+                | search_action(value)
         )
+        if (number := parse_integer(value)) is not None:
+            qs_filter |= Q(community_list_id=number)
         return queryset.filter(qs_filter)
 
 
@@ -179,11 +242,18 @@ class BGPSessionFilterSet(NetBoxModelFilterSet, TenancyFilterSet):
         if not value.strip():
             return queryset
         qs_filter = (
-                Q(remote_as__asn__icontains=value)
-                | Q(name__icontains=value)
-                | Q(local_as__asn__icontains=value)
+                Q(name__icontains=value)
                 | Q(description__icontains=value)
         )
+        # Resolve ASNs and addresses first so the session side stays an indexed id lookup
+        if (asn := parse_asn(value)) is not None:
+            asn_ids = list(ASN.objects.filter(asn=asn).values_list('pk', flat=True))
+            qs_filter |= Q(remote_as__in=asn_ids) | Q(local_as__in=asn_ids)
+        if (address := parse_ip(value)) is not None:
+            address_ids = list(
+                IPAddress.objects.filter(address__net_host=str(address)).values_list('pk', flat=True)
+            )
+            qs_filter |= Q(remote_address__in=address_ids) | Q(local_address__in=address_ids)
         return queryset.filter(qs_filter)
 
     def search_by_remote_ip(self, queryset, name, value):
@@ -233,12 +303,16 @@ class RoutingPolicyRuleFilterSet(NetBoxModelFilterSet):
         if not value.strip():
             return queryset
         qs_filter = (
-                Q(index__icontains=value)
-                | Q(action__icontains=value)
-                | Q(description__icontains=value)
-                | Q(routing_policy_id__icontains=value)
-                | Q(continue_entry__icontains=value)
+                Q(description__icontains=value)
+                | Q(routing_policy__in=RoutingPolicy.objects.filter(name__icontains=value))
+                | search_action(value)
         )
+        if (number := parse_integer(value)) is not None:
+            qs_filter |= (
+                Q(index=number)
+                | Q(routing_policy_id=number)
+                | Q(continue_entry=number)
+            )
         return queryset.filter(qs_filter)
 
 
@@ -276,6 +350,22 @@ class PrefixListFilterSet(NetBoxModelFilterSet):
         return queryset.filter(qs_filter)
 
 class PrefixListRuleFilterSet(NetBoxModelFilterSet):
+    contains = django_filters.CharFilter(
+        method='search_contains',
+        label='Rules whose prefix contains this prefix or IP',
+    )
+    within = django_filters.CharFilter(
+        method='search_within',
+        label='Rules whose prefix is within this prefix',
+    )
+    within_include = django_filters.CharFilter(
+        method='search_within_include',
+        label='Rules whose prefix is within and including this prefix',
+    )
+    overlaps = django_filters.CharFilter(
+        method='search_overlaps',
+        label='Rules whose prefix overlaps this prefix',
+    )
 
     class Meta:
         model = PrefixListRule
@@ -287,12 +377,51 @@ class PrefixListRuleFilterSet(NetBoxModelFilterSet):
         if not value.strip():
             return queryset
         qs_filter = (
-                Q(index__icontains=value)
-                | Q(action__icontains=value)
-                #| Q(prefix_custom__icontains=value)
-                | Q(ge__icontains=value)
-                | Q(le__icontains=value)
-                | Q(prefix_list__icontains=value)
-                | Q(prefix_list_id__icontains=value)
+                Q(description__icontains=value)
+                | Q(prefix_list__in=PrefixList.objects.filter(name__icontains=value))
+                | search_action(value)
+        )
+        if (number := parse_integer(value)) is not None:
+            qs_filter |= (
+                Q(index=number)
+                | Q(ge=number)
+                | Q(le=number)
+                | Q(prefix_list_id=number)
+            )
+        elif (network := parse_network(value)) is not None:
+            qs_filter |= self.network_filter(network, 'exact')
+        return queryset.filter(qs_filter)
+
+    @staticmethod
+    def network_filter(network, lookup):
+        """
+        Match both custom prefixes and linked IPAM prefixes. Both sides are
+        evaluated with the inet operators, served by GiST indexes.
+        """
+        return (
+            Q(**{f'prefix_custom__{lookup}': network})
+            | Q(prefix__in=Prefix.objects.filter(**{f'prefix__{lookup}': network}))
         )
+
+    def filter_network(self, queryset, value, *lookups):
+        if not value.strip():
+            return queryset
+        network = parse_network(value)
+        if network is None:
+            return queryset.none()
+        qs_filter = Q()
+        for lookup in lookups:
+            qs_filter |= self.network_filter(network, lookup)
         return queryset.filter(qs_filter)
+
+    def search_contains(self, queryset, name, value):
+        return self.filter_network(queryset, value, 'net_contains_or_equals')
+
+    def search_within(self, queryset, name, value):
+        return self.filter_network(queryset, value, 'net_contained')
+
+    def search_within_include(self, queryset, name, value):
+        return self.filter_network(queryset, value, 'net_contained_or_equal')
+
+    def search_overlaps(self, queryset, name, value):
+        return self.filter_network(queryset, value, 'net_contains_or_equals', 'net_contained')
@@ -0,0 +1,183 @@
+import json
+import logging
+import time
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from graphql import GraphQLError
+from netbox.plugins import get_plugin_config
+from strawberry.types.nodes import SelectedField
+from strawberry_django.fields.field import StrawberryDjangoField
+
+
+__all__ = (
+    'CostLimitedField',
+    'QueryCostEstimator',
+)
+
+logger = logging.getLogger('netbox_bgp.graphql')
+
+
+def _selected_fields(selections):
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            yield selection
+        else:
+            # Fragment spreads and inline fragments
+            yield from _selected_fields(selection.selections)
+
+
+def _get_relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.is_relation or field.related_model is None:
+        return None
+    return field
+
+
+def _through(field):
+    return getattr(field, 'through', None) or field.remote_field.through
+
+
+def get_row_counts(models):
+    """
+    Return the number of rows of the tables of the models, as estimated by the
+    PostgreSQL statistics. Tables which were never analyzed are counted.
+    """
+    tables = {model._meta.db_table: model for model in models}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relname = ANY(%s)",
+            [list(tables)]
+        )
+        estimates = dict(cursor.fetchall())
+    counts = {}
+    for table, model in tables.items():
+        rows = estimates.get(table, -1)
+        counts[model] = rows if rows > 0 else model._base_manager.count()
+    return counts
+
+
+class QueryCostEstimator:
+    """
+    Estimate the cost of a GraphQL list query, as the number of rows it reads.
+
+    The rows of the listed objects are estimated by the query planner, so that
+    filters and pagination are accounted for. Each nested list multiplies them
+    by the average number of related objects, from the row counts of the
+    tables. Forward relations are fetched in the same rows and add nothing but
+    their own nested lists. The depth is the number of nested relations.
+    """
+
+    def __init__(self, model, selections):
+        self.model = model
+        self.selections = selections
+
+    def _get_models(self, model, selections, models):
+        models.add(model)
+        for selection in _selected_fields(selections):
+            field = _get_relation(model, selection.name)
+            if field is None:
+                continue
+            if field.many_to_many:
+                models.add(_through(field))
+            self._get_models(field.related_model, selection.selections, models)
+        return models
+
+    def _estimate(self, model, selections, rows, counts, depth):
+        cost, max_depth = 0, depth
+        for selection in _selected_fields(selections):
+            field = _get_relation(model, selection.name)
+            if field is None:
+                continue
+            if field.many_to_many or field.one_to_many:
+                related = _through(field) if field.many_to_many else field.related_model
+                related_rows = rows * counts[related] / max(counts[model], 1)
+                cost += related_rows
+            else:
+                related_rows = rows
+            related_cost, related_depth = self._estimate(
+                field.related_model, selection.selections, related_rows, counts, depth + 1
+            )
+            cost += related_cost
+            max_depth = max(max_depth, related_depth)
+        return cost, max_depth
+
+    def get_depth(self):
+        counts = dict.fromkeys(self._get_models(self.model, self.selections, set()), 0)
+        return self._estimate(self.model, self.selections, 0, counts, 1)[1]
+
+    def estimate(self, queryset):
+        """
+        Return the estimated number of listed objects, the cost and the depth
+        of the query.
+        """
+        rows = 0
+        # Querysets restricted to nothing are not sent to the database
+        if not queryset.query.is_empty():
+            rows = json.loads(queryset.explain(format='json'))[0]['Plan']['Plan Rows']
+        counts = get_row_counts(self._get_models(self.model, self.selections, set()))
+        cost, depth = self._estimate(self.model, self.selections, rows, counts, 1)
+        return rows, round(rows + cost), depth
+
+
+class RowCounter:
+    """
+    Count the queries run and the rows they return.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        self.rows += max(context['cursor'].rowcount, 0)
+        return result
+
+
+class CostLimitedField(StrawberryDjangoField):
+    """
+    A list field rejecting queries deeper than the graphql_max_depth plugin
+    setting or costing more than graphql_max_cost rows. The estimated and the
+    actual costs are logged to the netbox_bgp.graphql logger.
+    """
+
+    def get_queryset(self, queryset, info, **kwargs):
+        queryset = super().get_queryset(queryset, info, **kwargs)
+        max_cost = get_plugin_config('netbox_bgp', 'graphql_max_cost')
+        max_depth = get_plugin_config('netbox_bgp', 'graphql_max_depth')
+        estimator = QueryCostEstimator(queryset.model, info.selected_fields[0].selections)
+
+        # The depth is checked first, without reading the statistics
+        if max_depth and (depth := estimator.get_depth()) > max_depth:
+            raise GraphQLError(
+                f"{info.field_name}: the query depth ({depth}) exceeds the maximum of {max_depth}"
+            )
+        rows, cost, depth = estimator.estimate(queryset)
+        if max_cost and cost > max_cost:
+            logger.info(f"{info.field_name}: rejected a query with an estimated cost of {cost}")
+            limit = int(max_cost // max(cost / max(rows, 1), 1))
+            hint = (
+                f"request at most {limit} objects at a time with pagination" if limit
+                else "select fewer nested relations"
+            )
+            raise GraphQLError(
+                f"{info.field_name}: the estimated cost of the query ({cost} rows) exceeds the "
+                f"maximum of {max_cost}. Narrow it with filters or {hint}."
+            )
+
+        # Evaluate the queryset here, including its prefetched relations, to
+        # compare the actual cost with the estimate
+        counter = RowCounter()
+        start = time.monotonic()
+        with connection.execute_wrapper(counter):
+            queryset._fetch_all()
+        logger.debug(
+            f"{info.field_name}: estimated cost {cost} (depth {depth}), read {counter.rows} rows "
+            f"in {counter.queries} queries and {time.monotonic() - start:.3f}s"
+        )
+        return queryset
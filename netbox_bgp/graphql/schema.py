@@ -14,6 +14,7 @@ from netbox_bgp.models import (
     CommunityList,
     CommunityListRule,
 )
+from .cost import CostLimitedField
 from .types import (
     CommunityType,
     BGPSessionType,
@@ -31,28 +32,46 @@ from .types import (
 class NetBoxBGPQuery:
 
     netbox_bgp_community: CommunityType = strawberry_django.field()
-    netbox_bgp_community_list: List[CommunityType] = strawberry_django.field()
+    netbox_bgp_community_list: List[CommunityType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
 
     netbox_bgp_session: BGPSessionType = strawberry_django.field()
-    netbox_bgp_session_list: List[BGPSessionType] = strawberry_django.field()
+    netbox_bgp_session_list: List[BGPSessionType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
 
     netbox_bgp_peer_group: BGPPeerGroupType = strawberry_django.field()
-    netbox_bgp_peer_group_list: List[BGPPeerGroupType] = strawberry_django.field()
+    netbox_bgp_peer_group_list: List[BGPPeerGroupType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
 
     netbox_bgp_routing_policy: RoutingPolicyType = strawberry_django.field()
-    netbox_bgp_routing_policy_list: List[RoutingPolicyType] = strawberry_django.field()
+    netbox_bgp_routing_policy_list: List[RoutingPolicyType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
 
     netbox_bgp_routing_policy_rule: RoutingPolicyRuleType = strawberry_django.field()
-    netbox_bgp_routing_policy_rule_list: List[RoutingPolicyRuleType] = strawberry_django.field()
+    netbox_bgp_routing_policy_rule_list: List[RoutingPolicyRuleType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
 
     netbox_bgp_prefixlist: PrefixListType = strawberry_django.field()
-    netbox_bgp_prefixlist_list: List[PrefixListType] = strawberry_django.field()
+    netbox_bgp_prefixlist_list: List[PrefixListType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
 
     netbox_bgp_prefixlist_rule: PrefixListRuleType = strawberry_django.field()
-    netbox_bgp_prefixlist_rule_list: List[PrefixListRuleType] = strawberry_django.field()
+    netbox_bgp_prefixlist_rule_list: List[PrefixListRuleType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
 
     netbox_bgp_communitylist: CommunityListType = strawberry_django.field()
-    netbox_bgp_communitylist_list: List[CommunityListType] = strawberry_django.field()
+    netbox_bgp_communitylist_list: List[CommunityListType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
 
     netbox_bgp_communitylist_rule: CommunityListRuleType = strawberry_django.field()
-    netbox_bgp_communitylist_rule_list: List[CommunityListRuleType] = strawberry_django.field()
+    netbox_bgp_communitylist_rule_list: List[CommunityListRuleType] = strawberry_django.field(
+        field_cls=CostLimitedField, pagination=True
+    )
@@ -63,6 +63,12 @@ class BGPSessionType(NetBoxObjectType):
     prefix_list_in: Annotated["PrefixListType", strawberry.lazy("netbox_bgp.graphql.types")] | None
     prefix_list_out: Annotated["PrefixListType", strawberry.lazy("netbox_bgp.graphql.types")] | None
 
+    # The string representations of sessions and rules include related
+    # objects, which the optimizer fetches along with them
+    @strawberry_django.field(only=["name"], select_related=["device", "virtualmachine"])
+    def display(self) -> str:
+        return str(self)
+
 
 @strawberry_django.type(BGPPeerGroup, fields="__all__", filters=NetBoxBGPBGPPeerGroupFilter)
 class BGPPeerGroupType(NetBoxObjectType):
@@ -109,6 +115,10 @@ class RoutingPolicyRuleType(NetBoxObjectType):
         Annotated["PrefixListType", strawberry.lazy("netbox_bgp.graphql.types")]
     ]
 
+    @strawberry_django.field(only=["index"], select_related=["routing_policy"])
+    def display(self) -> str:
+        return str(self)
+
 
 @strawberry_django.type(PrefixList, fields="__all__", filters=NetBoxBGPPrefixListFilter)
 class PrefixListType(NetBoxObjectType):
@@ -133,6 +143,10 @@ class PrefixListRuleType(NetBoxObjectType):
     le: BigInt
     description: str
 
+    @strawberry_django.field(only=["index"], select_related=["prefix_list"])
+    def display(self) -> str:
+        return str(self)
+
 
 @strawberry_django.type(CommunityList, fields="__all__", filters=NetBoxBGPCommunityListFilter)
 class CommunityListType(NetBoxObjectType):
@@ -153,3 +167,7 @@ class CommunityListRuleType(NetBoxObjectType):
     action: str
     community: Annotated["CommunityType", strawberry.lazy("netbox_bgp.graphql.types")]
     description: str
+
+    @strawberry_django.field(only=["action"], select_related=["community_list", "community"])
+    def display(self) -> str:
+        return str(self)
@@ -0,0 +1,347 @@
+import uuid
+from collections import defaultdict
+
+import netaddr
+from core.choices import ObjectChangeActionChoices
+from core.models import ObjectChange
+from dcim.models import Device, Site
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import transaction
+from django.db.models import Q
+from extras.models import CustomField, Tag, TaggedItem
+from ipam.models import ASN, IPAddress
+from netbox.search.backends import search_backend
+from netbox.signals import post_clean
+from tenancy.models import Tenant
+from virtualization.models import VirtualMachine
+
+from .choices import SessionStatusChoices
+from .counters import invalidate_session_counts
+from .models import BGPPeerGroup, BGPSession, BGPSessionEffectivePolicy, PrefixList, RoutingPolicy
+
+
+__all__ = (
+    'BGPSessionImporter',
+)
+
+
+def _normalize_name(value):
+    return str(value).strip()
+
+
+def _normalize_address(value):
+    return str(netaddr.IPNetwork(str(value).strip()))
+
+
+def _normalize_asn(value):
+    return int(str(value).strip())
+
+
+# Related models with the field they are looked up by and how values of that
+# field are normalized, so that imported values and database values compare
+LOOKUPS = {
+    Site: ('name', _normalize_name),
+    Tenant: ('name', _normalize_name),
+    Device: ('name', _normalize_name),
+    VirtualMachine: ('name', _normalize_name),
+    BGPPeerGroup: ('name', _normalize_name),
+    PrefixList: ('name', _normalize_name),
+    RoutingPolicy: ('name', _normalize_name),
+    IPAddress: ('address', _normalize_address),
+    ASN: ('asn', _normalize_asn),
+    Tag: ('slug', _normalize_name),
+}
+
+
+class BGPSessionImporter:
+    """
+    Create BGP sessions from import records: dicts of field names to values,
+    as parsed by NetBox from CSV, JSON or YAML data. Fields and lookups are
+    those of BGPSessionImportForm.
+
+    All the values referencing other objects are collected first and resolved
+    with one query per related model, among the objects the user may view
+    (all of them when no user is given).
+    Rows are validated in memory, including by the custom validators, and the
+    sessions are written in batches with bulk_create(). Their relations,
+    effective policies, change records and search cache entries are written
+    in bulk as well, and the cached session counts are invalidated. Event
+    rules are not triggered for the imported sessions, so this path is only
+    used by the bgp_import_sessions command and the background import job;
+    the bulk import view saves sessions through the import form.
+    """
+    fields = {
+        'site': Site,
+        'tenant': Tenant,
+        'device': Device,
+        'virtualmachine': VirtualMachine,
+        'peer_group': BGPPeerGroup,
+        'prefix_list_in': PrefixList,
+        'prefix_list_out': PrefixList,
+        'local_address': IPAddress,
+        'remote_address': IPAddress,
+        'local_as': ASN,
+        'remote_as': ASN,
+    }
+    multiple_fields = {
+        'import_policies': RoutingPolicy,
+        'export_policies': RoutingPolicy,
+        'tags': Tag,
+    }
+    required_fields = ('local_address', 'remote_address', 'local_as', 'remote_as')
+    max_lengths = {
+        'name': BGPSession._meta.get_field('name').max_length,
+        'description': BGPSession._meta.get_field('description').max_length,
+    }
+
+    def __init__(self, user=None, request_id=None, batch_size=1000):
+        self.user = user
+        self.request_id = request_id or uuid.uuid4()
+        self.batch_size = batch_size
+
+    @classmethod
+    def supports(cls, records, headers=None):
+        """
+        Return True if the records can be imported by this class: they create
+        sessions (no "id") and only use the plain fields of the import form,
+        with their default lookups.
+        """
+        known = {'name', 'description', 'status', *cls.fields, *cls.multiple_fields}
+        if headers and any(headers.values()):
+            return False
+        if any(not known.issuperset(record) for record in records):
+            return False
+        # Required custom fields can only be set through the import form
+        return not any(
+            cf.required and cf.default is None
+            for cf in CustomField.objects.get_for_model(BGPSession)
+        )
+
+    @staticmethod
+    def _split(value):
+        if value in (None, ''):
+            return []
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        return [part for part in str(value).split(',') if part.strip()]
+
+    def _resolve(self, records):
+        """
+        Return a {model: {normalized value: [objects]}} mapping of every object
+        referenced by the records, reading each related model once.
+        """
+        values = defaultdict(set)
+        for record in records:
+            for field, model in self.fields.items():
+                if record.get(field) not in (None, ''):
+                    values[model].add(record[field])
+            for field, model in self.multiple_fields.items():
+                values[model].update(self._split(record.get(field)))
+
+        resolved = {}
+        for model, raw_values in values.items():
+            lookup, normalize = LOOKUPS[model]
+            keys = set()
+            for value in raw_values:
+                try:
+                    keys.add(normalize(value))
+                except (ValueError, netaddr.AddrFormatError):
+                    pass
+            objects = defaultdict(list)
+            if keys:
+                queryset = model.objects.restrict(self.user, 'view') if self.user else model.objects.all()
+                for obj in queryset.filter(**{f'{lookup}__in': keys}):
+                    objects[normalize(getattr(obj, lookup))].append(obj)
+            resolved[model] = objects
+        return resolved
+
+    def _get_object(self, resolved, model, value):
+        lookup, normalize = LOOKUPS[model]
+        try:
+            objects = resolved[model].get(normalize(value), [])
+        except (ValueError, netaddr.AddrFormatError):
+            raise ValueError(f"Invalid value: {value}")
+        if not objects:
+            raise ValueError(f"Object not found: {value}")
+        if len(objects) > 1:
+            raise ValueError(f'"{value}" is not a unique value for this field; multiple objects were found')
+        return objects[0]
+
+    def clean(self, records):
+        """
+        Validate the records. Returns the list of unsaved sessions and a list
+        of (record number, field, message) errors, field being None for the
+        errors about the whole record.
+        """
+        records = list(records)
+        resolved = self._resolve(records)
+        defaults = {cf.name: cf.default for cf in CustomField.objects.get_for_model(BGPSession)}
+        statuses = set(SessionStatusChoices.values())
+
+        sessions = []
+        errors = []
+        for number, record in enumerate(records, start=1):
+            row_errors = []
+            session = BGPSession(
+                name=str(record.get('name') or '').strip() or None,
+                description=str(record.get('description') or '').strip(),
+                status=str(record.get('status') or '').strip() or SessionStatusChoices.STATUS_ACTIVE,
+                custom_field_data=dict(defaults),
+            )
+            for field, max_length in self.max_lengths.items():
+                value = getattr(session, field)
+                if value and len(value) > max_length:
+                    row_errors.append((number, field, f"Ensure this value has at most {max_length} characters"))
+            if session.status not in statuses:
+                row_errors.append((number, 'status', f"{session.status} is not a valid choice"))
+
+            for field, model in self.fields.items():
+                value = record.get(field)
+                if value in (None, ''):
+                    if field in self.required_fields:
+                        row_errors.append((number, field, "This field is required"))
+                    continue
+                try:
+                    setattr(session, field, self._get_object(resolved, model, value))
+                except ValueError as e:
+                    row_errors.append((number, field, str(e)))
+
+            relations = {}
+            for field, model in self.multiple_fields.items():
+                relations[field] = []
+                for value in self._split(record.get(field)):
+                    try:
+                        relations[field].append(self._get_object(resolved, model, value))
+                    except ValueError as e:
+                        row_errors.append((number, field, str(e)))
+            session._bgp_import_relations = relations
+
+            if session.device is None and session.virtualmachine is None:
+                row_errors.append((number, None, "Either a Device or a VirtualMachine should be selected"))
+
+            if not row_errors:
+                # Run the CUSTOM_VALIDATORS, as Model.clean() would
+                try:
+                    post_clean.send(sender=BGPSession, instance=session)
+                except ValidationError as e:
+                    messages = e.message_dict if hasattr(e, 'error_dict') else {NON_FIELD_ERRORS: e.messages}
+                    for field, field_messages in messages.items():
+                        row_errors += [
+                            (number, None if field == NON_FIELD_ERRORS else field, message)
+                            for message in field_messages
+                        ]
+
+            if row_errors:
+                errors.extend(row_errors)
+            else:
+                session._bgp_import_number = number
+                sessions.append(session)
+
+        sessions, unique_errors = self._check_unique(sessions)
+        errors.extend(unique_errors)
+        return sessions, sorted(errors, key=lambda error: error[0])
+
+    @staticmethod
+    def _unique_keys(device_id, virtualmachine_id, *values):
+        # Sessions are unique per device and per virtual machine
+        keys = []
+        if device_id is not None:
+            keys.append(('device', device_id, *values))
+        if virtualmachine_id is not None:
+            keys.append(('virtualmachine', virtualmachine_id, *values))
+        return keys
+
+    def _check_unique(self, sessions):
+        """
+        Split out the sessions duplicating an existing session or an earlier
+        record, checked with a single query. Returns the unique sessions and
+        the errors of the others.
+        """
+        if not sessions:
+            return sessions, []
+        existing = set()
+        queryset = BGPSession.objects.filter(
+            Q(device__in={s.device_id for s in sessions if s.device_id}) |
+            Q(virtualmachine__in={s.virtualmachine_id for s in sessions if s.virtualmachine_id}),
+            local_address__in={s.local_address_id for s in sessions},
+            remote_address__in={s.remote_address_id for s in sessions},
+        ).values_list(
+            'device', 'virtualmachine', 'local_address', 'local_as', 'remote_address', 'remote_as'
+        )
+        for row in queryset:
+            existing.update(self._unique_keys(*row))
+
+        unique, errors = [], []
+        for session in sessions:
+            keys = self._unique_keys(
+                session.device_id, session.virtualmachine_id, session.local_address_id,
+                session.local_as_id, session.remote_address_id, session.remote_as_id
+            )
+            if existing.intersection(keys):
+                errors.append((
+                    session._bgp_import_number, None,
+                    "A session with this device or virtual machine, addresses and ASNs already exists"
+                ))
+            else:
+                existing.update(keys)
+                unique.append(session)
+        return unique, errors
+
+    def save(self, sessions):
+        """
+        Create the sessions returned by clean() and return them.
+        """
+        import_through = BGPSession.import_policies.through
+        export_through = BGPSession.export_policies.through
+        content_type = ContentType.objects.get_for_model(BGPSession)
+
+        with transaction.atomic():
+            for start in range(0, len(sessions), self.batch_size):
+                batch = sessions[start:start + self.batch_size]
+                BGPSession.objects.bulk_create(batch)
+
+                import_rows, export_rows, tagged_items = [], [], []
+                for session in batch:
+                    relations = session._bgp_import_relations
+                    import_rows += [
+                        import_through(bgpsession_id=session.pk, routingpolicy_id=policy.pk)
+                        for policy in relations['import_policies']
+                    ]
+                    export_rows += [
+                        export_through(bgpsession_id=session.pk, routingpolicy_id=policy.pk)
+                        for policy in relations['export_policies']
+                    ]
+                    tagged_items += [
+                        TaggedItem(content_type=content_type, object_id=session.pk, tag=tag)
+                        for tag in relations['tags']
+                    ]
+                import_through.objects.bulk_create(import_rows, ignore_conflicts=True)
+                export_through.objects.bulk_create(export_rows, ignore_conflicts=True)
+                TaggedItem.objects.bulk_create(tagged_items, ignore_conflicts=True)
+
+                pks = [session.pk for session in batch]
+                BGPSessionEffectivePolicy.rebuild(pks)
+                self._log_changes(pks)
+                invalidate_session_counts(
+                    device_ids=[session.device_id for session in batch],
+                    virtualmachine_ids=[session.virtualmachine_id for session in batch],
+                )
+        return sessions
+
+    def _log_changes(self, pks):
+        # Sessions are read back with their relations so that serializing
+        # them for the change log runs no query per session
+        sessions = list(BGPSession.objects.filter(pk__in=pks).select_related(
+            'device', 'virtualmachine', 'local_address', 'remote_address', 'local_as', 'remote_as',
+        ).prefetch_related('import_policies', 'export_policies', 'tags'))
+
+        changes = []
+        for session in sessions:
+            change = session.to_objectchange(ObjectChangeActionChoices.ACTION_CREATE)
+            change.user = self.user
+            change.user_name = self.user.username if self.user else ''
+            change.request_id = self.request_id
+            changes.append(change)
+        ObjectChange.objects.bulk_create(changes)
+        search_backend.cache(sessions, remove_existing=False)
@@ -0,0 +1,556 @@
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+
+import yaml
+from core.models import Job
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections, transaction
+from dcim.models import Device
+from netbox.jobs import JobRunner
+from netbox.plugins import get_plugin_config
+from netbox.registry import registry
+from utilities.forms import restrict_form_fields
+from utilities.request import NetBoxFakeRequest
+from virtualization.models import VirtualMachine
+
+from . import forms
+from .importers import BGPSessionImporter
+from .models import (
+    BGPPeerGroup, BGPSession, Community, CommunityList, PrefixList, PrefixListRule, RoutingPolicy,
+    RoutingPolicyRule,
+)
+from .rendering import SharedObjects, get_renderers, load_contexts, render_context
+
+
+__all__ = (
+    'BulkImportJob',
+    'FleetConfigRenderJob',
+    'render_fleet',
+)
+
+
+class ProgressJobRunner(JobRunner):
+    """
+    A job publishing its progress in the job data while it runs.
+    """
+
+    def update_progress(self, data):
+        self.job.data = dict(data)
+        # Only the data is written, the job status belongs to the job handler
+        Job.objects.filter(pk=self.job.pk).update(data=self.job.data)
+
+
+# Models rendered by the fleet job, with the directory of their configurations
+FLEET_MODELS = {
+    'device': (Device, 'devices'),
+    'virtualmachine': (VirtualMachine, 'virtual-machines'),
+}
+
+# Errors kept in the job data, the count of failures is always complete
+MAX_REPORTED_ERRORS = 100
+
+
+#
+# Worker processes
+#
+
+_worker = {}
+
+
+def _init_worker(renderer):
+    # Policies and lists are loaded once per worker and shared by every device
+    _worker['renderer'] = renderer
+    _worker['shared'] = SharedObjects.load()
+
+
+def _render_chunk(model_name, pks):
+    """
+    Render the configuration of a chunk of devices or virtual machines. Returns
+    a list of (pk, name, content hash, configuration, error) tuples.
+    """
+    model = FLEET_MODELS[model_name][0]
+    objects = list(model.objects.filter(pk__in=pks))
+    results = []
+    try:
+        contexts = load_contexts(objects, shared=_worker['shared'])
+    except Exception as e:
+        return [(obj.pk, _get_name(obj), None, None, f"{type(e).__name__}: {e}") for obj in objects]
+    for obj in objects:
+        try:
+            content_hash, config = render_context(_worker['renderer'], contexts[obj.pk])
+            results.append((obj.pk, _get_name(obj), content_hash, config, None))
+        except Exception as e:
+            results.append((obj.pk, _get_name(obj), None, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _get_name(obj):
+    return re.sub(r'[^\w.-]+', '_', obj.name or '') or f'{obj._meta.model_name}-{obj.pk}'
+
+
+#
+# Output
+#
+
+class TarballWriter:
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.tarball = tarfile.open(path, 'w:gz')
+
+    def write(self, name, content):
+        data = content.encode()
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.tarball.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.tarball.close()
+
+
+class DirectoryWriter:
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, name, content):
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def close(self):
+        pass
+
+
+def get_default_output(name, archive=True):
+    return os.path.join(settings.MEDIA_ROOT, 'netbox_bgp', f'{name}.tar.gz' if archive else name)
+
+
+def _render_chunks(renderer, work, workers):
+    """
+    Yield the (model name, results) of the chunks of work as they are rendered,
+    by a pool of worker processes, or in this process with a single worker.
+    """
+    if workers == 1:
+        _init_worker(renderer)
+        for model_name, pks in work:
+            yield model_name, _render_chunk(model_name, pks)
+        return
+
+    # Workers are forked and must open their own database connections
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(renderer,),
+    ) as executor:
+        futures = {
+            executor.submit(_render_chunk, model_name, pks): model_name
+            for model_name, pks in work
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def render_fleet(renderer='frr', devices=None, virtualmachines=None, output=None, archive=True,
+                 workers=None, chunk_size=100, progress=None):
+    """
+    Render the BGP configuration of every device and virtual machine having
+    sessions, or of the given ones (primary keys), into a tarball or a
+    directory. Objects are rendered in chunks by a pool of worker processes,
+    each loading the routing policies and lists once, or by this process when
+    `workers` is 1. `progress` is called with the current statistics after
+    every chunk. Returns the statistics.
+    """
+    if renderer not in get_renderers():
+        raise ValueError(f"Unknown renderer: {renderer}")
+    output = output or get_default_output(f'bgp-configs-{renderer}-{int(time.time())}', archive)
+
+    work = []
+    for model_name, selected in (('device', devices), ('virtualmachine', virtualmachines)):
+        pks = BGPSession.objects.filter(
+            **{f'{model_name}__isnull': False}
+        ).values_list(model_name, flat=True).distinct()
+        if selected is not None:
+            pks = pks.filter(**{f'{model_name}__in': list(selected)})
+        pks = sorted(pks)
+        work += [(model_name, pks[i:i + chunk_size]) for i in range(0, len(pks), chunk_size)]
+
+    stats = {
+        'renderer': renderer,
+        'output': output,
+        'total': sum(len(pks) for _, pks in work),
+        'rendered': 0,
+        'failed': 0,
+        'errors': {},
+        'elapsed': 0.0,
+        'per_second': 0.0,
+    }
+    manifest = {}
+    writer = TarballWriter(output) if archive else DirectoryWriter(output)
+    start = time.perf_counter()
+
+    try:
+        for model_name, results in _render_chunks(renderer, work, workers):
+            directory = FLEET_MODELS[model_name][1]
+            for pk, filename, content_hash, config, error in results:
+                name = f'{directory}/{filename}.conf'
+                if name in manifest:
+                    # Device names are only unique per site and tenant
+                    name = f'{directory}/{filename}-{pk}.conf'
+                if error:
+                    stats['failed'] += 1
+                    if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                        stats['errors'][name] = error
+                    continue
+                writer.write(name, config)
+                manifest[name] = content_hash
+                stats['rendered'] += 1
+            stats['elapsed'] = round(time.perf_counter() - start, 2)
+            stats['per_second'] = round((stats['rendered'] + stats['failed']) / max(stats['elapsed'], 0.01), 1)
+            if progress:
+                progress(stats)
+        writer.write('manifest.json', json.dumps(manifest, indent=2, sort_keys=True))
+    finally:
+        writer.close()
+
+    return stats
+
+
+class FleetConfigRenderJob(ProgressJobRunner):
+    """
+    Render the BGP configuration of the whole fleet in the background. Progress
+    and throughput are published in the job data while it runs.
+    """
+
+    class Meta:
+        name = 'BGP fleet configuration render'
+
+    def run(self, renderer='frr', devices=None, virtualmachines=None, archive=True, workers=None,
+            chunk_size=100, *args, **kwargs):
+        name = f'bgp-configs-{renderer}-job-{self.job.pk}'
+        stats = render_fleet(
+            renderer=renderer,
+            devices=devices,
+            virtualmachines=virtualmachines,
+            output=get_default_output(name, archive),
+            archive=archive,
+            workers=workers,
+            chunk_size=chunk_size,
+            progress=self.update_progress,
+        )
+        self.job.data = stats
+        self.logger.info(
+            f"Rendered {stats['rendered']} configurations ({stats['failed']} failed) "
+            f"in {stats['elapsed']}s to {stats['output']}"
+        )
+
+
+#
+# Bulk import
+#
+
+# Models which can be imported, with their import form
+IMPORT_FORMS = {
+    model._meta.model_name: (model, form) for model, form in (
+        (Community, forms.CommunityImportForm),
+        (CommunityList, forms.CommunityListImportForm),
+        (BGPSession, forms.BGPSessionImportForm),
+        (BGPPeerGroup, forms.BGPPeerGroupImportForm),
+        (RoutingPolicy, forms.RoutingPolicyImportForm),
+        (RoutingPolicyRule, forms.RoutingPolicyRuleImportForm),
+        (PrefixList, forms.PrefixListImportForm),
+        (PrefixListRule, forms.PrefixListRuleImportForm),
+    )
+}
+
+
+def get_import_path(name):
+    """
+    Return the path of the data of an import, in the import_directory plugin
+    setting, which is not served by NetBox.
+    """
+    directory = get_plugin_config('netbox_bgp', 'import_directory') or os.path.join(
+        tempfile.gettempdir(), 'netbox_bgp_imports'
+    )
+    return os.path.join(directory, os.path.basename(name))
+
+
+def detect_format(path):
+    with open(path, newline='') as f:
+        head = f.read(4096).lstrip()
+    if head.startswith(('[', '{')):
+        return 'json'
+    if head.startswith('---') or re.match(r'^[\w-]+:(\s|$)', head):
+        return 'yaml'
+    return 'csv'
+
+
+def _read_csv(f, delimiter):
+    if delimiter in (None, '', 'auto'):
+        sample = f.read(4096)
+        f.seek(0)
+        delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter if sample else ','
+    reader = csv.reader(f, delimiter=delimiter)
+    # A header can name the field of a related object to look it up by: "site.slug"
+    headers = {}
+    for header in next(reader, []):
+        field, _, to_field = header.strip().partition('.')
+        headers[field] = to_field or None
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        if len(row) != len(headers):
+            raise ValueError(f"Line {reader.line_num}: {len(row)} values for {len(headers)} headers")
+        yield headers, dict(zip(headers, (value.strip() for value in row)))
+
+
+def _read_json(f):
+    # A list or an object, else one object per line
+    head = f.read(4096).lstrip()
+    f.seek(0)
+    if head.startswith('['):
+        yield from json.load(f)
+        return
+    lines = (line for line in f if line.strip())
+    first = next(lines, None)
+    if first is None:
+        return
+    try:
+        yield json.loads(first)
+    except json.JSONDecodeError:
+        f.seek(0)
+        yield json.load(f)
+        return
+    for line in lines:
+        yield json.loads(line)
+
+
+def iter_records(path, data_format='auto', csv_delimiter='auto'):
+    """
+    Yield the (CSV headers, record) of an import file one at a time. CSV files,
+    JSON lines and YAML documents are read as they are iterated; a JSON array
+    is read at once.
+    """
+    if data_format in (None, '', 'auto'):
+        data_format = detect_format(path)
+    with open(path, newline='') as f:
+        if data_format == 'csv':
+            yield from _read_csv(f, csv_delimiter)
+        elif data_format == 'json':
+            yield from ((None, record) for record in _read_json(f))
+        elif data_format == 'yaml':
+            for document in yaml.safe_load_all(f):
+                for record in document if isinstance(document, list) else [document]:
+                    if record is not None:
+                        yield None, record
+        else:
+            raise ValueError(f"Unknown format: {data_format}")
+
+
+class BulkImportJob(ProgressJobRunner):
+    """
+    Import BGP objects from a file in the background.
+
+    The file is parsed as it is read and records are committed in batches.
+    Invalid records are skipped and reported in the job data, together with
+    the progress and throughput. The number of records processed is saved
+    after each batch, so that a job which failed can be resumed where it
+    stopped: the data is submitted again with the "resume" argument.
+    """
+
+    class Meta:
+        name = 'BGP bulk import'
+
+    # Errors kept in the job data, the count of failures is always complete
+    max_errors = 1000
+
+    @classmethod
+    def enqueue_import(cls, model, data, user, data_format='auto', csv_delimiter='auto', batch_size=500,
+                       resume=None, **kwargs):
+        """
+        Store the data to import (a string, an uploaded file or an open binary
+        file) and enqueue a job importing it. The data is kept in the private
+        import directory until the job ends. Extra arguments are passed to
+        enqueue(), e.g. immediate=True.
+        """
+        name = f'{uuid.uuid4().hex}.data'
+        path = get_import_path(name)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        with open(path, 'wb') as f:
+            if isinstance(data, str):
+                f.write(data.encode())
+            elif hasattr(data, 'chunks'):
+                for chunk in data.chunks():
+                    f.write(chunk)
+            else:
+                shutil.copyfileobj(data, f)
+        try:
+            return cls.enqueue(
+                user=user,
+                model=model._meta.model_name,
+                upload=name,
+                data_format=data_format,
+                csv_delimiter=csv_delimiter,
+                batch_size=batch_size,
+                resume=resume,
+                **kwargs
+            )
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    def get_request(self):
+        # Change logging and event rules are bound to a request
+        return NetBoxFakeRequest({
+            'META': {},
+            'COOKIES': {},
+            'POST': {},
+            'GET': {},
+            'FILES': {},
+            'user': self.job.user,
+            'path': '',
+            'id': uuid.uuid4(),
+        })
+
+    def import_form_records(self, model, form, batch, request):
+        """
+        Create or update the objects of a batch of (number, headers, record)
+        with the import form of the model, whose related objects are limited
+        to those the user can view. Returns the saved objects and the errors.
+        """
+        saved, errors = [], []
+        ids = [record['id'] for _, _, record in batch if record.get('id')]
+        instances = model.objects.in_bulk([int(pk) for pk in ids if str(pk).isdecimal()])
+        for number, headers, record in batch:
+            object_id = record.get('id')
+            if object_id:
+                instance = instances.get(int(object_id)) if str(object_id).isdecimal() else None
+                if instance is None:
+                    errors.append((number, 'id', f"Object {object_id} not found"))
+                    continue
+                instance.snapshot()
+            else:
+                instance = model()
+                instance.populate_custom_field_defaults()
+            kwargs = {'data': record, 'instance': instance}
+            if headers is not None:
+                kwargs['headers'] = headers
+            model_form = form(**kwargs)
+            restrict_form_fields(model_form, request.user)
+            if object_id:
+                # Only the fields present in the record are changed
+                for field_name in [name for name in model_form.fields if name not in record]:
+                    del model_form.fields[field_name]
+            if model_form.is_valid():
+                saved.append(model_form.save())
+            else:
+                for field, messages in model_form.errors.items():
+                    errors += [(number, None if field == '__all__' else field, str(message)) for message in messages]
+        return saved, errors
+
+    def import_batch(self, model, form, batch, request):
+        records = [record for _, _, record in batch]
+        headers = batch[0][1]
+        if model is BGPSession and BGPSessionImporter.supports(records, headers):
+            importer = BGPSessionImporter(user=request.user, request_id=request.id)
+            sessions, errors = importer.clean(records)
+            numbers = [number for number, _, _ in batch]
+            errors = [(numbers[index - 1], field, message) for index, field, message in errors]
+            return importer.save(sessions), errors
+        return self.import_form_records(model, form, batch, request)
+
+    @staticmethod
+    def check_permissions(model, objects, user):
+        for action, pks in (
+            ('add', [obj.pk for obj in objects if not getattr(obj, '_prechange_snapshot', None)]),
+            ('change', [obj.pk for obj in objects if getattr(obj, '_prechange_snapshot', None)]),
+        ):
+            if pks and model.objects.restrict(user, action).filter(pk__in=pks).count() != len(pks):
+                raise PermissionDenied(f"Permission denied to {action} some of the {model._meta.verbose_name_plural}")
+
+    def run(self, model=None, upload=None, data_format='auto', csv_delimiter='auto', batch_size=500,
+            resume=None, *args, **kwargs):
+        path = get_import_path(upload)
+        try:
+            self.import_file(model, path, data_format, csv_delimiter, batch_size, resume)
+        finally:
+            # The data is resubmitted to resume a failed import
+            if os.path.exists(path):
+                os.remove(path)
+
+    def import_file(self, model, path, data_format, csv_delimiter, batch_size, resume):
+        progress = {'errors': [], 'created': 0, 'updated': 0, 'failed': 0, 'processed': 0}
+        if resume:
+            # Continue the import of a previous job from its last checkpoint
+            previous = Job.objects.get(pk=resume).data or {}
+            if previous.get('model') != model:
+                raise ValueError(f"Job {resume} imported {previous.get('model')}, not {model}")
+            progress.update({key: previous[key] for key in progress if key in previous})
+            data_format, csv_delimiter = previous['format'], previous['csv_delimiter']
+            batch_size = previous.get('batch_size', batch_size)
+        model_class, form = IMPORT_FORMS[model]
+        progress.update({
+            'model': model,
+            'format': data_format,
+            'csv_delimiter': csv_delimiter,
+            'batch_size': batch_size,
+            'resumed_from': resume,
+        })
+        checkpoint = progress['processed']
+        request = self.get_request()
+        start = time.perf_counter()
+
+        records = iter_records(path, data_format, csv_delimiter)
+        numbered = ((number, headers, record) for number, (headers, record) in enumerate(records, start=1))
+        numbered = itertools.islice(numbered, checkpoint, None)
+        self.update_progress(progress)
+
+        while batch := list(itertools.islice(numbered, batch_size)):
+            # Change records and events are flushed after each batch
+            with ExitStack() as stack, transaction.atomic():
+                for request_processor in registry['request_processors']:
+                    stack.enter_context(request_processor(request))
+                saved, errors = self.import_batch(model_class, form, batch, request)
+                self.check_permissions(model_class, saved, request.user)
+            failed = {number for number, _, _ in errors}
+            for number, _, record in batch:
+                if number in failed:
+                    progress['failed'] += 1
+                elif record.get('id'):
+                    progress['updated'] += 1
+                else:
+                    progress['created'] += 1
+            progress['processed'] += len(batch)
+            progress['errors'] = (progress['errors'] + [
+                f"Record {number} {field}: {message}" if field else f"Record {number}: {message}"
+                for number, field, message in errors
+            ])[:self.max_errors]
+            elapsed = time.perf_counter() - start
+            progress['elapsed'] = round(elapsed, 2)
+            progress['per_second'] = round((progress['processed'] - checkpoint) / max(elapsed, 0.01), 1)
+            self.update_progress(progress)
+
+        self.logger.info(
+            f"Imported {progress['processed']} records: {progress['created']} created, "
+            f"{progress['updated']} updated, {progress['failed']} failed"
+        )
@@ -0,0 +1,234 @@
+import statistics
+import time
+
+import netaddr
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from dcim.models import Device, DeviceRole, DeviceType, Manufacturer, Site
+from ipam.models import ASN, IPAddress, RIR
+from tenancy.models import Tenant
+from netbox_bgp.choices import SessionStatusChoices
+from netbox_bgp.filtersets import BGPSessionFilterSet
+from netbox_bgp.models import BGPPeerGroup, BGPSession, BGPSessionEffectivePolicy, RoutingPolicy
+
+
+BATCH_SIZE = 5000
+
+# Mostly active sessions, as in a production network
+STATUSES = (
+    [SessionStatusChoices.STATUS_ACTIVE] * 7
+    + [SessionStatusChoices.STATUS_PLANNED, SessionStatusChoices.STATUS_OFFLINE, SessionStatusChoices.STATUS_FAILED]
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark BGP session lookups against a generated dataset. "
+        "The dataset is created inside a transaction which is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sessions', type=int, default=100000,
+            help="Number of sessions to generate (default: 100000)"
+        )
+        parser.add_argument(
+            '--policies', type=int, default=50,
+            help="Number of routing policies to generate (default: 50)"
+        )
+        parser.add_argument(
+            '--peer-groups', type=int, default=100,
+            help="Number of peer groups to generate (default: 100)"
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help="Number of runs per measured query (default: 5)"
+        )
+        parser.add_argument(
+            '--per-page', type=int, default=50,
+            help="Page size used for the paginated lookups (default: 50)"
+        )
+        parser.add_argument(
+            '--explain', action='store_true',
+            help="Print the query plans of the session filters without and with the plugin's indexes"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.generate(options)
+                self.run(options)
+                if options['explain']:
+                    self.explain()
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Generated dataset rolled back.")
+
+    def generate(self, options):
+        start = time.perf_counter()
+        self.stdout.write(f"Generating {options['sessions']} sessions...")
+
+        rir = RIR.objects.create(name='netbox-bgp-benchmark', slug='netbox-bgp-benchmark')
+        local_as = ASN.objects.create(asn=4199999000, rir=rir)
+        remote_asns = ASN.objects.bulk_create(
+            ASN(asn=4199999001 + i, rir=rir) for i in range(500)
+        )
+        local_ip = IPAddress.objects.create(address='100.64.0.1/32')
+        sites = Site.objects.bulk_create(
+            Site(name=f'benchmark-site-{i}', slug=f'benchmark-site-{i}') for i in range(50)
+        )
+        tenants = Tenant.objects.bulk_create(
+            Tenant(name=f'benchmark-tenant-{i}', slug=f'benchmark-tenant-{i}') for i in range(20)
+        )
+        manufacturer = Manufacturer.objects.create(name='benchmark', slug='benchmark')
+        device_type = DeviceType.objects.create(manufacturer=manufacturer, model='benchmark', slug='benchmark')
+        role = DeviceRole.objects.create(name='benchmark', slug='benchmark')
+        devices = [
+            Device.objects.create(
+                name=f'benchmark-device-{i}', site=sites[i % len(sites)], device_type=device_type, role=role
+            )
+            for i in range(500)
+        ]
+
+        self.policies = RoutingPolicy.objects.bulk_create(
+            RoutingPolicy(name=f'benchmark-policy-{i}', description='netbox-bgp-benchmark')
+            for i in range(options['policies'])
+        )
+        peer_groups = BGPPeerGroup.objects.bulk_create(
+            BGPPeerGroup(name=f'benchmark-group-{i}', description='netbox-bgp-benchmark')
+            for i in range(options['peer_groups'])
+        )
+        # Every peer group imports the first (widely shared) policy
+        ImportThrough = BGPPeerGroup.import_policies.through
+        ExportThrough = BGPPeerGroup.export_policies.through
+        ImportThrough.objects.bulk_create(
+            ImportThrough(bgppeergroup=group, routingpolicy=pol)
+            for i, group in enumerate(peer_groups)
+            for pol in {self.policies[0], self.policies[i % len(self.policies)]}
+        )
+        ExportThrough.objects.bulk_create(
+            ExportThrough(bgppeergroup=group, routingpolicy=self.policies[-1 - i % len(self.policies)])
+            for i, group in enumerate(peer_groups)
+        )
+
+        SessionImportThrough = BGPSession.import_policies.through
+        base = int(netaddr.IPAddress('100.64.1.0'))
+        for offset in range(0, options['sessions'], BATCH_SIZE):
+            count = min(BATCH_SIZE, options['sessions'] - offset)
+            remote_ips = IPAddress.objects.bulk_create(
+                IPAddress(address=f'{netaddr.IPAddress(base + offset + i)}/32')
+                for i in range(count)
+            )
+            sessions = BGPSession.objects.bulk_create(
+                BGPSession(
+                    name=f'benchmark-session-{offset + i}',
+                    device=devices[(offset + i) % len(devices)],
+                    site=devices[(offset + i) % len(devices)].site,
+                    tenant=tenants[(offset + i) % len(tenants)],
+                    status=STATUSES[(offset + i) % len(STATUSES)],
+                    local_address=local_ip,
+                    remote_address=remote_ip,
+                    local_as=local_as,
+                    remote_as=remote_asns[(offset + i) % len(remote_asns)],
+                    peer_group=peer_groups[(offset + i) % len(peer_groups)],
+                )
+                for i, remote_ip in enumerate(remote_ips)
+            )
+            SessionImportThrough.objects.bulk_create(
+                SessionImportThrough(
+                    bgpsession=session,
+                    routingpolicy=self.policies[(offset + i) % len(self.policies)]
+                )
+                for i, session in enumerate(sessions)
+            )
+            BGPSessionEffectivePolicy.rebuild(session.pk for session in sessions)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {BGPSession._meta.db_table}')
+        self.sample = BGPSession.objects.select_related('remote_address').get(name='benchmark-session-0')
+        self.stdout.write(f"Dataset generated in {time.perf_counter() - start:.1f}s")
+
+    def measure(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"  {label:<45} best {min(timings):9.2f} ms   median {statistics.median(timings):9.2f} ms"
+        )
+
+    def paginate(self, queryset, per_page):
+        # What a paginated table does: count the rows, then fetch the first page
+        queryset.count()
+        list(queryset.order_by('pk')[:per_page])
+
+    def run(self, options):
+        repeat = options['repeat']
+        per_page = options['per_page']
+        policy = self.policies[0]
+
+        self.stdout.write(f"Sessions using policy {policy} (widely shared):")
+        self.measure(
+            "BGPSession.objects.using_policy()",
+            lambda: self.paginate(BGPSession.objects.using_policy(policy), per_page),
+            repeat
+        )
+        legacy = BGPSession.objects.filter(
+            Q(import_policies=policy)
+            | Q(export_policies=policy)
+            | Q(peer_group__in=policy.group_import_policies.all())
+            | Q(peer_group__in=policy.group_export_policies.all())
+        ).distinct()
+        self.measure(
+            "four-way OR + DISTINCT (legacy)",
+            lambda: self.paginate(legacy, per_page),
+            repeat
+        )
+
+    def get_filter_paths(self):
+        # Lookups issued by BGPSessionFilterSet for the most common filters
+        sample = self.sample
+        active = SessionStatusChoices.STATUS_ACTIVE
+        return (
+            ("status", BGPSession.objects.filter(status=active)),
+            ("site + status", BGPSession.objects.filter(site=sample.site_id, status=active)),
+            ("tenant + status", BGPSession.objects.filter(tenant=sample.tenant_id, status=active)),
+            ("remote_as", BGPSession.objects.filter(remote_as=sample.remote_as_id)),
+            ("peer_group", BGPSession.objects.filter(peer_group=sample.peer_group_id)),
+            ("active sessions by device", BGPSession.objects.filter(device=sample.device_id, status=active)),
+            # Served by the trigram index on UPPER(name) and UPPER(description)
+            ("quick search", BGPSessionFilterSet({'q': 'SESSION-1234'}, BGPSession.objects.all()).qs),
+            (
+                "by_remote_address",
+                BGPSession.objects.filter(remote_address__address=str(sample.remote_address.address))
+            ),
+        )
+
+    def print_plans(self, title):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for label, queryset in self.get_filter_paths():
+            self.stdout.write(f"-- {label}")
+            self.stdout.write(queryset.explain(analyze=True))
+            self.stdout.write("")
+
+    def explain(self):
+        indexes = BGPSession._meta.indexes
+        # DDL is transactional on PostgreSQL: the indexes come back on rollback
+        with connection.schema_editor() as schema_editor:
+            for index in indexes:
+                schema_editor.remove_index(BGPSession, index)
+        self.print_plans("Query plans without the netbox_bgp session indexes")
+
+        with connection.schema_editor() as schema_editor:
+            for index in indexes:
+                schema_editor.add_index(BGPSession, index)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {BGPSession._meta.db_table}')
+        self.print_plans("Query plans with the netbox_bgp session indexes")
@@ -0,0 +1,72 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_bgp.engine import PrefixListTrie, parse_prefix
+from netbox_bgp.models import PrefixList
+
+
+class Command(BaseCommand):
+    help = (
+        "Check prefixes (e.g. customer announcements) against a prefix list. "
+        "Prefixes are read one per line from the given files or from standard input."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'prefix_list',
+            help="Name or ID of the prefix list"
+        )
+        parser.add_argument(
+            'files', nargs='*',
+            help="Files to read the prefixes from (default: standard input)"
+        )
+        parser.add_argument(
+            '--denied-only', action='store_true',
+            help="Only print the prefixes which are not permitted"
+        )
+
+    def get_prefix_list(self, value):
+        queryset = PrefixList.objects.filter(pk=value) if value.isdigit() else PrefixList.objects.filter(name=value)
+        prefix_lists = list(queryset[:2])
+        if not prefix_lists:
+            raise CommandError(f"Prefix list {value} not found")
+        if len(prefix_lists) > 1:
+            raise CommandError(f"Several prefix lists are named {value}, use the ID instead")
+        return prefix_lists[0]
+
+    def read_prefixes(self, files):
+        for name in files or ['-']:
+            handle = sys.stdin if name == '-' else open(name)
+            with handle:
+                for line in handle:
+                    line = line.split('#', 1)[0].strip()
+                    if line:
+                        yield line
+
+    def handle(self, *args, **options):
+        prefix_list = self.get_prefix_list(options['prefix_list'])
+        trie = PrefixListTrie.from_prefix_list(prefix_list)
+
+        values = list(self.read_prefixes(options['files']))
+        try:
+            prefixes = [parse_prefix(value) for value in values]
+        except ValueError as e:
+            raise CommandError(e)
+
+        start = time.perf_counter()
+        verdicts = trie.classify(prefixes)
+        elapsed = time.perf_counter() - start
+
+        for value, permitted in zip(values, verdicts):
+            if permitted and options['denied_only']:
+                continue
+            self.stdout.write(f"{value} {'permit' if permitted else 'deny'}")
+
+        denied = verdicts.count(False)
+        self.stderr.write(
+            f"{len(verdicts)} prefixes checked against {prefix_list} ({len(trie)} rules) in {elapsed:.3f}s: "
+            f"{len(verdicts) - denied} permitted, {denied} denied"
+        )
+
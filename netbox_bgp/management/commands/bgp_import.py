@@ -0,0 +1,97 @@
+import sys
+
+from core.models import Job
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_bgp.jobs import IMPORT_FORMS, BulkImportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Import BGP objects from a CSV, JSON or YAML file with the columns of the bulk "
+        "import form. The file is read in chunks and committed in batches; a failed "
+        "import can be resumed from its last batch by importing the same file with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model', choices=sorted(IMPORT_FORMS),
+            help="Model to import"
+        )
+        parser.add_argument(
+            'file',
+            help="File to import (- for standard input)"
+        )
+        parser.add_argument(
+            '--user',
+            help="User running the import, whose permissions apply (default: the user of the resumed job)"
+        )
+        parser.add_argument(
+            '--format', choices=('auto', 'csv', 'json', 'yaml'), default='auto',
+            help="Data format (default: auto)"
+        )
+        parser.add_argument(
+            '--csv-delimiter', default='auto',
+            help="CSV delimiter (default: auto)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Number of records committed together (default: 500)"
+        )
+        parser.add_argument(
+            '--resume', type=int, metavar='JOB',
+            help="Resume the import of a failed job from the same file"
+        )
+        parser.add_argument(
+            '--background', action='store_true',
+            help="Enqueue a background job instead of importing now"
+        )
+
+    def handle(self, *args, **options):
+        kwargs = {'immediate': not options['background']}
+        model = IMPORT_FORMS[options['model']][0]
+        user = None
+
+        if options['resume']:
+            try:
+                previous = Job.objects.get(pk=options['resume'], name=BulkImportJob.name)
+            except Job.DoesNotExist:
+                raise CommandError(f"Import job {options['resume']} not found")
+            if (previous.data or {}).get('model') != model._meta.model_name:
+                raise CommandError(f"Job {previous.pk} has no {options['model']} checkpoint to resume from")
+            user = previous.user
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+        if user is None:
+            raise CommandError("A user is required")
+
+        handle = sys.stdin.buffer if options['file'] == '-' else open(options['file'], 'rb')
+        with handle:
+            job = BulkImportJob.enqueue_import(
+                model,
+                handle,
+                user=user,
+                data_format=options['format'],
+                csv_delimiter=options['csv_delimiter'],
+                batch_size=options['batch_size'],
+                resume=options['resume'],
+                **kwargs
+            )
+
+        if options['background']:
+            self.stdout.write(f"Enqueued job {job.pk} ({job.job_id})")
+            return
+        job.refresh_from_db()
+        data = job.data or {}
+        for error in data.get('errors', []):
+            self.stderr.write(error)
+        self.stdout.write(
+            f"Job {job.pk} {job.status}: {data.get('processed', 0)} records processed, "
+            f"{data.get('created', 0)} created, {data.get('updated', 0)} updated, {data.get('failed', 0)} failed"
+        )
+        if job.error:
+            raise CommandError(f"{job.error} (import the same file with --resume {job.pk} to resume)")
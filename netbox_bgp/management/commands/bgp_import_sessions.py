@@ -0,0 +1,88 @@
+import csv
+import json
+import os
+import sys
+import time
+
+import yaml
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_bgp.importers import BGPSessionImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Create BGP sessions from a CSV, JSON or YAML file using the columns of the "
+        "session import form. References are resolved in bulk and sessions are "
+        "created in batches; nothing is created if any record is invalid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            help="File to import (- for standard input)"
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'json', 'yaml'),
+            help="Data format (default: guessed from the file extension, else CSV)"
+        )
+        parser.add_argument(
+            '--user',
+            help="Username recorded in the change log"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of sessions created per query (default: 1000)"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only validate the records"
+        )
+
+    def read_records(self, name, data_format):
+        if not data_format:
+            extension = os.path.splitext(name)[1].lower()
+            data_format = {'.json': 'json', '.yaml': 'yaml', '.yml': 'yaml'}.get(extension, 'csv')
+        handle = sys.stdin if name == '-' else open(name, newline='')
+        with handle:
+            if data_format == 'json':
+                records = json.load(handle)
+            elif data_format == 'yaml':
+                records = yaml.safe_load(handle)
+            else:
+                records = list(csv.DictReader(handle))
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise CommandError("The data must be a list of records")
+        return records
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+
+        records = self.read_records(options['file'], options['format'])
+        if not BGPSessionImporter.supports(records):
+            raise CommandError(
+                "Only the creation of sessions with the default columns is supported, "
+                "use the bulk import view for updates and custom fields"
+            )
+
+        start = time.perf_counter()
+        importer = BGPSessionImporter(user=user, batch_size=options['batch_size'])
+        sessions, errors = importer.clean(records)
+        for number, field, message in errors:
+            self.stderr.write(f"Record {number}{f' {field}' if field else ''}: {message}")
+        if errors:
+            raise CommandError(f"{len(errors)} errors in {len(records)} records, nothing imported")
+        if options['dry_run']:
+            self.stdout.write(f"{len(sessions)} records are valid")
+            return
+
+        importer.save(sessions)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(sessions)} sessions in {time.perf_counter() - start:.1f}s"
+        ))
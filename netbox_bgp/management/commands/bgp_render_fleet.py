@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_bgp.jobs import FleetConfigRenderJob, render_fleet
+from netbox_bgp.rendering import get_renderers
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the BGP configuration of every device and virtual machine having sessions, "
+        "in parallel, into a tarball or a directory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--renderer', default='frr',
+            help="Renderer to use (default: frr)"
+        )
+        parser.add_argument(
+            '--device', type=int, action='append', dest='devices',
+            help="Only render this device ID (can be repeated)"
+        )
+        parser.add_argument(
+            '--virtual-machine', type=int, action='append', dest='virtualmachines',
+            help="Only render this virtual machine ID (can be repeated)"
+        )
+        parser.add_argument(
+            '--output',
+            help="Tarball or directory to write to (default: under MEDIA_ROOT)"
+        )
+        parser.add_argument(
+            '--directory', action='store_true',
+            help="Write one file per device instead of a tarball"
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            help="Number of worker processes (default: number of CPUs)"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help="Number of devices rendered per task (default: 100)"
+        )
+        parser.add_argument(
+            '--background', action='store_true',
+            help="Enqueue a background job instead of rendering now"
+        )
+
+    def handle(self, *args, **options):
+        if options['renderer'] not in get_renderers():
+            raise CommandError(f"Unknown renderer: {options['renderer']}")
+        if options['chunk_size'] < 1:
+            raise CommandError("The chunk size must be positive")
+
+        kwargs = {
+            'renderer': options['renderer'],
+            'devices': options['devices'],
+            'virtualmachines': options['virtualmachines'],
+            'archive': not options['directory'],
+            'workers': options['workers'],
+            'chunk_size': options['chunk_size'],
+        }
+        if options['background']:
+            if options['output']:
+                raise CommandError("Background jobs always write under MEDIA_ROOT")
+            job = FleetConfigRenderJob.enqueue(**kwargs)
+            self.stdout.write(f"Enqueued job {job.pk} ({job.job_id})")
+            return
+
+        def progress(stats):
+            self.stderr.write(
+                f"{stats['rendered'] + stats['failed']}/{stats['total']} "
+                f"({stats['per_second']}/s, {stats['failed']} failed)"
+            )
+
+        stats = render_fleet(output=options['output'], progress=progress, **kwargs)
+        for name, error in stats['errors'].items():
+            self.stderr.write(f"{name}: {error}")
+        self.stdout.write(
+            f"Rendered {stats['rendered']} configurations ({stats['failed']} failed) "
+            f"in {stats['elapsed']}s to {stats['output']}"
+        )
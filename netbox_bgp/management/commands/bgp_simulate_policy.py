@@ -0,0 +1,75 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_bgp.engine import Route, compile_routing_policies
+from netbox_bgp.models import RoutingPolicy
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply a routing policy to routes read from the given files or from standard input. "
+        "Each line holds either a prefix or a JSON object such as "
+        '{"prefix": "10.0.0.0/8", "communities": ["65000:1"], "as_path": [65001], "med": 0}. '
+        "Results are written as one JSON object per line."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'policy',
+            help="Name or ID of the routing policy"
+        )
+        parser.add_argument(
+            'files', nargs='*',
+            help="Files to read the routes from (default: standard input)"
+        )
+        parser.add_argument(
+            '--denied-only', action='store_true',
+            help="Only print the routes denied by the policy"
+        )
+
+    def get_policy(self, value):
+        queryset = RoutingPolicy.objects.filter(pk=value) if value.isdigit() else RoutingPolicy.objects.filter(name=value)
+        policies = list(queryset[:2])
+        if not policies:
+            raise CommandError(f"Routing policy {value} not found")
+        if len(policies) > 1:
+            raise CommandError(f"Several routing policies are named {value}, use the ID instead")
+        return policies[0]
+
+    def read_routes(self, files):
+        for name in files or ['-']:
+            handle = sys.stdin if name == '-' else open(name)
+            with handle:
+                for number, line in enumerate(handle, start=1):
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    try:
+                        yield Route.from_dict(json.loads(line) if line.startswith('{') else line)
+                    except (TypeError, ValueError) as e:
+                        raise CommandError(f"{name}:{number}: {e}")
+
+    def handle(self, *args, **options):
+        policy = self.get_policy(options['policy'])
+        compiled = compile_routing_policies([policy])[policy.pk]
+        for warning in compiled.warnings:
+            self.stderr.write(self.style.WARNING(warning))
+
+        routes = list(self.read_routes(options['files']))
+        start = time.perf_counter()
+        results = compiled.evaluate_many(routes)
+        elapsed = time.perf_counter() - start
+
+        for result in results:
+            if result.permitted and options['denied_only']:
+                continue
+            self.stdout.write(json.dumps(result.to_dict()))
+
+        denied = sum(not result.permitted for result in results)
+        self.stderr.write(
+            f"{len(results)} routes evaluated against {policy} in {elapsed:.3f}s: "
+            f"{len(results) - denied} permitted, {denied} denied"
+        )
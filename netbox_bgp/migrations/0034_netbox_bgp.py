@@ -0,0 +1,68 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_effective_policies(apps, schema_editor):
+    """
+    Build the effective policy rows of existing sessions.
+    """
+    BGPSession = apps.get_model('netbox_bgp', 'BGPSession')
+    BGPSessionEffectivePolicy = apps.get_model('netbox_bgp', 'BGPSessionEffectivePolicy')
+
+    sessions = BGPSession.objects.select_related('peer_group').prefetch_related(
+        'import_policies', 'export_policies',
+        'peer_group__import_policies', 'peer_group__export_policies',
+    )
+    rows = []
+    for session in sessions.iterator(chunk_size=2000):
+        for direction in ('import', 'export'):
+            field_name = f'{direction}_policies'
+            own = list(getattr(session, field_name).all())
+            inherited = []
+            if session.peer_group:
+                own_pks = {pol.pk for pol in own}
+                inherited = [
+                    pol for pol in getattr(session.peer_group, field_name).all()
+                    if pol.pk not in own_pks
+                ]
+            order = 0
+            for source, policies in (('session', own), ('peer_group', inherited)):
+                for pol in policies:
+                    rows.append(BGPSessionEffectivePolicy(
+                        session=session, policy=pol, direction=direction, source=source, order=order
+                    ))
+                    order += 1
+        if len(rows) >= 5000:
+            BGPSessionEffectivePolicy.objects.bulk_create(rows)
+            rows = []
+    BGPSessionEffectivePolicy.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_bgp', '0033_alter_bgpsession_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BGPSessionEffectivePolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('direction', models.CharField(choices=[('import', 'Import'), ('export', 'Export')], max_length=10)),
+                ('source', models.CharField(choices=[('session', 'Session'), ('peer_group', 'Peer Group')], max_length=20)),
+                ('order', models.PositiveIntegerField()),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_sessions', to='netbox_bgp.routingpolicy')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_policies', to='netbox_bgp.bgpsession')),
+            ],
+            options={
+                'ordering': ('session', 'direction', 'order'),
+                'indexes': [models.Index(fields=['policy', 'direction'], name='netbox_bgp_effpol_policy_idx')],
+                'constraints': [models.UniqueConstraint(fields=('session', 'direction', 'policy'), name='netbox_bgp_effectivepolicy_unique')],
+            },
+        ),
+        migrations.RunPython(
+            code=populate_effective_policies,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_bgp', '0034_netbox_bgp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=models.Index(fields=['status'], name='netbox_bgp_session_status'),
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=models.Index(fields=['site', 'status'], name='netbox_bgp_session_site_status'),
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=models.Index(fields=['tenant', 'status'], name='netbox_bgp_session_tenant_st'),
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=models.Index(fields=['remote_as', 'status'], name='netbox_bgp_session_ras_status'),
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=models.Index(fields=['peer_group', 'status'], name='netbox_bgp_session_pg_status'),
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['device'], name='netbox_bgp_session_dev_active'),
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['virtualmachine'], name='netbox_bgp_session_vm_active'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_bgp', '0035_netbox_bgp'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='routingpolicy',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name', 'description'], name='netbox_bgp_routingpolicy_trgm', opclasses=['gin_trgm_ops', 'gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='bgppeergroup',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name', 'description'], name='netbox_bgp_peergroup_trgm', opclasses=['gin_trgm_ops', 'gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='community',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['value', 'description'], name='netbox_bgp_community_trgm', opclasses=['gin_trgm_ops', 'gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='communitylist',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name', 'description'], name='netbox_bgp_communitylist_trgm', opclasses=['gin_trgm_ops', 'gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='communitylistrule',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='netbox_bgp_commlistrule_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='prefixlist',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name', 'description'], name='netbox_bgp_prefixlist_trgm', opclasses=['gin_trgm_ops', 'gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='prefixlistrule',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='netbox_bgp_prefixlistrule_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name', 'description'], name='netbox_bgp_session_trgm', opclasses=['gin_trgm_ops', 'gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='routingpolicyrule',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='netbox_bgp_rprule_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,16 @@
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_bgp', '0036_netbox_bgp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prefixlistrule',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['prefix_custom'], name='netbox_bgp_plrule_prefix_gist', opclasses=['inet_ops']),
+        ),
+    ]
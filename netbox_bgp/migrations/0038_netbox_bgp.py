@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_bgp', '0037_netbox_bgp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='routingpolicy',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_rp_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='bgppeergroup',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_peergroup_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='community',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_community_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='communitylist',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_commlist_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='communitylistrule',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_commlistrule_upd'),
+        ),
+        migrations.AddIndex(
+            model_name='prefixlist',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_prefixlist_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='prefixlistrule',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_plrule_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_session_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='routingpolicyrule',
+            index=models.Index(fields=['last_updated'], name='netbox_bgp_rprule_updated'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_bgp', '0038_netbox_bgp'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='routingpolicy',
+            name='netbox_bgp_routingpolicy_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='routingpolicy',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_routingpolicy_trgm'),
+        ),
+        migrations.RemoveIndex(
+            model_name='bgppeergroup',
+            name='netbox_bgp_peergroup_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='bgppeergroup',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_peergroup_trgm'),
+        ),
+        migrations.RemoveIndex(
+            model_name='community',
+            name='netbox_bgp_community_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='community',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('value'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_community_trgm'),
+        ),
+        migrations.RemoveIndex(
+            model_name='communitylist',
+            name='netbox_bgp_communitylist_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='communitylist',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_communitylist_trgm'),
+        ),
+        migrations.RemoveIndex(
+            model_name='communitylistrule',
+            name='netbox_bgp_commlistrule_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='communitylistrule',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_commlistrule_trgm'),
+        ),
+        migrations.RemoveIndex(
+            model_name='prefixlist',
+            name='netbox_bgp_prefixlist_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='prefixlist',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_prefixlist_trgm'),
+        ),
+        migrations.RemoveIndex(
+            model_name='prefixlistrule',
+            name='netbox_bgp_prefixlistrule_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='prefixlistrule',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_prefixlistrule_trgm'),
+        ),
+        migrations.RemoveIndex(
+            model_name='bgpsession',
+            name='netbox_bgp_session_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='bgpsession',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_session_trgm'),
+        ),
+        migrations.RemoveIndex(
+            model_name='routingpolicyrule',
+            name='netbox_bgp_rprule_trgm',
+        ),
+        migrations.AddIndex(
+            model_name='routingpolicyrule',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('description'), name='gin_trgm_ops'), name='netbox_bgp_rprule_trgm'),
+        ),
+    ]
@@ -1,12 +1,18 @@
 from django.urls import reverse
 from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, GistIndex, OpClass
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
 
 from netbox.models import NetBoxModel
 from ipam.fields import IPNetworkField
 
-from .choices import IPAddressFamilyChoices, SessionStatusChoices, ActionChoices, CommunityStatusChoices
+from .querysets import BGPSessionQuerySet, RoutingPolicyRuleQuerySet
+from .choices import (
+    IPAddressFamilyChoices, SessionStatusChoices, ActionChoices, CommunityStatusChoices,
+    PolicyDirectionChoices, PolicySourceChoices,
+)
 
 
 class RoutingPolicy(NetBoxModel):
@@ -26,6 +32,14 @@ class RoutingPolicy(NetBoxModel):
     class Meta:
         verbose_name_plural = 'Routing Policies'
         unique_together = ['name', 'description']
+        indexes = [
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_routingpolicy_trgm'
+            ),
+            models.Index(fields=['last_updated'], name='netbox_bgp_rp_updated'),
+        ]
 
     def __str__(self):
         return self.name
@@ -61,6 +75,14 @@ class BGPPeerGroup(NetBoxModel):
     class Meta:
         verbose_name_plural = 'Peer Groups'
         unique_together = ['name', 'description']
+        indexes = [
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_peergroup_trgm'
+            ),
+            models.Index(fields=['last_updated'], name='netbox_bgp_peergroup_updated'),
+        ]
 
     def __str__(self):
         return self.name
@@ -118,6 +140,14 @@ class Community(BGPBase):
 
     class Meta:
         verbose_name_plural = 'Communities'
+        indexes = [
+            GinIndex(
+                OpClass(Upper('value'), name='gin_trgm_ops'),
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_community_trgm'
+            ),
+            models.Index(fields=['last_updated'], name='netbox_bgp_community_updated'),
+        ]
 
     def __str__(self):
         return self.value
@@ -146,6 +176,14 @@ class CommunityList(NetBoxModel):
     class Meta:
         verbose_name_plural = 'Community Lists'
         unique_together = ['name', 'description']
+        indexes = [
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_communitylist_trgm'
+            ),
+            models.Index(fields=['last_updated'], name='netbox_bgp_commlist_updated'),
+        ]
 
     def __str__(self):
         return self.name
@@ -179,6 +217,15 @@ class CommunityListRule(NetBoxModel):
         blank=True
     )
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_commlistrule_trgm'
+            ),
+            models.Index(fields=['last_updated'], name='netbox_bgp_commlistrule_upd'),
+        ]
+
     def __str__(self):
         return f'{self.community_list}: {self.action} {self.community}'
 
@@ -210,6 +257,14 @@ class PrefixList(NetBoxModel):
     class Meta:
         verbose_name_plural = 'Prefix Lists'
         unique_together = ['name', 'description', 'family']
+        indexes = [
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_prefixlist_trgm'
+            ),
+            models.Index(fields=['last_updated'], name='netbox_bgp_prefixlist_updated'),
+        ]
 
     def __str__(self):
         return self.name
@@ -263,6 +318,19 @@ class PrefixListRule(NetBoxModel):
     class Meta:
         ordering = ('prefix_list', 'index')
         unique_together = ('prefix_list', 'index')
+        indexes = [
+            GinIndex(
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_prefixlistrule_trgm'
+            ),
+            # Serves the inet containment operators of PrefixListRuleFilterSet
+            GistIndex(
+                fields=['prefix_custom'],
+                opclasses=['inet_ops'],
+                name='netbox_bgp_plrule_prefix_gist'
+            ),
+            models.Index(fields=['last_updated'], name='netbox_bgp_plrule_updated'),
+        ]
 
     @property
     def network(self):
@@ -388,9 +456,36 @@ class BGPSession(NetBoxModel):
 
     afi_safi = None  # for future use
 
+    objects = BGPSessionQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = 'BGP Sessions'
         unique_together = [['device', 'local_address', 'local_as', 'remote_address', 'remote_as'], ['virtualmachine', 'local_address', 'local_as', 'remote_address', 'remote_as']]
+        # Matched to the BGPSessionFilterSet lookups; see the bgp_benchmark command
+        indexes = [
+            models.Index(fields=['status'], name='netbox_bgp_session_status'),
+            models.Index(fields=['site', 'status'], name='netbox_bgp_session_site_status'),
+            models.Index(fields=['tenant', 'status'], name='netbox_bgp_session_tenant_st'),
+            models.Index(fields=['remote_as', 'status'], name='netbox_bgp_session_ras_status'),
+            models.Index(fields=['peer_group', 'status'], name='netbox_bgp_session_pg_status'),
+            models.Index(
+                fields=['device'],
+                condition=models.Q(status=SessionStatusChoices.STATUS_ACTIVE),
+                name='netbox_bgp_session_dev_active'
+            ),
+            models.Index(
+                fields=['virtualmachine'],
+                condition=models.Q(status=SessionStatusChoices.STATUS_ACTIVE),
+                name='netbox_bgp_session_vm_active'
+            ),
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_session_trgm'
+            ),
+            # Every model is indexed on last_updated for the changes feed (api.views.ChangesView)
+            models.Index(fields=['last_updated'], name='netbox_bgp_session_updated'),
+        ]
     
     def __str__(self):
         if self.device:
@@ -416,6 +511,108 @@ class BGPSession(NetBoxModel):
         return reverse('plugins:netbox_bgp:bgpsession', args=[self.pk])
 
 
+class BGPSessionEffectivePolicy(models.Model):
+    """
+    Denormalized list of the policies a session applies: its own policies
+    followed by the ones inherited from its peer group. Rows are maintained
+    by signal handlers, see netbox_bgp.signals.
+    """
+    session = models.ForeignKey(
+        to=BGPSession,
+        on_delete=models.CASCADE,
+        related_name='effective_policies'
+    )
+    policy = models.ForeignKey(
+        to=RoutingPolicy,
+        on_delete=models.CASCADE,
+        related_name='effective_sessions'
+    )
+    direction = models.CharField(
+        max_length=10,
+        choices=PolicyDirectionChoices
+    )
+    source = models.CharField(
+        max_length=20,
+        choices=PolicySourceChoices
+    )
+    order = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ('session', 'direction', 'order')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('session', 'direction', 'policy'),
+                name='netbox_bgp_effectivepolicy_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('policy', 'direction'),
+                name='netbox_bgp_effpol_policy_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.session}: {self.direction} {self.policy}'
+
+    @classmethod
+    def get_rows(cls, session):
+        """
+        Build (unsaved) rows for a session whose policies have been fetched.
+        """
+        rows = []
+        directions = (
+            PolicyDirectionChoices.DIRECTION_IMPORT,
+            PolicyDirectionChoices.DIRECTION_EXPORT,
+        )
+        for direction in directions:
+            field_name = f'{direction}_policies'
+            own = list(getattr(session, field_name).all())
+            inherited = []
+            if session.peer_group:
+                own_pks = {pol.pk for pol in own}
+                inherited = [
+                    pol for pol in getattr(session.peer_group, field_name).all()
+                    if pol.pk not in own_pks
+                ]
+            sources = (
+                (PolicySourceChoices.SOURCE_SESSION, own),
+                (PolicySourceChoices.SOURCE_PEER_GROUP, inherited),
+            )
+            order = 0
+            for source, policies in sources:
+                for pol in policies:
+                    rows.append(cls(
+                        session=session,
+                        policy=pol,
+                        direction=direction,
+                        source=source,
+                        order=order
+                    ))
+                    order += 1
+        return rows
+
+    @classmethod
+    def rebuild(cls, session_pks):
+        """
+        Recompute the rows of the given sessions.
+        """
+        session_pks = set(session_pks)
+        if not session_pks:
+            return
+        sessions = BGPSession.objects.filter(pk__in=session_pks).select_related(
+            'peer_group'
+        ).prefetch_related(
+            'import_policies', 'export_policies',
+            'peer_group__import_policies', 'peer_group__export_policies',
+        )
+        rows = []
+        for session in sessions:
+            rows.extend(cls.get_rows(session))
+        cls.objects.filter(session__in=session_pks).delete()
+        cls.objects.bulk_create(rows)
+
+
 class RoutingPolicyRule(NetBoxModel):
     routing_policy = models.ForeignKey(
         to=RoutingPolicy,
@@ -467,9 +664,18 @@ class RoutingPolicyRule(NetBoxModel):
         blank=True
     )    
 
+    objects = RoutingPolicyRuleQuerySet.as_manager()
+
     class Meta:
         ordering = ('routing_policy', 'index')
         unique_together = ('routing_policy', 'index')
+        indexes = [
+            GinIndex(
+                OpClass(Upper('description'), name='gin_trgm_ops'),
+                name='netbox_bgp_rprule_trgm'
+            ),
+            models.Index(fields=['last_updated'], name='netbox_bgp_rprule_updated'),
+        ]
 
     def __str__(self):
         return f'{self.routing_policy}: Rule {self.index}'
@@ -489,20 +695,23 @@ class RoutingPolicyRule(NetBoxModel):
 
     @property
     def match_statements(self):
+        # relations are read through .all() so prefetched rules cost no queries,
+        # see RoutingPolicyRuleQuerySet.prefetch_match_statements()
         result = {}
         # add communities
         result.update(
-            {'community': list(self.match_community.all().values_list('value', flat=True))}
+            {'community': [community.value for community in self.match_community.all()]}
         )
-        if self.match_community_list.all().exists():
+        community_lists = [community_list.name for community_list in self.match_community_list.all()]
+        if community_lists:
             result.update(
-                {'community': list(self.match_community_list.all().values_list('name', flat=True))}
+                {'community': community_lists}
             )
         result.update(
-            {'ip address': [str(prefix_list) for prefix_list in self.match_ip_address.all().values_list('name', flat=True)]}
+            {'ip address': [prefix_list.name for prefix_list in self.match_ip_address.all()]}
         )
         result.update(
-            {'ipv6 address': [str(prefix_list) for prefix_list in self.match_ipv6_address.all().values_list('name', flat=True)]}
+            {'ipv6 address': [prefix_list.name for prefix_list in self.match_ipv6_address.all()]}
         )
 
         custom_match = self.get_match_custom()
@@ -0,0 +1,31 @@
+from django.db.models import Exists, OuterRef
+
+from utilities.querysets import RestrictedQuerySet
+
+
+class BGPSessionQuerySet(RestrictedQuerySet):
+
+    def using_policy(self, policy, direction=None):
+        """
+        Return the sessions applying the given routing policy, either directly or
+        through their peer group. The lookup is a single EXISTS against the
+        effective policy table, so no join fan-out or DISTINCT is needed.
+        """
+        EffectivePolicy = self.model._meta.get_field('effective_policies').related_model
+        effective = EffectivePolicy.objects.filter(session=OuterRef('pk'), policy=policy)
+        if direction:
+            effective = effective.filter(direction=direction)
+        return self.filter(Exists(effective))
+
+
+class RoutingPolicyRuleQuerySet(RestrictedQuerySet):
+
+    def prefetch_match_statements(self):
+        """
+        Prefetch every relation RoutingPolicyRule.match_statements reads, so the
+        statements of a whole page of rules are built from four queries.
+        """
+        return self.prefetch_related(
+            'match_community', 'match_community_list',
+            'match_ip_address', 'match_ipv6_address',
+        )
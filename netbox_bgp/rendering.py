@@ -0,0 +1,391 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+from django.core.cache import cache
+from jinja2 import FileSystemLoader
+from jinja2.sandbox import SandboxedEnvironment
+from netbox.plugins import get_plugin_config
+from virtualization.models import VirtualMachine
+
+from .engine.community_list import compile_community_pattern
+from .models import (
+    BGPPeerGroup, BGPSession, CommunityList, CommunityListRule, PrefixList, PrefixListRule, RoutingPolicy,
+    RoutingPolicyRule,
+)
+
+
+__all__ = (
+    'SharedObjects',
+    'get_renderers',
+    'load_context',
+    'load_contexts',
+    'register_renderer',
+    'render_config',
+    'render_context',
+)
+
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates', 'netbox_bgp', 'config')
+
+# Renderers shipped with the plugin, more can be added with register_renderer()
+# or the config_renderers plugin setting
+_renderers = {
+    'frr': os.path.join(TEMPLATE_DIR, 'frr.j2'),
+    'junos': os.path.join(TEMPLATE_DIR, 'junos.j2'),
+    'eos': os.path.join(TEMPLATE_DIR, 'eos.j2'),
+}
+
+
+def register_renderer(name, template_path):
+    """
+    Register a Jinja2 template rendering the BGP configuration of a device. The
+    template receives the context built by load_context().
+    """
+    _renderers[name] = template_path
+
+
+def get_renderers():
+    renderers = dict(_renderers)
+    renderers.update(get_plugin_config('netbox_bgp', 'config_renderers') or {})
+    return renderers
+
+
+@lru_cache(maxsize=None)
+def _get_environment(directory):
+    return SandboxedEnvironment(
+        loader=FileSystemLoader(directory),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        keep_trailing_newline=True,
+    )
+
+
+def get_template(name):
+    try:
+        path = get_renderers()[name]
+    except KeyError:
+        raise ValueError(f"Unknown renderer: {name}")
+    environment = _get_environment(os.path.dirname(path))
+    return environment.get_template(os.path.basename(path))
+
+
+#
+# Context
+#
+
+def _policy_names(policies):
+    return [policy.name for policy in policies]
+
+
+def _prefix_list_data(prefix_list, rules):
+    return {
+        'name': prefix_list.name,
+        'family': prefix_list.family,
+        'description': prefix_list.description,
+        'rules': [
+            {
+                'index': rule.index,
+                'action': rule.action,
+                'prefix': str(rule.prefix_custom or rule.prefix.prefix),
+                'ge': rule.ge,
+                'le': rule.le,
+            }
+            for rule in rules
+        ],
+    }
+
+
+def _community_list_data(community_list, rules):
+    data = {
+        'name': community_list.name,
+        'description': community_list.description,
+        'rules': [],
+    }
+    for rule in rules:
+        try:
+            pattern = compile_community_pattern(rule.community.value)
+        except ValueError:
+            pattern = None
+        data['rules'].append({
+            'action': rule.action,
+            'community': rule.community.value,
+            # Anchored regex for the platforms needing one for wildcards and ranges
+            'regex': f'^{pattern}$' if pattern else None,
+        })
+    # Lists holding a pattern are rendered as expanded (regex) lists
+    data['expanded'] = any(rule['regex'] for rule in data['rules'])
+    return data
+
+
+def _rule_data(rule):
+    return {
+        'index': rule.index,
+        'action': rule.action,
+        'description': rule.description,
+        'continue_entry': rule.continue_entry,
+        'communities': [community.value for community in rule.match_community.all()],
+        'community_lists': [community_list.name for community_list in rule.match_community_list.all()],
+        'prefix_lists': [prefix_list.name for prefix_list in rule.match_ip_address.all()],
+        'prefix_lists6': [prefix_list.name for prefix_list in rule.match_ipv6_address.all()],
+        'match_custom': rule.match_custom if isinstance(rule.match_custom, dict) else {},
+        'set_actions': rule.set_actions if isinstance(rule.set_actions, dict) else {},
+    }
+
+
+class SharedObjects:
+    """
+    Routing policies, prefix lists and community lists as plain data keyed by
+    primary key, with the lists referenced by each policy. They are shared by
+    the devices using them, so rendering many devices only needs to load them
+    once.
+    """
+
+    def __init__(self):
+        self.policies = {}
+        self.prefix_lists = {}
+        self.community_lists = {}
+        # {policy pk: (prefix list pks, community list pks)}
+        self.references = {}
+
+    @classmethod
+    def load(cls, policies=None, prefix_lists=None):
+        """
+        Load the given routing policies and prefix lists (primary keys), and
+        the lists referenced by the policy rules, in a fixed number of queries.
+        None loads all the objects of the kind.
+        """
+        shared = cls()
+
+        policy_queryset = RoutingPolicy.objects.all()
+        rule_queryset = RoutingPolicyRule.objects.all()
+        if policies is not None:
+            policy_queryset = policy_queryset.filter(pk__in=list(policies))
+            rule_queryset = rule_queryset.filter(routing_policy__in=list(policies))
+        rules = {policy.pk: [] for policy in policy_queryset}
+        community_list_ids = set()
+        prefix_list_ids = set()
+        for rule in rule_queryset.order_by('routing_policy', 'index').prefetch_match_statements():
+            rules.setdefault(rule.routing_policy_id, []).append(rule)
+            references = shared.references.setdefault(rule.routing_policy_id, (set(), set()))
+            references[0].update(pl.pk for pl in (*rule.match_ip_address.all(), *rule.match_ipv6_address.all()))
+            references[1].update(cl.pk for cl in rule.match_community_list.all())
+            prefix_list_ids |= references[0]
+            community_list_ids |= references[1]
+
+        for policy in policy_queryset:
+            shared.references.setdefault(policy.pk, (set(), set()))
+            shared.policies[policy.pk] = {
+                'name': policy.name,
+                'description': policy.description,
+                'rules': [_rule_data(rule) for rule in rules[policy.pk]],
+            }
+
+        prefix_list_queryset = PrefixList.objects.all()
+        prefix_list_rule_queryset = PrefixListRule.objects.all()
+        if prefix_lists is not None:
+            prefix_list_ids |= set(prefix_lists)
+            prefix_list_queryset = prefix_list_queryset.filter(pk__in=prefix_list_ids)
+            prefix_list_rule_queryset = prefix_list_rule_queryset.filter(prefix_list__in=prefix_list_ids)
+        prefix_list_rules = {}
+        for rule in prefix_list_rule_queryset.select_related('prefix').order_by('prefix_list', 'index'):
+            prefix_list_rules.setdefault(rule.prefix_list_id, []).append(rule)
+        for prefix_list in prefix_list_queryset:
+            shared.prefix_lists[prefix_list.pk] = _prefix_list_data(
+                prefix_list, prefix_list_rules.get(prefix_list.pk, [])
+            )
+
+        community_list_rules = {}
+        for rule in CommunityListRule.objects.filter(
+            community_list__in=community_list_ids
+        ).select_related('community').order_by('community_list', 'pk'):
+            community_list_rules.setdefault(rule.community_list_id, []).append(rule)
+        for community_list in CommunityList.objects.filter(pk__in=community_list_ids):
+            shared.community_lists[community_list.pk] = _community_list_data(
+                community_list, community_list_rules.get(community_list.pk, [])
+            )
+
+        return shared
+
+    def update(self, other):
+        self.policies.update(other.policies)
+        self.prefix_lists.update(other.prefix_lists)
+        self.community_lists.update(other.community_lists)
+        self.references.update(other.references)
+
+
+def _policy_pks(obj):
+    return [policy.pk for policy in (*obj.import_policies.all(), *obj.export_policies.all())]
+
+
+def _session_data(session):
+    return {
+        'name': session.name,
+        'description': session.description,
+        'status': session.status,
+        'local_address': str(session.local_address.address.ip),
+        'remote_address': str(session.remote_address.address.ip),
+        'family': session.remote_address.address.version,
+        'remote_as': session.remote_as.asn,
+        'peer_group': session.peer_group.name if session.peer_group else None,
+        'import_policies': _policy_names(session.import_policies.all()),
+        'export_policies': _policy_names(session.export_policies.all()),
+        'prefix_list_in': session.prefix_list_in.name if session.prefix_list_in else None,
+        'prefix_list_out': session.prefix_list_out.name if session.prefix_list_out else None,
+    }
+
+
+def _build_context(obj, sessions, peer_groups, shared):
+    policy_pks = set()
+    prefix_list_pks = set()
+    for item in (*sessions, *peer_groups):
+        policy_pks.update(_policy_pks(item))
+    for session in sessions:
+        prefix_list_pks.update(pk for pk in (session.prefix_list_in_id, session.prefix_list_out_id) if pk)
+    community_list_pks = set()
+    for pk in policy_pks:
+        prefix_list_refs, community_list_refs = shared.references[pk]
+        prefix_list_pks |= prefix_list_refs
+        community_list_pks |= community_list_refs
+
+    groups = {}
+    for session in sessions:
+        groups.setdefault(session.local_as.asn, []).append(_session_data(session))
+
+    def by_name(objects, pks):
+        return sorted((objects[pk] for pk in pks), key=lambda data: data['name'])
+
+    return {
+        'hostname': str(obj),
+        'bgp': [
+            {'local_as': local_as, 'sessions': local_sessions}
+            for local_as, local_sessions in groups.items()
+        ],
+        'peer_groups': [
+            {
+                'name': group.name,
+                'description': group.description,
+                'import_policies': _policy_names(group.import_policies.all()),
+                'export_policies': _policy_names(group.export_policies.all()),
+            }
+            for group in sorted(peer_groups, key=lambda group: group.name)
+        ],
+        'routing_policies': by_name(shared.policies, policy_pks),
+        'prefix_lists': by_name(shared.prefix_lists, prefix_list_pks),
+        'community_lists': by_name(shared.community_lists, community_list_pks),
+    }
+
+
+def load_contexts(objects, sessions=None, shared=None):
+    """
+    Return the BGP configuration of several devices, or of several virtual
+    machines, as plain data: a {pk: context} mapping where each context holds
+    the object's sessions grouped by local AS, and the peer groups, routing
+    policies, prefix lists and community lists they use.
+
+    The whole graph is read in a fixed number of queries whatever its size.
+    `sessions` may restrict the sessions considered, e.g. to those visible to a
+    user. `shared` is a SharedObjects instance holding already loaded policies
+    and lists; anything missing from it is loaded and added to it.
+    """
+    objects = list(objects)
+    if not objects:
+        return {}
+    field = 'virtualmachine' if isinstance(objects[0], VirtualMachine) else 'device'
+    if sessions is None:
+        sessions = BGPSession.objects.all()
+    sessions = list(
+        sessions.filter(**{f'{field}__in': objects}).select_related(
+            'local_address', 'remote_address', 'local_as', 'remote_as',
+            'peer_group', 'prefix_list_in', 'prefix_list_out',
+        ).prefetch_related(
+            'import_policies', 'export_policies',
+        ).order_by('local_as__asn', 'remote_address__address', 'pk')
+    )
+    group_ids = {session.peer_group_id for session in sessions if session.peer_group_id}
+    peer_groups = {
+        group.pk: group
+        for group in BGPPeerGroup.objects.filter(pk__in=group_ids).prefetch_related(
+            'import_policies', 'export_policies'
+        )
+    }
+
+    if shared is None:
+        shared = SharedObjects()
+    policy_pks = set()
+    prefix_list_pks = set()
+    for item in (*sessions, *peer_groups.values()):
+        policy_pks.update(_policy_pks(item))
+    for session in sessions:
+        prefix_list_pks.update(pk for pk in (session.prefix_list_in_id, session.prefix_list_out_id) if pk)
+    missing_policies = policy_pks - set(shared.policies)
+    missing_prefix_lists = prefix_list_pks - set(shared.prefix_lists)
+    if missing_policies or missing_prefix_lists:
+        shared.update(SharedObjects.load(missing_policies, missing_prefix_lists))
+
+    by_object = {obj.pk: [] for obj in objects}
+    for session in sessions:
+        by_object[getattr(session, f'{field}_id')].append(session)
+    contexts = {}
+    for obj in objects:
+        object_sessions = by_object[obj.pk]
+        object_groups = [
+            peer_groups[pk] for pk in {session.peer_group_id for session in object_sessions} if pk
+        ]
+        contexts[obj.pk] = _build_context(obj, object_sessions, object_groups, shared)
+    return contexts
+
+
+def load_context(device=None, virtualmachine=None, sessions=None, shared=None):
+    """
+    Return the BGP configuration of a device or virtual machine as plain data,
+    see load_contexts().
+    """
+    obj = device if device is not None else virtualmachine
+    return load_contexts([obj], sessions=sessions, shared=shared)[obj.pk]
+
+
+#
+# Rendering
+#
+
+@lru_cache(maxsize=32)
+def _file_hash(path, mtime):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def get_content_hash(renderer, context):
+    """
+    Return a SHA-256 hash of everything the rendered configuration depends on:
+    the renderer, its template and the context.
+    """
+    path = get_template(renderer).filename
+    template_hash = _file_hash(path, os.stat(path).st_mtime)
+    payload = json.dumps([renderer, template_hash, context], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_context(renderer, context):
+    """
+    Render a context built by load_contexts() and return a (content hash,
+    configuration) tuple. Outputs are cached by content hash, so an unchanged
+    context costs one cache lookup.
+    """
+    content_hash = get_content_hash(renderer, context)
+    key = f'netbox_bgp.config.{content_hash}'
+    config = cache.get(key)
+    if config is None:
+        config = get_template(renderer).render(**context)
+        cache.set(key, config, timeout=get_plugin_config('netbox_bgp', 'config_cache_timeout'))
+    return content_hash, config
+
+
+def render_config(renderer, device=None, virtualmachine=None, sessions=None):
+    """
+    Render the BGP configuration of a device or virtual machine and return a
+    (content hash, configuration) tuple.
+    """
+    context = load_context(device=device, virtualmachine=virtualmachine, sessions=sessions)
+    return render_context(renderer, context)
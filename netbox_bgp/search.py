@@ -0,0 +1,116 @@
+from netbox.search import SearchIndex
+
+from .models import (
+    Community, BGPSession, RoutingPolicy,
+    BGPPeerGroup, RoutingPolicyRule, PrefixList,
+    PrefixListRule, CommunityList, CommunityListRule
+)
+
+
+class CommunityIndex(SearchIndex):
+    model = Community
+    fields = (
+        ('value', 100),
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = ('status', 'tenant', 'description')
+
+
+class CommunityListIndex(SearchIndex):
+    model = CommunityList
+    fields = (
+        ('name', 100),
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = ('description',)
+
+
+class CommunityListRuleIndex(SearchIndex):
+    model = CommunityListRule
+    fields = (
+        ('community', 200),
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = ('community_list', 'action', 'community', 'description')
+
+
+class BGPSessionIndex(SearchIndex):
+    model = BGPSession
+    fields = (
+        ('name', 100),
+        ('remote_as', 200),
+        ('remote_address', 200),
+        ('local_as', 300),
+        ('local_address', 300),
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = (
+        'device', 'virtualmachine', 'local_address', 'remote_address', 'remote_as', 'status', 'description'
+    )
+
+
+class BGPPeerGroupIndex(SearchIndex):
+    model = BGPPeerGroup
+    fields = (
+        ('name', 100),
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = ('description',)
+
+
+class RoutingPolicyIndex(SearchIndex):
+    model = RoutingPolicy
+    fields = (
+        ('name', 100),
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = ('description',)
+
+
+class RoutingPolicyRuleIndex(SearchIndex):
+    model = RoutingPolicyRule
+    fields = (
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = ('routing_policy', 'index', 'action', 'description')
+
+
+class PrefixListIndex(SearchIndex):
+    model = PrefixList
+    fields = (
+        ('name', 100),
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = ('family', 'description')
+
+
+class PrefixListRuleIndex(SearchIndex):
+    model = PrefixListRule
+    fields = (
+        ('prefix_custom', 110),
+        ('prefix', 110),
+        ('description', 500),
+        ('comments', 5000),
+    )
+    display_attrs = ('prefix_list', 'index', 'action', 'description')
+
+
+indexes = (
+    CommunityIndex,
+    CommunityListIndex,
+    CommunityListRuleIndex,
+    BGPSessionIndex,
+    BGPPeerGroupIndex,
+    RoutingPolicyIndex,
+    RoutingPolicyRuleIndex,
+    PrefixListIndex,
+    PrefixListRuleIndex,
+)
@@ -0,0 +1,135 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .counters import invalidate_session_counts
+from .engine import invalidate_community_lists
+from .models import BGPPeerGroup, BGPSession, BGPSessionEffectivePolicy, Community, CommunityListRule
+
+
+#
+# Effective policies
+#
+
+# Accessors leading from a RoutingPolicy back to the owners of each M2M relation
+SESSION_POLICY_ACCESSORS = {
+    BGPSession.import_policies.through: 'session_import_policies',
+    BGPSession.export_policies.through: 'session_export_policies',
+}
+PEER_GROUP_POLICY_ACCESSORS = {
+    BGPPeerGroup.import_policies.through: 'group_import_policies',
+    BGPPeerGroup.export_policies.through: 'group_export_policies',
+}
+M2M_ACTIONS = ('pre_clear', 'post_add', 'post_remove', 'post_clear')
+
+
+def _changed_pks(instance, action, reverse, pk_set, accessor):
+    """
+    Return the pks of the objects owning the M2M relation (sessions or peer
+    groups) affected by an m2m_changed signal.
+    """
+    if not reverse:
+        return set() if action == 'pre_clear' else {instance.pk}
+    if action == 'pre_clear':
+        # pk_set is not provided on clear(), resolve the owners while they are still linked
+        instance._bgp_cleared_pks = set(
+            getattr(instance, accessor).values_list('pk', flat=True)
+        )
+        return set()
+    if action == 'post_clear':
+        return getattr(instance, '_bgp_cleared_pks', set())
+    return set(pk_set or ())
+
+
+@receiver(m2m_changed, sender=BGPSession.import_policies.through)
+@receiver(m2m_changed, sender=BGPSession.export_policies.through)
+def session_policies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    session_pks = _changed_pks(
+        instance, action, reverse, pk_set, SESSION_POLICY_ACCESSORS[sender]
+    )
+    BGPSessionEffectivePolicy.rebuild(session_pks)
+
+
+@receiver(m2m_changed, sender=BGPPeerGroup.import_policies.through)
+@receiver(m2m_changed, sender=BGPPeerGroup.export_policies.through)
+def peer_group_policies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    group_pks = _changed_pks(
+        instance, action, reverse, pk_set, PEER_GROUP_POLICY_ACCESSORS[sender]
+    )
+    if group_pks:
+        BGPSessionEffectivePolicy.rebuild(
+            BGPSession.objects.filter(peer_group__in=group_pks).values_list('pk', flat=True)
+        )
+
+
+@receiver(post_save, sender=BGPSession)
+def session_saved(sender, instance, raw=False, **kwargs):
+    # The peer group may have changed
+    if not raw:
+        BGPSessionEffectivePolicy.rebuild([instance.pk])
+
+
+@receiver(pre_delete, sender=BGPPeerGroup)
+def peer_group_deleting(sender, instance, **kwargs):
+    # Sessions are detached with an UPDATE (SET_NULL) which sends no signals
+    instance._bgp_session_pks = list(instance.bgpsession_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=BGPPeerGroup)
+def peer_group_deleted(sender, instance, **kwargs):
+    BGPSessionEffectivePolicy.rebuild(getattr(instance, '_bgp_session_pks', ()))
+
+
+#
+# Session counts
+#
+
+@receiver(pre_save, sender=BGPSession)
+def session_saving(sender, instance, raw=False, **kwargs):
+    # A session moved to another device or virtual machine changes its counts too
+    if instance.pk and not raw:
+        instance._bgp_previous_parents = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('device_id', 'virtualmachine_id').first()
+
+
+@receiver(post_save, sender=BGPSession)
+@receiver(post_delete, sender=BGPSession)
+def session_changed(sender, instance, **kwargs):
+    device_id, virtualmachine_id = getattr(instance, '_bgp_previous_parents', None) or (None, None)
+    invalidate_session_counts(
+        device_ids=(instance.device_id, device_id),
+        virtualmachine_ids=(instance.virtualmachine_id, virtualmachine_id),
+    )
+
+
+#
+# Compiled community lists
+#
+
+@receiver(pre_save, sender=CommunityListRule)
+def community_list_rule_saving(sender, instance, raw=False, **kwargs):
+    # A rule moved to another list leaves the previous one stale
+    if instance.pk and not raw:
+        instance._bgp_previous_list_id = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('community_list_id', flat=True).first()
+
+
+@receiver(post_save, sender=CommunityListRule)
+@receiver(post_delete, sender=CommunityListRule)
+def community_list_rule_changed(sender, instance, **kwargs):
+    pks = {instance.community_list_id, getattr(instance, '_bgp_previous_list_id', None)}
+    invalidate_community_lists(pks - {None})
+
+
+@receiver(post_save, sender=Community)
+def community_saved(sender, instance, created=False, raw=False, **kwargs):
+    # The value of a community may have changed under the lists using it
+    if not created and not raw:
+        invalidate_community_lists(set(
+            CommunityListRule.objects.filter(community=instance).values_list('community_list_id', flat=True)
+        ))
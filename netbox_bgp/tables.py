@@ -1,5 +1,7 @@
 import django_tables2 as tables
+from django.core.exceptions import FieldDoesNotExist
 from django.utils.safestring import mark_safe
+from django_tables2.data import TableQuerysetData
 from django_tables2.utils import A
 
 from netbox.tables import NetBoxTable
@@ -30,7 +32,118 @@ POLICIES = """
 """
 
 
-class CommunityTable(NetBoxTable):
+class ColumnPrefetchMixin:
+    """
+    Prefetch the many-to-many and reverse relations shown by the visible
+    columns of the table, with one query per relation for the whole page.
+    Hidden columns cost nothing.
+
+    Columns are matched to model fields by their accessor.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if isinstance(self.data, TableQuerysetData):
+            columns = [column for column in self.columns.iterall() if column.visible]
+            self.data.data = self.optimize_queryset(self.data.data, columns)
+
+    def get_column_paths(self, column):
+        return [column.accessor]
+
+    def _add_path(self, bits, only, select_related, prefetch_related):
+        """
+        Add the lookups needed to read the field at the given path. Returns
+        False if the path is not made of model fields.
+        """
+        model = self._meta.model
+        for depth, bit in enumerate(bits):
+            try:
+                field = model._meta.get_field(bit)
+            except FieldDoesNotExist:
+                return False
+            path = '__'.join(bits[:depth + 1])
+            if depth == 0 and field.concrete:
+                only.add(field.name)
+            if not field.is_relation:
+                # The rest of the path is a key of a JSON field
+                return True
+            if field.related_model is None:
+                # Generic foreign keys
+                return False
+            if field.many_to_many or field.one_to_many:
+                prefetch_related.add(path)
+                return True
+            select_related.add(path)
+            model = field.related_model
+        return True
+
+    def get_lookups(self, columns):
+        """
+        Return the fields read by the given bound columns, the relations to
+        join and to prefetch, and whether some columns use unknown fields.
+        """
+        only, select_related, prefetch_related = {'pk'}, set(), set()
+        read_all = False
+        exempt_columns = getattr(self, 'exempt_columns', ())
+        for column in columns:
+            if column.name in exempt_columns:
+                continue
+            for path in self.get_column_paths(column):
+                if not self._add_path(path.split('__'), only, select_related, prefetch_related):
+                    read_all = True
+        return only, select_related, prefetch_related, read_all
+
+    def apply_lookups(self, queryset, only, select_related, prefetch_related, read_all):
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+    def optimize_queryset(self, queryset, columns):
+        """
+        Return the queryset with the lookups needed by the given bound
+        columns.
+        """
+        return self.apply_lookups(queryset, *self.get_lookups(columns))
+
+
+class ColumnQuerysetMixin(ColumnPrefetchMixin):
+    """
+    Fetch what the visible columns of the table show, and nothing else: on
+    top of the prefetched relations, the related objects the columns link to
+    are joined (select_related) and only the fields used are read (only).
+
+    column_fields lists the fields used by the other columns, such as those
+    showing properties. When a visible column uses unknown fields, all the
+    fields of the model are read.
+    """
+    column_fields = {}
+
+    def get_column_paths(self, column):
+        return self.column_fields.get(column.name, super().get_column_paths(column))
+
+    def as_values(self, exclude_columns=None):
+        # Exports may include hidden columns: read all the fields, with the
+        # relations of every exported column
+        if isinstance(self.data, TableQuerysetData):
+            exclude_columns = exclude_columns or ()
+            columns = [column for column in self.columns.iterall() if column.name not in exclude_columns]
+            only, select_related, prefetch_related, _ = self.get_lookups(columns)
+            self.data.data = self.apply_lookups(
+                self.data.data.defer(None), only, select_related, prefetch_related, read_all=True
+            )
+        return super().as_values(exclude_columns)
+
+    def apply_lookups(self, queryset, only, select_related, prefetch_related, read_all):
+        queryset = super().apply_lookups(queryset, only, select_related, prefetch_related, read_all)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        # Fields deferred by the caller are left as they are
+        if not read_all and queryset.query.deferred_loading == (frozenset(), True):
+            queryset = queryset.only(*only)
+        return queryset
+
+
+class CommunityTable(ColumnQuerysetMixin, NetBoxTable):
     value = tables.LinkColumn()
     status = ChoiceFieldColumn(
         default=AVAILABLE_LABEL
@@ -50,7 +163,7 @@ class CommunityTable(NetBoxTable):
         )
 
 
-class CommunityListTable(NetBoxTable):
+class CommunityListTable(ColumnQuerysetMixin, NetBoxTable):
     name = tables.LinkColumn()
 
     class Meta(NetBoxTable.Meta):
@@ -58,7 +171,7 @@ class CommunityListTable(NetBoxTable):
         fields = ('pk', 'name', 'description', 'actions')
 
 
-class CommunityListRuleTable(NetBoxTable):
+class CommunityListRuleTable(ColumnQuerysetMixin, NetBoxTable):
     community_list = tables.Column(
         linkify=True
     )
@@ -76,7 +189,7 @@ class CommunityListRuleTable(NetBoxTable):
         )
 
 
-class BGPSessionTable(NetBoxTable):
+class BGPSessionTable(ColumnQuerysetMixin, NetBoxTable):
     name = tables.LinkColumn()
     device = tables.LinkColumn()
     virtualmachine = tables.LinkColumn()
@@ -92,13 +205,24 @@ class BGPSessionTable(NetBoxTable):
     tenant = tables.TemplateColumn(
         template_code=COL_TENANT
     )
+    import_policies = tables.TemplateColumn(
+        template_code=POLICIES,
+        orderable=False
+    )
+    export_policies = tables.TemplateColumn(
+        template_code=POLICIES,
+        orderable=False
+    )
+    tags = TagColumn(
+        url_name='plugins:netbox_bgp:bgpsession_list'
+    )
 
     class Meta(NetBoxTable.Meta):
         model = BGPSession
         fields = (
             'pk', 'name', 'device', 'virtualmachine', 'local_address', 'local_as',
             'remote_address', 'remote_as', 'description', 'peer_group',
-            'site', 'status', 'tenant', 'actions'
+            'import_policies', 'export_policies', 'site', 'status', 'tenant', 'tags', 'actions'
         )
         default_columns = (
             'pk', 'name', 'device', 'virtualmachine', 'local_address', 'local_as',
@@ -107,7 +231,7 @@ class BGPSessionTable(NetBoxTable):
         )
 
 
-class RoutingPolicyTable(NetBoxTable):
+class RoutingPolicyTable(ColumnQuerysetMixin, NetBoxTable):
     name = tables.LinkColumn()
 
     class Meta(NetBoxTable.Meta):
@@ -115,7 +239,7 @@ class RoutingPolicyTable(NetBoxTable):
         fields = ('pk', 'name', 'description', 'actions')
 
 
-class BGPPeerGroupTable(NetBoxTable):
+class BGPPeerGroupTable(ColumnQuerysetMixin, NetBoxTable):
     name = tables.LinkColumn()
     import_policies = tables.TemplateColumn(
         template_code=POLICIES,
@@ -140,7 +264,7 @@ class BGPPeerGroupTable(NetBoxTable):
         )
 
 
-class RoutingPolicyRuleTable(NetBoxTable):
+class RoutingPolicyRuleTable(ColumnQuerysetMixin, NetBoxTable):
     routing_policy = tables.Column(
         linkify=True
     )
@@ -149,6 +273,13 @@ class RoutingPolicyRuleTable(NetBoxTable):
     )
     action = ChoiceFieldColumn()
 
+    column_fields = {
+        'match_statements': [
+            'match_community', 'match_community_list', 'match_ip_address', 'match_ipv6_address', 'match_custom'
+        ],
+        'set_statements': ['set_actions'],
+    }
+
     class Meta(NetBoxTable.Meta):
         model = RoutingPolicyRule
         fields = (
@@ -157,7 +288,7 @@ class RoutingPolicyRuleTable(NetBoxTable):
         )
 
 
-class PrefixListTable(NetBoxTable):
+class PrefixListTable(ColumnQuerysetMixin, NetBoxTable):
     name = tables.LinkColumn()
     family = ChoiceFieldColumn()
 
@@ -166,7 +297,7 @@ class PrefixListTable(NetBoxTable):
         fields = ('pk', 'name', 'description', 'family', 'actions')
 
 
-class PrefixListRuleTable(NetBoxTable):
+class PrefixListRuleTable(ColumnQuerysetMixin, NetBoxTable):
     prefix_list = tables.Column(
         linkify=True
     )
@@ -179,6 +310,10 @@ class PrefixListRuleTable(NetBoxTable):
         linkify=True,
     )
 
+    column_fields = {
+        'network': ['prefix', 'prefix_custom'],
+    }
+
     class Meta(NetBoxTable.Meta):
         model = PrefixListRule
         fields = (
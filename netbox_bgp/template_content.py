@@ -1,7 +1,7 @@
 from netbox.plugins import PluginTemplateExtension
 
-from .models import BGPSession
-from .tables import BGPSessionTable
+from .choices import SessionStatusChoices
+from .counters import get_session_counts
 
 
 class DeviceBGPSession(PluginTemplateExtension):
@@ -23,13 +23,18 @@ class DeviceBGPSession(PluginTemplateExtension):
         return ''
 
     def x_page(self):
-        obj = self.context['object']
-        sess = BGPSession.objects.filter(device=obj)
-        sess_table = BGPSessionTable(sess)
+        # Only the cached session counts are read here: the sessions are loaded
+        # by the browser from the (paginated) session list once the panel is
+        # scrolled into view
+        counts = get_session_counts(self.context['object'])
+        statuses = [
+            (label, SessionStatusChoices.colors.get(value), counts[value])
+            for value, label in SessionStatusChoices if counts.get(value)
+        ]
         return self.render(
             'netbox_bgp/device_extend.html',
             extra_context={
-                'related_session_table': sess_table
+                'session_statuses': statuses,
             }
         )
 
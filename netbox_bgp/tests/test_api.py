@@ -1,9 +1,21 @@
+import csv
+import gzip
+import io
 import json
+import uuid
+from datetime import timedelta
 
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from utilities.testing import APITestCase, APIViewTestCases
 
+from core.choices import ObjectChangeActionChoices
+from core.models import ObjectType
 from tenancy.models import Tenant
+from users.models import ObjectPermission
 from dcim.models import Site, DeviceRole, DeviceType, Manufacturer, Device, Interface
 from ipam.models import IPAddress, ASN, RIR, Prefix
 
@@ -19,6 +31,8 @@ from netbox_bgp.models import (
     PrefixListRule,
 )
 
+from netbox_bgp.rendering import load_context
+
 from netbox_bgp.choices import (
     SessionStatusChoices,
     IPAddressFamilyChoices,
@@ -366,6 +380,95 @@ class BGPSessionAPITestCase(
         ]
 
 
+class BGPSessionQueryCountTestCase(APITestCase):
+    """
+    Listing sessions must cost the same number of queries regardless of page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        site = Site.objects.create(name="qc_site", slug="qc_site")
+        tenant = Tenant.objects.create(name="qc_tenant", slug="qc_tenant")
+        manufacturer = Manufacturer.objects.create(name="qc_vendor", slug="qc_vendor")
+        device_role = DeviceRole.objects.create(name="qc_role", slug="qc_role")
+        device_type = DeviceType.objects.create(
+            slug="qc_type", model="qc_type", manufacturer=manufacturer
+        )
+        device = Device.objects.create(
+            device_type=device_type, name="qc_device", role=device_role, site=site
+        )
+        rir = RIR.objects.create(name="qc_rir", slug="qc_rir")
+        local_as = ASN.objects.create(asn=65100, rir=rir)
+        remote_as = ASN.objects.create(asn=65101, rir=rir)
+        local_ip = IPAddress.objects.create(address="10.100.0.1/32")
+        remote_ips = IPAddress.objects.bulk_create(
+            IPAddress(address=f"10.101.0.{i}/32") for i in range(1, 41)
+        )
+        pl_in = PrefixList.objects.create(
+            name="qc_in", family=IPAddressFamilyChoices.FAMILY_4
+        )
+        pl_out = PrefixList.objects.create(
+            name="qc_out", family=IPAddressFamilyChoices.FAMILY_4
+        )
+        policies = RoutingPolicy.objects.bulk_create(
+            RoutingPolicy(name=f"qc_rp{i}") for i in range(4)
+        )
+        peer_group = BGPPeerGroup.objects.create(name="qc_group")
+        peer_group.import_policies.set(policies[:2])
+        peer_group.export_policies.set(policies[2:])
+
+        sessions = BGPSession.objects.bulk_create(
+            BGPSession(
+                name=f"qc_session{i}",
+                site=site,
+                tenant=tenant,
+                device=device,
+                local_address=local_ip,
+                remote_address=remote_ip,
+                local_as=local_as,
+                remote_as=remote_as,
+                peer_group=peer_group,
+                prefix_list_in=pl_in,
+                prefix_list_out=pl_out,
+            )
+            for i, remote_ip in enumerate(remote_ips)
+        )
+        for session in sessions:
+            session.import_policies.add(policies[0])
+            session.export_policies.add(policies[3])
+
+    def _list_sessions(self, limit):
+        url = reverse("plugins-api:netbox_bgp-api:bgpsession-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"{url}?limit={limit}", **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertEqual(len(response.data["results"]), limit)
+        return len(queries)
+
+    def test_list_query_count_is_constant(self):
+        self.add_permissions("netbox_bgp.view_bgpsession")
+        # Warm up per-request caches (token, user config, content types)
+        self._list_sessions(1)
+
+        self.assertEqual(self._list_sessions(5), self._list_sessions(40))
+
+    def test_list_merges_peer_group_policies(self):
+        self.add_permissions("netbox_bgp.view_bgpsession")
+        url = reverse("plugins-api:netbox_bgp-api:bgpsession-list")
+        response = self.client.get(f"{url}?limit=10", **self.header)
+        self.assertHttpStatus(response, 200)
+
+        for session in response.data["results"]:
+            self.assertEqual(
+                [pol["name"] for pol in session["import_policies"]],
+                ["qc_rp0", "qc_rp1"],
+            )
+            self.assertEqual(
+                sorted(pol["name"] for pol in session["export_policies"]),
+                ["qc_rp2", "qc_rp3"],
+            )
+
+
 class RoutingPolicyAPITestCase(
     APIViewTestCases.GetObjectViewTestCase,
     APIViewTestCases.ListObjectsViewTestCase,
@@ -518,6 +621,570 @@ class RoutingPolicyRuleAPITestCase(
         ]
 
 
+class RoutingPolicySimulateTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.policy = RoutingPolicy.objects.create(name="sim_policy")
+        prefix_list = PrefixList.objects.create(
+            name="sim_pl", family=IPAddressFamilyChoices.FAMILY_4
+        )
+        PrefixListRule.objects.create(
+            prefix_list=prefix_list, index=10, action="permit",
+            prefix_custom="10.0.0.0/8", le=24,
+        )
+        rule = RoutingPolicyRule.objects.create(
+            routing_policy=cls.policy, index=10, action="permit",
+            set_actions={"local-preference": 200},
+        )
+        rule.match_ip_address.add(prefix_list)
+
+    def test_simulate(self):
+        self.add_permissions("netbox_bgp.view_routingpolicy")
+        url = reverse(
+            "plugins-api:netbox_bgp-api:routingpolicy-simulate", kwargs={"pk": self.policy.pk}
+        )
+        data = {"routes": ["10.1.0.0/16", {"prefix": "192.0.2.0/24", "med": 10}]}
+        response = self.client.post(url, data, format="json", **self.header)
+        self.assertHttpStatus(response, 200)
+
+        permitted, denied = response.data["results"]
+        self.assertEqual(permitted["action"], "permit")
+        self.assertEqual(permitted["rules"], [10])
+        self.assertEqual(permitted["attributes"]["local_pref"], 200)
+        self.assertEqual(denied["action"], "deny")
+        self.assertEqual(denied["attributes"]["med"], 10)
+
+    def test_simulate_invalid_route(self):
+        self.add_permissions("netbox_bgp.view_routingpolicy")
+        url = reverse(
+            "plugins-api:netbox_bgp-api:routingpolicy-simulate", kwargs={"pk": self.policy.pk}
+        )
+        response = self.client.post(url, {"routes": ["not-a-prefix"]}, format="json", **self.header)
+        self.assertHttpStatus(response, 400)
+
+    def test_simulate_too_many_routes(self):
+        self.add_permissions("netbox_bgp.view_routingpolicy")
+        url = reverse(
+            "plugins-api:netbox_bgp-api:routingpolicy-simulate", kwargs={"pk": self.policy.pk}
+        )
+        plugins_config = {**settings.PLUGINS_CONFIG}
+        plugins_config["netbox_bgp"] = {**plugins_config["netbox_bgp"], "simulation_max_routes": 2}
+        with self.settings(PLUGINS_CONFIG=plugins_config):
+            response = self.client.post(
+                url, {"routes": ["10.0.0.0/8", "10.1.0.0/16", "10.2.0.0/16"]}, format="json", **self.header
+            )
+        self.assertHttpStatus(response, 400)
+        self.assertIn("routes", response.data)
+
+    def test_simulate_without_permission(self):
+        url = reverse(
+            "plugins-api:netbox_bgp-api:routingpolicy-simulate", kwargs={"pk": self.policy.pk}
+        )
+        response = self.client.post(url, {"routes": ["10.0.0.0/8"]}, format="json", **self.header)
+        self.assertHttpStatus(response, 404)
+
+
+class CommunityListMatchTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.community_list = CommunityList.objects.create(name="match_list")
+        for action, value in (("deny", "65000:666"), ("permit", "65000:*")):
+            CommunityListRule.objects.create(
+                community_list=cls.community_list,
+                action=action,
+                community=Community.objects.create(value=value),
+            )
+
+    def test_match(self):
+        self.add_permissions("netbox_bgp.view_communitylist")
+        url = reverse(
+            "plugins-api:netbox_bgp-api:communitylist-match", kwargs={"pk": self.community_list.pk}
+        )
+        data = {"community_sets": [["65000:1"], ["65000:666", "65000:1"], ["65001:1"]]}
+        response = self.client.post(url, data, format="json", **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertEqual(
+            [result["match"] for result in response.data["results"]],
+            [True, False, False],
+        )
+
+
+class RenderConfigTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        site = Site.objects.create(name="cfg_site", slug="cfg_site")
+        manufacturer = Manufacturer.objects.create(name="cfg_vendor", slug="cfg_vendor")
+        device_role = DeviceRole.objects.create(name="cfg_role", slug="cfg_role")
+        device_type = DeviceType.objects.create(
+            slug="cfg_type", model="cfg_type", manufacturer=manufacturer
+        )
+        cls.device = Device.objects.create(
+            device_type=device_type, name="cfg_device", role=device_role, site=site
+        )
+        cls.other_device = Device.objects.create(
+            device_type=device_type, name="cfg_other", role=device_role, site=site
+        )
+        rir = RIR.objects.create(name="cfg_rir", slug="cfg_rir")
+        local_as = ASN.objects.create(asn=65200, rir=rir)
+        remote_as = ASN.objects.create(asn=65201, rir=rir)
+        local_ip = IPAddress.objects.create(address="10.200.0.1/32")
+
+        community_list = CommunityList.objects.create(name="cfg_cl")
+        CommunityListRule.objects.create(
+            community_list=community_list, action="permit",
+            community=Community.objects.create(value="65200:*"),
+        )
+        prefix_list = PrefixList.objects.create(
+            name="cfg_pl", family=IPAddressFamilyChoices.FAMILY_4
+        )
+        PrefixListRule.objects.create(
+            prefix_list=prefix_list, index=10, action="permit", prefix_custom="10.0.0.0/8", le=24
+        )
+        policy = RoutingPolicy.objects.create(name="cfg_in")
+        rule = RoutingPolicyRule.objects.create(
+            routing_policy=policy, index=10, action="permit",
+            set_actions={"local-preference": 200},
+        )
+        rule.match_ip_address.add(prefix_list)
+        rule.match_community_list.add(community_list)
+        peer_group = BGPPeerGroup.objects.create(name="cfg_group")
+        peer_group.import_policies.add(policy)
+
+        for device, count in ((cls.device, 1), (cls.other_device, 10)):
+            for i in range(count):
+                session = BGPSession.objects.create(
+                    name=f"{device.name}_session{i}",
+                    device=device,
+                    local_address=local_ip,
+                    remote_address=IPAddress.objects.create(address=f"10.201.{device.pk % 256}.{i + 1}/32"),
+                    local_as=local_as,
+                    remote_as=remote_as,
+                    peer_group=peer_group,
+                    prefix_list_in=prefix_list,
+                )
+                session.import_policies.add(policy)
+
+    def test_config_not_modified(self):
+        self.add_permissions("netbox_bgp.view_bgpsession", "dcim.view_device")
+        url = reverse("plugins-api:netbox_bgp-api:device-config", kwargs={"pk": self.device.pk})
+        response = self.client.get(url, **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertEqual(response["ETag"], f'"{response.data["content_hash"]}"')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"], **self.header)
+        self.assertHttpStatus(response, 304)
+
+    def test_context_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as one:
+            load_context(device=self.device)
+        with CaptureQueriesContext(connection) as many:
+            context = load_context(device=self.other_device)
+        self.assertEqual(len(one), len(many))
+        self.assertEqual(len(context["bgp"][0]["sessions"]), 10)
+
+    def test_render_device_config(self):
+        self.add_permissions("dcim.view_device", "netbox_bgp.view_bgpsession")
+        url = reverse("plugins-api:netbox_bgp-api:device-config", kwargs={"pk": self.device.pk})
+        response = self.client.get(f"{url}?renderer=frr", **self.header)
+        self.assertHttpStatus(response, 200)
+
+        config = response.data["config"]
+        self.assertEqual(response.data["renderer"], "frr")
+        self.assertIn("router bgp 65200", config)
+        self.assertIn("neighbor 10.201.", config)
+        self.assertIn("ip prefix-list cfg_pl seq 10 permit 10.0.0.0/8 le 24", config)
+        self.assertIn("route-map cfg_in permit 10", config)
+        self.assertIn("bgp community-list expanded cfg_cl permit ^65200:\\d+$", config)
+
+        # Unchanged inputs give the same content hash
+        response2 = self.client.get(f"{url}?renderer=frr", **self.header)
+        self.assertEqual(response.data["content_hash"], response2.data["content_hash"])
+
+    def test_render_several_policies(self):
+        policy = RoutingPolicy.objects.create(name="cfg_tag")
+        rule = RoutingPolicyRule.objects.create(routing_policy=policy, index=10, action="permit")
+        rule.match_community.add(
+            Community.objects.create(value="65200:10"), Community.objects.create(value="65200:20")
+        )
+        session = BGPSession.objects.get(device=self.device)
+        session.import_policies.add(policy)
+
+        self.add_permissions("dcim.view_device", "netbox_bgp.view_bgpsession")
+        url = reverse("plugins-api:netbox_bgp-api:device-config", kwargs={"pk": self.device.pk})
+        response = self.client.get(f"{url}?renderer=frr", **self.header)
+        self.assertHttpStatus(response, 200)
+
+        # The policies are chained in a single route-map per direction
+        config = response.data["config"]
+        self.assertIn("route-map cfg_in+cfg_tag permit 10\n call cfg_in\n on-match next\n", config)
+        self.assertIn("route-map cfg_in+cfg_tag permit 20\n call cfg_tag\n!", config)
+        self.assertEqual(config.count(" route-map cfg_in+cfg_tag in"), 1)
+        self.assertNotIn("route-map cfg_tag in", config)
+
+        # The rule matches any of its communities
+        self.assertIn("bgp community-list standard cfg_tag-10 permit 65200:10\n", config)
+        self.assertIn("bgp community-list standard cfg_tag-10 permit 65200:20\n", config)
+
+    def test_render_restricted_sessions(self):
+        self.add_permissions("dcim.view_device")
+        url = reverse("plugins-api:netbox_bgp-api:device-config", kwargs={"pk": self.device.pk})
+        response = self.client.get(f"{url}?renderer=junos", **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertNotIn("neighbor", response.data["config"])
+
+    def test_unknown_renderer(self):
+        self.add_permissions("dcim.view_device")
+        url = reverse("plugins-api:netbox_bgp-api:device-config", kwargs={"pk": self.device.pk})
+        response = self.client.get(f"{url}?renderer=unknown", **self.header)
+        self.assertHttpStatus(response, 400)
+
+
+class GraphQLQueryCountTestCase(APITestCase):
+    """
+    Nested relations of the GraphQL types must be fetched in batches, whatever
+    the number of sessions returned.
+    """
+    query = """
+    {
+      netbox_bgp_session_list {
+        id
+        display
+        peer_group { name import_policies { name } }
+        import_policies {
+          name
+          rules {
+            display
+            match_community { value }
+            match_ip_address { name prefrules { display prefix_custom } }
+          }
+        }
+        prefix_list_in { name prefrules { display ge le } }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        site = Site.objects.create(name="gql_site", slug="gql_site")
+        manufacturer = Manufacturer.objects.create(name="gql_vendor", slug="gql_vendor")
+        device_role = DeviceRole.objects.create(name="gql_role", slug="gql_role")
+        device_type = DeviceType.objects.create(
+            slug="gql_type", model="gql_type", manufacturer=manufacturer
+        )
+        cls.device = Device.objects.create(
+            device_type=device_type, name="gql_device", role=device_role, site=site
+        )
+        rir = RIR.objects.create(name="gql_rir", slug="gql_rir")
+        cls.local_as = ASN.objects.create(asn=65120, rir=rir)
+        cls.remote_as = ASN.objects.create(asn=65121, rir=rir)
+        cls.local_ip = IPAddress.objects.create(address="10.120.0.1/32")
+        cls.remote_ips = IPAddress.objects.bulk_create(
+            IPAddress(address=f"10.121.{i // 250}.{i % 250 + 1}/32") for i in range(1000)
+        )
+
+        community = Community.objects.create(value="65120:1")
+        cls.prefix_lists = PrefixList.objects.bulk_create(
+            PrefixList(name=f"gql_pl{i}", family=IPAddressFamilyChoices.FAMILY_4) for i in range(5)
+        )
+        PrefixListRule.objects.bulk_create(
+            PrefixListRule(
+                prefix_list=prefix_list, index=index, action="permit", prefix_custom=f"10.{index}.0.0/16"
+            )
+            for prefix_list in cls.prefix_lists for index in (10, 20, 30)
+        )
+        cls.policies = RoutingPolicy.objects.bulk_create(
+            RoutingPolicy(name=f"gql_rp{i}") for i in range(5)
+        )
+        for policy, prefix_list in zip(cls.policies, cls.prefix_lists):
+            for index in (10, 20):
+                rule = RoutingPolicyRule.objects.create(routing_policy=policy, index=index, action="permit")
+                rule.match_community.add(community)
+                rule.match_ip_address.add(prefix_list)
+        cls.peer_group = BGPPeerGroup.objects.create(name="gql_group")
+        cls.peer_group.import_policies.set(cls.policies[:2])
+
+    def create_sessions(self, start, stop):
+        sessions = BGPSession.objects.bulk_create(
+            BGPSession(
+                name=f"gql_session{i}",
+                device=self.device,
+                local_address=self.local_ip,
+                remote_address=self.remote_ips[i],
+                local_as=self.local_as,
+                remote_as=self.remote_as,
+                peer_group=self.peer_group,
+                prefix_list_in=self.prefix_lists[i % 5],
+            )
+            for i in range(start, stop)
+        )
+        through = BGPSession.import_policies.through
+        through.objects.bulk_create(
+            through(bgpsession_id=session.pk, routingpolicy_id=self.policies[i % 5].pk)
+            for i, session in enumerate(sessions, start=start)
+        )
+
+    def _query_sessions(self, count):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("graphql"), data={"query": self.query}, format="json", **self.header
+            )
+        self.assertHttpStatus(response, 200)
+        data = json.loads(response.content)
+        self.assertNotIn("errors", data)
+        self.assertEqual(len(data["data"]["netbox_bgp_session_list"]), count)
+        return data["data"]["netbox_bgp_session_list"], len(queries)
+
+    def test_query_count_is_bounded(self):
+        self.add_permissions(
+            "netbox_bgp.view_bgpsession",
+            "netbox_bgp.view_bgppeergroup",
+            "netbox_bgp.view_routingpolicy",
+            "netbox_bgp.view_routingpolicyrule",
+            "netbox_bgp.view_community",
+            "netbox_bgp.view_prefixlist",
+            "netbox_bgp.view_prefixlistrule",
+        )
+        self.create_sessions(0, 5)
+        # Warm up per-request caches (token, user config, content types)
+        self._query_sessions(5)
+        _, few = self._query_sessions(5)
+
+        self.create_sessions(5, 1000)
+        sessions, many = self._query_sessions(1000)
+        self.assertEqual(few, many)
+        self.assertLess(many, 25)
+
+        session = next(s for s in sessions if s["display"] == "gql_device:gql_session7")
+        self.assertEqual([p["name"] for p in session["import_policies"]], ["gql_rp2"])
+        rule = session["import_policies"][0]["rules"][0]
+        self.assertEqual(rule["display"], "gql_rp2: Rule 10")
+        self.assertEqual(rule["match_ip_address"][0]["prefrules"][0]["display"], "gql_pl2: Rule 10")
+        self.assertEqual(session["prefix_list_in"]["name"], "gql_pl2")
+
+
+class GraphQLCostTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        prefix_list = PrefixList.objects.create(name="cost_pl", family=IPAddressFamilyChoices.FAMILY_4)
+        for i in range(2):
+            policy = RoutingPolicy.objects.create(name=f"cost_rp{i}")
+            for index in (10, 20):
+                rule = RoutingPolicyRule.objects.create(routing_policy=policy, index=index, action="permit")
+                rule.match_ip_address.add(prefix_list)
+
+    def _query(self, query, **config):
+        self.add_permissions(
+            "netbox_bgp.view_routingpolicy",
+            "netbox_bgp.view_routingpolicyrule",
+            "netbox_bgp.view_prefixlist",
+        )
+        plugins_config = {**settings.PLUGINS_CONFIG}
+        plugins_config["netbox_bgp"] = {**plugins_config["netbox_bgp"], **config}
+        with self.settings(PLUGINS_CONFIG=plugins_config):
+            response = self.client.post(reverse("graphql"), data={"query": query}, format="json", **self.header)
+        self.assertHttpStatus(response, 200)
+        return json.loads(response.content)
+
+    def test_max_depth(self):
+        query = "{ netbox_bgp_routing_policy_list { name rules { index match_ip_address { name } } } }"
+        data = self._query(query, graphql_max_depth=2)
+        self.assertIn("query depth (3) exceeds the maximum of 2", data["errors"][0]["message"])
+        data = self._query(query, graphql_max_depth=3)
+        self.assertNotIn("errors", data)
+
+    def test_max_cost(self):
+        data = self._query("{ netbox_bgp_routing_policy_list { name rules { index } } }", graphql_max_cost=1)
+        self.assertIn("exceeds the maximum of 1", data["errors"][0]["message"])
+
+    def test_pagination_lowers_cost(self):
+        # One policy and its two rules
+        data = self._query(
+            "{ netbox_bgp_routing_policy_list(pagination: {limit: 1}) { name rules { index } } }",
+            graphql_max_cost=10,
+        )
+        self.assertNotIn("errors", data)
+        self.assertEqual(len(data["data"]["netbox_bgp_routing_policy_list"]), 1)
+
+
+class ExportTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.prefix_list = PrefixList.objects.create(
+            name="exp_pl", family=IPAddressFamilyChoices.FAMILY_4
+        )
+        for i in range(1, 4):
+            PrefixListRule.objects.create(
+                prefix_list=cls.prefix_list, index=i * 10, action="permit", prefix_custom=f"10.{i}.0.0/16"
+            )
+        rule = RoutingPolicyRule.objects.create(
+            routing_policy=RoutingPolicy.objects.create(name="exp_policy"), index=10, action="permit",
+            set_actions={"local-preference": 200},
+        )
+        rule.match_ip_address.add(cls.prefix_list)
+
+    def test_export_ndjson(self):
+        self.add_permissions("netbox_bgp.view_prefixlistrule")
+        url = reverse("plugins-api:netbox_bgp-api:prefixlistrule-export")
+        response = self.client.get(f"{url}?index__gte=20", **self.header)
+        self.assertHttpStatus(response, 200)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["prefix_custom"] for row in rows], ["10.2.0.0/16", "10.3.0.0/16"])
+        self.assertEqual(rows[0]["prefix_list"], self.prefix_list.pk)
+
+    def test_export_csv_gzip(self):
+        self.add_permissions("netbox_bgp.view_routingpolicyrule")
+        url = reverse("plugins-api:netbox_bgp-api:routingpolicyrule-export")
+        response = self.client.get(f"{url}?output=csv", HTTP_ACCEPT_ENCODING="gzip", **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["match_ip_address"], str(self.prefix_list.pk))
+        self.assertEqual(json.loads(rows[0]["set_actions"]), {"local-preference": 200})
+
+    def test_export_without_permission(self):
+        url = reverse("plugins-api:netbox_bgp-api:prefixlistrule-export")
+        response = self.client.get(url, **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"")
+
+
+class ChangesTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Community.objects.create(value="65100:1")
+        Community.objects.create(value="65100:2")
+        Community.objects.create(value="65100:3")
+
+    def test_changes(self):
+        self.add_permissions("netbox_bgp.view_community", "netbox_bgp.delete_community")
+        since = timezone.now()
+        Community.objects.create(value="65100:4")
+        community = Community.objects.get(value="65100:1")
+        community.description = "changed"
+        community.save()
+        deleted = Community.objects.get(value="65100:2")
+        response = self.client.delete(
+            reverse("plugins-api:netbox_bgp-api:community-detail", kwargs={"pk": deleted.pk}), **self.header
+        )
+        self.assertHttpStatus(response, 204)
+
+        url = reverse("plugins-api:netbox_bgp-api:changes")
+        response = self.client.get(url, {"since": since.isoformat(), "model": "community"}, **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertTrue(response.data["complete"])
+        self.assertEqual([c["value"] for c in response.data["created"]["community"]], ["65100:4"])
+        self.assertEqual([c["value"] for c in response.data["updated"]["community"]], ["65100:1"])
+        self.assertEqual(response.data["deleted"]["community"], [deleted.pk])
+
+    def test_changes_limit(self):
+        self.add_permissions("netbox_bgp.view_community")
+        since = timezone.now() - timedelta(minutes=5)
+        # More changes at the same time than fit in a response
+        Community.objects.update(last_updated=since + timedelta(minutes=1))
+        url = reverse("plugins-api:netbox_bgp-api:changes")
+        response = self.client.get(
+            url, {"since": since.isoformat(), "model": "community", "limit": 2}, **self.header
+        )
+        self.assertHttpStatus(response, 200)
+        self.assertFalse(response.data["complete"])
+        values = [c["value"] for c in response.data["created"]["community"]]
+        self.assertEqual(len(values), 2)
+
+        response = self.client.get(
+            url, {"since": response.data["cursor"], "model": "community", "limit": 2}, **self.header
+        )
+        self.assertHttpStatus(response, 200)
+        self.assertTrue(response.data["complete"])
+        values += [c["value"] for c in response.data["created"]["community"]]
+        self.assertEqual(sorted(values), ["65100:1", "65100:2", "65100:3"])
+
+    def test_deletions_restricted(self):
+        permission = ObjectPermission.objects.create(
+            name="public communities", actions=["view"], constraints={"description": "public"}
+        )
+        permission.object_types.add(ObjectType.objects.get_for_model(Community))
+        permission.users.add(self.user)
+        since = timezone.now()
+        public = Community.objects.create(value="65100:10", description="public")
+        private = Community.objects.create(value="65100:11", description="private")
+        for community in (public, private):
+            community.snapshot()
+            change = community.to_objectchange(ObjectChangeActionChoices.ACTION_DELETE)
+            change.user = self.user
+            change.request_id = uuid.uuid4()
+            change.save()
+
+        url = reverse("plugins-api:netbox_bgp-api:changes")
+        response = self.client.get(url, {"since": since.isoformat(), "model": "community"}, **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertEqual(response.data["deleted"]["community"], [public.pk])
+
+    def test_changes_requires_since(self):
+        url = reverse("plugins-api:netbox_bgp-api:changes")
+        response = self.client.get(url, **self.header)
+        self.assertHttpStatus(response, 400)
+
+
+class ConditionalGetTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Community.objects.create(value="65110:1")
+        Community.objects.create(value="65110:2")
+
+    def test_list_not_modified(self):
+        self.add_permissions("netbox_bgp.view_community")
+        url = reverse("plugins-api:netbox_bgp-api:community-list")
+        response = self.client.get(url, **self.header)
+        self.assertHttpStatus(response, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.header)
+        self.assertHttpStatus(response, 304)
+
+        community = Community.objects.first()
+        community.description = "changed"
+        community.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.header)
+        self.assertHttpStatus(response, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_hidden_changes(self):
+        permission = ObjectPermission.objects.create(
+            name="visible communities", actions=["view"], constraints={"value": "65110:1"}
+        )
+        permission.object_types.add(ObjectType.objects.get_for_model(Community))
+        permission.users.add(self.user)
+        url = reverse("plugins-api:netbox_bgp-api:community-list")
+        response = self.client.get(url, **self.header)
+        self.assertEqual(response.data["count"], 1)
+        etag = response["ETag"]
+
+        # Changes to the communities the user cannot see keep the ETag
+        hidden = Community.objects.get(value="65110:2")
+        hidden.description = "changed"
+        hidden.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.header)
+        self.assertHttpStatus(response, 304)
+
+    def test_detail_not_modified(self):
+        self.add_permissions("netbox_bgp.view_community")
+        community = Community.objects.first()
+        url = reverse("plugins-api:netbox_bgp-api:community-detail", kwargs={"pk": community.pk})
+        etag = self.client.get(url, **self.header)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.header)
+        self.assertHttpStatus(response, 304)
+        self.assertFalse(any("netbox_bgp_community\".\"value\"" in q["sql"] for q in queries.captured_queries))
+
+
 class PrefixListAPITestCase(
     APIViewTestCases.GetObjectViewTestCase,
     APIViewTestCases.ListObjectsViewTestCase,
@@ -0,0 +1,319 @@
+import re
+
+from django.test import SimpleTestCase, TestCase
+
+from ipam.models import Prefix
+
+from netbox_bgp.engine import (
+    CommunityListMatcher, PrefixListTrie, Route, compile_prefix_lists, compile_routing_policies,
+    get_community_list_matchers, invalidate_community_lists, parse_prefix,
+)
+from netbox_bgp.engine.community_list import compile_community_pattern, range_to_regex
+from netbox_bgp.models import (
+    Community, CommunityList, CommunityListRule, PrefixList, PrefixListRule, RoutingPolicy, RoutingPolicyRule,
+)
+
+
+class ParsePrefixTestCase(SimpleTestCase):
+
+    def test_parse_prefix(self):
+        self.assertEqual(parse_prefix('10.0.0.0/8'), (4, 10 << 24, 8))
+        self.assertEqual(parse_prefix('10.1.2.3/8'), (4, 10 << 24, 8))
+        self.assertEqual(parse_prefix('10.0.0.1'), (4, (10 << 24) + 1, 32))
+        self.assertEqual(parse_prefix('2001:db8::/32'), (6, 0x20010db8 << 96, 32))
+
+    def test_parse_invalid_prefix(self):
+        for value in ('10.0.0.0/33', '10.0.0/8', 'foo'):
+            with self.assertRaises(ValueError):
+                parse_prefix(value)
+
+
+class PrefixListTrieTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.trie = PrefixListTrie((
+            (5, 'deny', '10.1.2.0/24'),
+            (10, 'deny', '10.0.0.0/8'),
+            (20, 'permit', '10.0.0.0/8', None, 24),
+            (30, 'permit', '192.168.0.0/16', 20, None),
+            (40, 'permit', '172.16.0.0/12', 16, 20),
+            (50, 'permit', '2001:db8::/32', None, 48),
+        ))
+
+    def test_exact_match(self):
+        self.assertEqual(self.trie.match('10.0.0.0/8'), (10, 'deny'))
+        self.assertEqual(self.trie.match('10.1.2.0/24'), (5, 'deny'))
+
+    def test_le(self):
+        self.assertEqual(self.trie.match('10.1.0.0/16'), (20, 'permit'))
+        self.assertEqual(self.trie.match('10.1.3.0/24'), (20, 'permit'))
+        self.assertIsNone(self.trie.match('10.1.3.0/25'))
+
+    def test_ge(self):
+        self.assertIsNone(self.trie.match('192.168.0.0/16'))
+        self.assertIsNone(self.trie.match('192.168.0.0/19'))
+        self.assertEqual(self.trie.match('192.168.1.0/24'), (30, 'permit'))
+        self.assertEqual(self.trie.match('192.168.1.1/32'), (30, 'permit'))
+
+    def test_ge_le(self):
+        self.assertIsNone(self.trie.match('172.16.0.0/12'))
+        self.assertEqual(self.trie.match('172.20.0.0/16'), (40, 'permit'))
+        self.assertEqual(self.trie.match('172.20.16.0/20'), (40, 'permit'))
+        self.assertIsNone(self.trie.match('172.20.16.0/24'))
+
+    def test_first_match(self):
+        # The lower indexed, more specific deny wins over the broader permit
+        self.assertFalse(self.trie.permits('10.1.2.0/24'))
+        self.assertTrue(self.trie.permits('10.1.1.0/24'))
+
+    def test_implicit_deny(self):
+        self.assertFalse(self.trie.permits('8.8.8.0/24'))
+        self.assertFalse(self.trie.permits('2001:db9::/32'))
+
+    def test_ipv6(self):
+        self.assertTrue(self.trie.permits('2001:db8:1::/48'))
+        self.assertFalse(self.trie.permits('2001:db8:1::/64'))
+
+    def test_classify(self):
+        prefixes = ['10.1.1.0/24', '10.1.2.0/24', '8.8.8.0/24', '10.1.1.0/24', '2001:db8::/32']
+        self.assertEqual(self.trie.classify(prefixes), [True, False, False, True, True])
+
+    def test_add_after_lookup(self):
+        self.assertFalse(self.trie.permits('8.8.8.0/24'))
+        self.trie.add(60, 'permit', '0.0.0.0/0', None, 24)
+        self.assertTrue(self.trie.permits('8.8.8.0/24'))
+        self.assertEqual(len(self.trie), 7)
+
+
+class CompilePrefixListsTestCase(TestCase):
+
+    def test_compile_prefix_lists(self):
+        prefix_list = PrefixList.objects.create(name='customer', family='ipv4')
+        other = PrefixList.objects.create(name='empty', family='ipv4')
+        prefix = Prefix.objects.create(prefix='203.0.113.0/24')
+        PrefixListRule.objects.create(prefix_list=prefix_list, index=10, action='permit', prefix=prefix)
+        PrefixListRule.objects.create(
+            prefix_list=prefix_list, index=20, action='permit', prefix_custom='198.51.100.0/24', le=26
+        )
+
+        with self.assertNumQueries(1):
+            tries = compile_prefix_lists([prefix_list, other.pk])
+
+        self.assertTrue(tries[prefix_list.pk].permits('203.0.113.0/24'))
+        self.assertTrue(tries[prefix_list.pk].permits('198.51.100.64/26'))
+        self.assertFalse(tries[prefix_list.pk].permits('203.0.113.0/25'))
+        self.assertFalse(tries[other.pk].permits('203.0.113.0/24'))
+        self.assertEqual(len(PrefixListTrie.from_prefix_list(prefix_list)), 2)
+
+
+class CommunityPatternTestCase(SimpleTestCase):
+
+    def test_range_to_regex(self):
+        for low, high in ((0, 9), (5, 123), (100, 199), (64512, 65534), (99, 1000)):
+            regex = re.compile(f'^{range_to_regex(low, high)}$')
+            for number in range(0, 70000, 7):
+                self.assertEqual(bool(regex.match(str(number))), low <= number <= high, (low, high, number))
+
+    def test_compile_community_pattern(self):
+        self.assertIsNone(compile_community_pattern('65000:100'))
+        self.assertEqual(compile_community_pattern('65000:*'), r'65000:\d+')
+        self.assertEqual(compile_community_pattern('65000:1.'), r'65000:1\d')
+        with self.assertRaises(ValueError):
+            compile_community_pattern('65000:100:1:1')
+
+
+class CommunityListMatcherTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.matcher = CommunityListMatcher((
+            ('deny', '65000:666'),
+            ('permit', '65000:*'),
+            ('deny', '65001:1..'),
+            ('permit', '65001:100-300'),
+            ('permit', '65002:1:*'),
+            ('permit', '65001:5'),
+        ))
+
+    def test_first_match(self):
+        self.assertFalse(self.matcher.matches(frozenset(['65000:666', '65001:5'])))
+        self.assertTrue(self.matcher.matches(frozenset(['65000:1'])))
+        self.assertTrue(self.matcher.matches(frozenset(['65001:5'])))
+
+    def test_ranges(self):
+        self.assertFalse(self.matcher.matches(frozenset(['65001:150'])))
+        self.assertTrue(self.matcher.matches(frozenset(['65001:250'])))
+        self.assertFalse(self.matcher.matches(frozenset(['65001:301'])))
+
+    def test_large_communities(self):
+        self.assertTrue(self.matcher.matches(frozenset(['65002:1:77'])))
+        self.assertFalse(self.matcher.matches(frozenset(['65002:77'])))
+
+    def test_no_match(self):
+        self.assertFalse(self.matcher.matches(frozenset()))
+        self.assertFalse(self.matcher.matches(frozenset(['65003:1'])))
+
+    def test_match_many(self):
+        self.assertEqual(
+            self.matcher.match_many([['65000:1'], ['65000:666'], ['65003:1', '65001:250']]),
+            [True, False, True]
+        )
+
+
+class CommunityListCacheTestCase(TestCase):
+
+    def test_invalidation(self):
+        community_list = CommunityList.objects.create(name='cached')
+        community = Community.objects.create(value='65000:1')
+        rule = CommunityListRule.objects.create(community_list=community_list, action='permit', community=community)
+
+        matcher = get_community_list_matchers([community_list])[community_list.pk]
+        self.assertTrue(matcher.matches(frozenset(['65000:1'])))
+        with self.assertNumQueries(0):
+            self.assertIs(get_community_list_matchers([community_list])[community_list.pk], matcher)
+
+        # Changing the value of a community used by the list
+        community.value = '65000:*'
+        community.save()
+        matcher = get_community_list_matchers([community_list])[community_list.pk]
+        self.assertTrue(matcher.matches(frozenset(['65000:2'])))
+
+        # Changing a rule
+        rule.action = 'deny'
+        rule.save()
+        matcher = get_community_list_matchers([community_list])[community_list.pk]
+        self.assertFalse(matcher.matches(frozenset(['65000:2'])))
+
+    def test_invalidation_on_commit(self):
+        community_list = CommunityList.objects.create(name='committed')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            invalidate_community_lists([community_list.pk])
+            # A matcher compiled before the commit, as if by another process
+            matcher = get_community_list_matchers([community_list])[community_list.pk]
+        self.assertTrue(callbacks)
+        self.assertIsNot(get_community_list_matchers([community_list])[community_list.pk], matcher)
+
+
+class CompileRoutingPoliciesTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.policy = RoutingPolicy.objects.create(name='customer-in')
+        blackhole = Community.objects.create(value='65000:666')
+        no_export = Community.objects.create(value='65000:999')
+        community_list = CommunityList.objects.create(name='no-export')
+        CommunityListRule.objects.create(community_list=community_list, action='permit', community=no_export)
+
+        customer = PrefixList.objects.create(name='customer', family='ipv4')
+        PrefixListRule.objects.create(
+            prefix_list=customer, index=10, action='permit', prefix_custom='198.51.100.0/24', le=26
+        )
+
+        rule = RoutingPolicyRule.objects.create(routing_policy=cls.policy, index=5, action='deny')
+        rule.match_community.add(blackhole)
+        rule = RoutingPolicyRule.objects.create(
+            routing_policy=cls.policy, index=10, action='permit', continue_entry=30,
+            set_actions={'local-preference': 200, 'community additive': ['65000:100']},
+        )
+        rule.match_ip_address.add(customer)
+        RoutingPolicyRule.objects.create(routing_policy=cls.policy, index=20, action='deny')
+        rule = RoutingPolicyRule.objects.create(
+            routing_policy=cls.policy, index=30, action='permit',
+            set_actions={'as-path prepend': [65000, 65000], 'metric': '+10'},
+        )
+        rule.match_community_list.add(community_list)
+        RoutingPolicyRule.objects.create(
+            routing_policy=cls.policy, index=40, action='permit',
+            match_custom={'as-path': '_65001$', 'tag': 10},
+            set_actions={'set': 'origin incomplete'},
+        )
+
+    def setUp(self):
+        self.compiled = compile_routing_policies([self.policy])[self.policy.pk]
+
+    def test_fixed_query_count(self):
+        # Rules, their four relations, prefix list rules and community list rules
+        invalidate_community_lists(CommunityList.objects.values_list('pk', flat=True))
+        with self.assertNumQueries(7):
+            compile_routing_policies([self.policy.pk])
+
+    def test_warnings(self):
+        self.assertEqual(self.compiled.warnings, [
+            'Rule 40: match tag is not simulated and is ignored',
+            'Rule 40: set set is not simulated and is ignored',
+        ])
+
+    def test_first_match(self):
+        result = self.compiled.evaluate(Route('198.51.100.0/24', communities=['65000:666']))
+        self.assertFalse(result.permitted)
+        self.assertEqual(result.rules, [5])
+
+    def test_catch_all_deny(self):
+        result = self.compiled.evaluate(Route('203.0.113.0/24', as_path=[65002]))
+        self.assertEqual(result.action, 'deny')
+        self.assertEqual(result.rules, [20])
+
+    def test_set_actions(self):
+        route = Route('198.51.100.0/25', med=5)
+        result = self.compiled.evaluate(route)
+        self.assertTrue(result.permitted)
+        self.assertEqual(result.rules, [10])
+        self.assertEqual(result.route.local_pref, 200)
+        self.assertEqual(result.route.communities, {'65000:100'})
+        # The input route is left untouched
+        self.assertIsNone(route.local_pref)
+
+    def test_continue_entry(self):
+        result = self.compiled.evaluate(Route('198.51.100.0/24', communities=['65000:999'], med=5))
+        self.assertEqual(result.rules, [10, 30])
+        self.assertEqual(result.route.as_path, (65000, 65000))
+        self.assertEqual(result.route.med, 15)
+        self.assertEqual(result.route.communities, {'65000:100', '65000:999'})
+
+    def test_evaluate_many(self):
+        results = self.compiled.evaluate_many([
+            '198.51.100.0/26',
+            {'prefix': '198.51.100.0/27'},
+            {'prefix': '203.0.113.0/24', 'as_path': '65002 65001'},
+        ])
+        self.assertEqual([result.action for result in results], ['permit', 'deny', 'deny'])
+        self.assertEqual(results[0].to_dict()['attributes']['local_pref'], 200)
+
+
+class InvalidMatchTestCase(TestCase):
+
+    def test_invalid_match_custom(self):
+        policy = RoutingPolicy.objects.create(name='invalid')
+        for index, match_custom in enumerate((
+            {'metric': 'abc'},
+            {'as-path': '(65001'},
+            {'as-path': [65001]},
+            {'local-preference': None},
+        ), start=1):
+            RoutingPolicyRule.objects.create(
+                routing_policy=policy, index=index, action='permit', match_custom=match_custom
+            )
+        compiled = compile_routing_policies([policy])[policy.pk]
+        self.assertEqual(len(compiled.warnings), 4)
+        self.assertTrue(all(warning.endswith('the rule never matches') for warning in compiled.warnings))
+        # No rule matches, the route falls through to the implicit deny
+        result = compiled.evaluate(Route('10.0.0.0/8', as_path=[65001], med=0))
+        self.assertEqual(result.action, 'deny')
+        self.assertEqual(result.rules, [])
+
+
+class RouteTestCase(SimpleTestCase):
+
+    def test_from_dict(self):
+        route = Route.from_dict({'prefix': '10.0.0.0/8', 'communities': '65000:1 65000:2', 'med': 10})
+        self.assertEqual(route.communities, {'65000:1', '65000:2'})
+        self.assertEqual(route.med, 10)
+
+    def test_from_dict_invalid(self):
+        for data in (
+            {'prefix': '10.0.0.0/8', 'med': '10'},
+            {'prefix': '10.0.0.0/8', 'local_pref': True},
+            {'prefix': '10.0.0.0/8', 'communities': [65000]},
+            {'prefix': '10.0.0.0/8', 'communities': {'65000:1': True}},
+        ):
+            with self.assertRaises(ValueError):
+                Route.from_dict(data)
@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from ipam.models import Prefix
+
+from netbox_bgp.filtersets import BGPSessionFilterSet, PrefixListRuleFilterSet, parse_asn, parse_integer
+from netbox_bgp.models import BGPSession, PrefixList, PrefixListRule
+
+
+class PrefixListRuleFilterSetTestCase(TestCase):
+    queryset = PrefixListRule.objects.all()
+    filterset = PrefixListRuleFilterSet
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.prefix_list = prefix_list = PrefixList.objects.create(name='pl', family='ipv4')
+        prefix = Prefix.objects.create(prefix='10.1.0.0/16')
+        PrefixListRule.objects.bulk_create((
+            PrefixListRule(prefix_list=prefix_list, index=10, action='permit', prefix=prefix, le=24),
+            PrefixListRule(
+                prefix_list=prefix_list, index=20, action='permit', prefix_custom='10.1.2.0/24',
+                description='customer block'
+            ),
+            PrefixListRule(prefix_list=prefix_list, index=30, action='deny', prefix_custom='10.1.2.128/25'),
+            PrefixListRule(prefix_list=prefix_list, index=40, action='deny', prefix_custom='192.168.0.0/16'),
+        ))
+
+    def get_indexes(self, params):
+        return sorted(self.filterset(params, self.queryset).qs.values_list('index', flat=True))
+
+    def test_contains(self):
+        self.assertEqual(self.get_indexes({'contains': '10.1.2.0/24'}), [10, 20])
+        self.assertEqual(self.get_indexes({'contains': '10.1.2.200'}), [10, 20, 30])
+
+    def test_within(self):
+        self.assertEqual(self.get_indexes({'within': '10.1.2.0/24'}), [30])
+        self.assertEqual(self.get_indexes({'within': '10.0.0.0/8'}), [10, 20, 30])
+
+    def test_within_include(self):
+        self.assertEqual(self.get_indexes({'within_include': '10.1.2.0/24'}), [20, 30])
+
+    def test_overlaps(self):
+        self.assertEqual(self.get_indexes({'overlaps': '10.1.2.0/24'}), [10, 20, 30])
+        self.assertEqual(self.get_indexes({'overlaps': '172.16.0.0/12'}), [])
+
+    def test_invalid_prefix(self):
+        self.assertEqual(self.get_indexes({'contains': 'not-a-prefix'}), [])
+
+    def test_search(self):
+        self.assertEqual(self.get_indexes({'q': '192.168.0.0/16'}), [40])
+        self.assertEqual(self.get_indexes({'q': 'customer'}), [20])
+        # Numbers match the indexes, the lengths and the prefix list
+        self.assertEqual(self.get_indexes({'q': str(self.prefix_list.pk)}), [10, 20, 30, 40])
+        self.assertEqual(self.get_indexes({'q': 'deny'}), [30, 40])
+        # Digits that int() rejects are searched as text
+        self.assertEqual(self.get_indexes({'q': '\u00b2'}), [])
+
+
+class ParseTestCase(SimpleTestCase):
+
+    def test_parse_integer(self):
+        self.assertEqual(parse_integer(' 24 '), 24)
+        self.assertIsNone(parse_integer('\u00b2'))
+
+    def test_parse_asn(self):
+        self.assertEqual(parse_asn('AS65000'), 65000)
+        self.assertEqual(parse_asn('1.10'), 65546)
+        self.assertIsNone(parse_asn('AS\u00b2'))
+        self.assertIsNone(parse_asn('1.\u00b2'))
+
+
+class SearchIndexTestCase(TestCase):
+
+    def test_search_uses_trigram_index(self):
+        queryset = BGPSessionFilterSet({'q': 'edge'}, BGPSession.objects.all()).qs
+        with connection.cursor() as cursor:
+            # The tables are empty, a sequential scan would always be cheaper
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('netbox_bgp_session_trgm', queryset.explain())
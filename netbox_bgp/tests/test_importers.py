@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import ObjectChange, ObjectType
+from users.models import ObjectPermission
+from dcim.models import Site, DeviceRole, DeviceType, Manufacturer, Device
+from ipam.models import IPAddress, ASN, RIR
+
+from netbox_bgp.importers import BGPSessionImporter
+from netbox_bgp.models import BGPPeerGroup, BGPSession, BGPSessionEffectivePolicy, RoutingPolicy
+
+
+class BGPSessionImporterTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        site = Site.objects.create(name="imp_site", slug="imp_site")
+        manufacturer = Manufacturer.objects.create(name="imp_vendor", slug="imp_vendor")
+        device_role = DeviceRole.objects.create(name="imp_role", slug="imp_role")
+        device_type = DeviceType.objects.create(
+            slug="imp_type", model="imp_type", manufacturer=manufacturer
+        )
+        for name in ("imp_device1", "imp_device2"):
+            Device.objects.create(device_type=device_type, name=name, role=device_role, site=site)
+        rir = RIR.objects.create(name="imp_rir", slug="imp_rir")
+        ASN.objects.create(asn=65300, rir=rir)
+        ASN.objects.create(asn=65301, rir=rir)
+        IPAddress.objects.create(address="10.30.0.1/32")
+        for i in range(1, 21):
+            IPAddress.objects.create(address=f"10.31.0.{i}/32")
+        RoutingPolicy.objects.create(name="imp_in")
+        RoutingPolicy.objects.create(name="imp_out")
+        peer_group = BGPPeerGroup.objects.create(name="imp_group")
+        peer_group.export_policies.add(RoutingPolicy.objects.get(name="imp_out"))
+
+    def get_records(self, count, device="imp_device1"):
+        return [
+            {
+                "name": f"session{i}",
+                "device": device,
+                "site": "imp_site",
+                "status": "active",
+                "local_address": "10.30.0.1/32",
+                "remote_address": f"10.31.0.{i}/32",
+                "local_as": "65300",
+                "remote_as": "65301",
+                "peer_group": "imp_group",
+                "import_policies": "imp_in",
+            }
+            for i in range(1, count + 1)
+        ]
+
+    def test_import(self):
+        importer = BGPSessionImporter()
+        sessions, errors = importer.clean(self.get_records(3))
+        self.assertEqual(errors, [])
+        importer.save(sessions)
+
+        session = BGPSession.objects.get(name="session2")
+        self.assertEqual(session.device.name, "imp_device1")
+        self.assertEqual(str(session.remote_address.address), "10.31.0.2/32")
+        self.assertEqual(session.remote_as.asn, 65301)
+        self.assertEqual([p.name for p in session.import_policies.all()], ["imp_in"])
+        self.assertEqual(
+            set(BGPSessionEffectivePolicy.objects.filter(session=session).values_list('policy__name', flat=True)),
+            {"imp_in", "imp_out"}
+        )
+        self.assertEqual(
+            ObjectChange.objects.filter(changed_object_id__in=[s.pk for s in sessions]).count(), 3
+        )
+
+    def test_query_count_is_constant(self):
+        def import_records(records):
+            importer = BGPSessionImporter()
+            importer.save(importer.clean(records)[0])
+
+        # Warm up the content type caches
+        records = self.get_records(20, device="imp_device2")
+        import_records(records[:1])
+        with CaptureQueriesContext(connection) as few:
+            import_records(self.get_records(2))
+        with CaptureQueriesContext(connection) as many:
+            import_records(records[1:])
+        self.assertEqual(BGPSession.objects.count(), 22)
+        self.assertEqual(len(few), len(many))
+
+    def test_errors(self):
+        records = self.get_records(3)
+        records[0]["device"] = "unknown"
+        records[1]["local_as"] = ""
+        records[2]["remote_address"] = "not an address"
+        sessions, errors = BGPSessionImporter().clean(records)
+        self.assertEqual(sessions, [])
+        self.assertEqual(errors, [
+            (1, "device", "Object not found: unknown"),
+            (2, "local_as", "This field is required"),
+            (3, "remote_address", "Invalid value: not an address"),
+        ])
+
+    def test_duplicates(self):
+        importer = BGPSessionImporter()
+        importer.save(importer.clean(self.get_records(1))[0])
+        records = self.get_records(2)
+        records.append(dict(records[1]))
+        sessions, errors = BGPSessionImporter().clean(records)
+        self.assertEqual([s.name for s in sessions], ["session2"])
+        self.assertEqual([number for number, _, _ in errors], [1, 3])
+
+    def test_supports(self):
+        self.assertTrue(BGPSessionImporter.supports(self.get_records(1)))
+        self.assertFalse(BGPSessionImporter.supports([{"id": 1, "name": "session"}]))
+        self.assertFalse(BGPSessionImporter.supports(self.get_records(1), headers={"device": "id"}))
+
+    def test_lookups_are_restricted(self):
+        user = get_user_model().objects.create_user(username="imp_user")
+        permission = ObjectPermission.objects.create(name="imp_view", actions=["view"])
+        permission.object_types.add(*ObjectType.objects.filter(
+            app_label__in=("dcim", "ipam", "netbox_bgp", "extras", "tenancy")
+        ))
+        permission.users.add(user)
+        # The user may not view the second device
+        restricted = ObjectPermission.objects.create(
+            name="imp_device", actions=["view"], constraints={"name": "imp_device1"}
+        )
+        restricted.object_types.add(ObjectType.objects.get_for_model(Device))
+        permission.object_types.remove(ObjectType.objects.get_for_model(Device))
+        restricted.users.add(user)
+
+        records = self.get_records(1) + self.get_records(2, device="imp_device2")[1:]
+        sessions, errors = BGPSessionImporter(user=user).clean(records)
+        self.assertEqual([s.name for s in sessions], ["session1"])
+        self.assertEqual(errors, [(2, "device", "Object not found: imp_device2")])
+
+    @override_settings(CUSTOM_VALIDATORS={
+        "netbox_bgp.bgpsession": [{"description": {"required": True}}]
+    })
+    def test_custom_validators(self):
+        records = self.get_records(2)
+        records[1]["description"] = "described"
+        sessions, errors = BGPSessionImporter().clean(records)
+        self.assertEqual([s.name for s in sessions], ["session2"])
+        self.assertEqual([(number, field) for number, field, _ in errors], [(1, "description")])
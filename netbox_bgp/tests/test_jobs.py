@@ -0,0 +1,179 @@
+import io
+import json
+import os
+import tarfile
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Job, ObjectType
+from dcim.models import Device, DeviceRole, DeviceType, Manufacturer, Site
+from ipam.models import ASN, IPAddress, RIR
+from users.models import ObjectPermission
+
+from netbox_bgp.jobs import BulkImportJob, FleetConfigRenderJob, render_fleet
+from netbox_bgp.models import BGPSession
+from netbox_bgp.models import Community, PrefixList, PrefixListRule
+
+
+class BulkImportJobTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="importer", is_superuser=True)
+        Community.objects.create(value="65000:1", description="before")
+
+    def test_import_csv(self):
+        pk = Community.objects.get(value="65000:1").pk
+        data = (
+            "id,value,status,description\n"
+            f"{pk},65000:1,active,after\n"
+            ",65000:2,active,\n"
+            ",65000:3,unknown,\n"
+            ",65000:4,active,\n"
+        )
+        job = BulkImportJob.enqueue_import(Community, data, user=self.user, batch_size=2, immediate=True)
+        job.refresh_from_db()
+
+        self.assertEqual(job.data["processed"], 4)
+        self.assertEqual(job.data["created"], 2)
+        self.assertEqual(job.data["updated"], 1)
+        self.assertEqual(job.data["failed"], 1)
+        self.assertTrue(job.data["errors"][0].startswith("Record 3 status:"))
+        self.assertEqual(Community.objects.get(pk=pk).description, "after")
+        self.assertEqual(
+            set(Community.objects.values_list("value", flat=True)), {"65000:1", "65000:2", "65000:4"}
+        )
+
+    def test_resume(self):
+        data = "\n".join(f'{{"value": "65001:{i}", "status": "active"}}' for i in range(5))
+        # A job which failed after committing its first batch
+        job = Job.objects.create(
+            name=BulkImportJob.name, user=self.user, job_id=uuid.uuid4(), data={
+                "model": "community", "format": "json", "csv_delimiter": "auto",
+                "batch_size": 2, "processed": 2, "created": 2, "updated": 0, "failed": 0, "errors": [],
+            }
+        )
+
+        resumed = BulkImportJob.enqueue_import(Community, data, user=self.user, resume=job.pk, immediate=True)
+        resumed.refresh_from_db()
+        self.assertEqual(resumed.data["processed"], 5)
+        self.assertEqual(resumed.data["created"], 5)
+        self.assertEqual(
+            sorted(Community.objects.filter(value__startswith="65001:").values_list("value", flat=True)),
+            ["65001:2", "65001:3", "65001:4"]
+        )
+
+    def test_data_removed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            plugins_config = {**settings.PLUGINS_CONFIG}
+            plugins_config["netbox_bgp"] = {**plugins_config["netbox_bgp"], "import_directory": directory}
+            with self.settings(PLUGINS_CONFIG=plugins_config):
+                job = BulkImportJob.enqueue_import(Community, "value\n65002:1\n", user=self.user, immediate=True)
+                # A failed import
+                BulkImportJob.enqueue_import(Community, "{", user=self.user, data_format="json", immediate=True)
+            self.assertEqual(os.listdir(directory), [])
+        job.refresh_from_db()
+        self.assertNotIn(directory, str(job.data))
+
+    def test_restricted_lookups(self):
+        user = get_user_model().objects.create_user(username="restricted")
+        for model, actions, constraints in (
+            (PrefixList, ["view"], {"name": "visible"}),
+            (PrefixListRule, ["view", "add"], None),
+        ):
+            permission = ObjectPermission.objects.create(name=model.__name__, actions=actions, constraints=constraints)
+            permission.object_types.add(ObjectType.objects.get_for_model(model))
+            permission.users.add(user)
+        hidden = PrefixList.objects.create(name="hidden", family="ipv4")
+        visible = PrefixList.objects.create(name="visible", family="ipv4")
+
+        data = (
+            "prefix_list,index,action,prefix_custom\n"
+            f"{hidden.pk},10,permit,10.0.0.0/8\n"
+            f"{visible.pk},10,permit,10.0.0.0/8\n"
+        )
+        job = BulkImportJob.enqueue_import(PrefixListRule, data, user=user, immediate=True)
+        job.refresh_from_db()
+        self.assertEqual(job.data["created"], 1)
+        self.assertEqual(job.data["failed"], 1)
+        self.assertTrue(job.data["errors"][0].startswith("Record 1 prefix_list:"))
+        self.assertFalse(hidden.prefrules.exists())
+
+
+class FleetRenderTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = Manufacturer.objects.create(name="fleet_vendor", slug="fleet_vendor")
+        role = DeviceRole.objects.create(name="fleet_role", slug="fleet_role")
+        device_type = DeviceType.objects.create(model="fleet_type", slug="fleet_type", manufacturer=manufacturer)
+        rir = RIR.objects.create(name="fleet_rir", slug="fleet_rir")
+        local_as = ASN.objects.create(asn=65150, rir=rir)
+        remote_as = ASN.objects.create(asn=65151, rir=rir)
+        cls.devices = []
+        # Two devices of the same name in different sites, and one without sessions
+        for i, name in enumerate(("fleet-edge", "fleet-edge", "fleet-idle")):
+            site = Site.objects.create(name=f"fleet_site{i}", slug=f"fleet_site{i}")
+            cls.devices.append(Device.objects.create(name=name, site=site, role=role, device_type=device_type))
+        for i, device in enumerate(cls.devices[:2]):
+            BGPSession.objects.create(
+                name=f"fleet_session{i}",
+                device=device,
+                local_address=IPAddress.objects.create(address=f"10.150.0.{i + 1}/32"),
+                remote_address=IPAddress.objects.create(address=f"10.151.0.{i + 1}/32"),
+                local_as=local_as,
+                remote_as=remote_as,
+            )
+
+    def check_tarball(self, path, stats):
+        first, second = self.devices[:2]
+        names = ["devices/fleet-edge.conf", f"devices/fleet-edge-{second.pk}.conf"]
+        self.assertEqual(stats["total"], 2)
+        self.assertEqual(stats["rendered"], 2)
+        self.assertEqual(stats["failed"], 0)
+        self.assertEqual(stats["errors"], {})
+        with tarfile.open(path) as tarball:
+            self.assertEqual(sorted(tarball.getnames()), sorted(names + ["manifest.json"]))
+            manifest = json.load(tarball.extractfile("manifest.json"))
+            config = tarball.extractfile(names[0]).read().decode()
+        self.assertEqual(sorted(manifest), sorted(names))
+        self.assertIn("10.151.0.1", config)
+
+    def test_render_fleet(self):
+        progress = []
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fleet.tar.gz")
+            stats = render_fleet(output=path, workers=1, chunk_size=1, progress=lambda s: progress.append(dict(s)))
+            self.check_tarball(path, stats)
+        # Progress is reported after every chunk
+        self.assertEqual([p["rendered"] for p in progress], [1, 2])
+
+    def test_render_selected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            stats = render_fleet(
+                devices=[self.devices[0].pk, self.devices[2].pk], output=directory, archive=False, workers=1
+            )
+            self.assertEqual(sorted(os.listdir(os.path.join(directory, "devices"))), ["fleet-edge.conf"])
+            with open(os.path.join(directory, "manifest.json")) as f:
+                self.assertEqual(list(json.load(f)), ["devices/fleet-edge.conf"])
+        self.assertEqual(stats["rendered"], 1)
+
+    def test_job(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(MEDIA_ROOT=directory):
+            job = FleetConfigRenderJob.enqueue(workers=1, immediate=True)
+            job.refresh_from_db()
+            self.assertEqual(job.status, "completed")
+            self.assertTrue(job.data["output"].startswith(directory))
+            self.check_tarball(job.data["output"], job.data)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fleet.tar.gz")
+            call_command("bgp_render_fleet", "--workers", "1", "--output", path, stdout=io.StringIO(), stderr=io.StringIO())
+            with tarfile.open(path) as tarball:
+                self.assertIn("manifest.json", tarball.getnames())
@@ -6,7 +6,10 @@ from tenancy.models import Tenant
 from dcim.models import Site, Device, Manufacturer, DeviceRole, DeviceType
 from ipam.models import IPAddress, ASN, RIR
 
-from netbox_bgp.models import BGPSession, Community, CommunityList, RoutingPolicy, BGPPeerGroup
+from netbox_bgp.models import (
+    BGPSession, Community, CommunityList, RoutingPolicy, BGPPeerGroup, BGPSessionEffectivePolicy,
+    PrefixList, RoutingPolicyRule,
+)
 
 
 class RoutingPolicyTestCase(TestCase):
@@ -135,6 +138,55 @@ class CommunityListTestCase(TestCase):
         with self.assertRaises(IntegrityError):
             communitylist2.save()
 
+
+class RoutingPolicyRuleTestCase(TestCase):
+    def setUp(self):
+        self.routing_policy = RoutingPolicy.objects.create(
+            name='policy'
+        )
+        self.community = Community.objects.create(
+            value='65001:100'
+        )
+        self.prefix_list = PrefixList.objects.create(
+            name='prefix_list',
+            family='ipv4'
+        )
+        self.prefix_list6 = PrefixList.objects.create(
+            name='prefix_list6',
+            family='ipv6'
+        )
+        for index in (10, 20, 30):
+            rule = RoutingPolicyRule.objects.create(
+                routing_policy=self.routing_policy,
+                index=index,
+                action='permit',
+                match_custom={'ip address': ['custom_list']}
+            )
+            rule.match_community.add(self.community)
+            rule.match_ip_address.add(self.prefix_list)
+            rule.match_ipv6_address.add(self.prefix_list6)
+
+    def test_match_statements(self):
+        rule = RoutingPolicyRule.objects.first()
+        self.assertEqual(
+            rule.match_statements,
+            {
+                'community': ['65001:100'],
+                'ip address': ['custom_list'],
+                'ipv6 address': ['prefix_list6'],
+            }
+        )
+
+    def test_prefetch_match_statements(self):
+        rules = list(RoutingPolicyRule.objects.prefetch_match_statements())
+        with self.assertNumQueries(0):
+            statements = [rule.match_statements for rule in rules]
+        self.assertEqual(
+            statements,
+            [rule.match_statements for rule in RoutingPolicyRule.objects.all()]
+        )
+
+
 class BGPSessionTestCase(TestCase):
     def setUp(self):
         manufacturer = Manufacturer.objects.create(
@@ -207,3 +259,46 @@ class BGPSessionTestCase(TestCase):
 
     def test_unique_together(self):
         pass
+
+    def test_effective_policies(self):
+        group_policy = RoutingPolicy.objects.create(name='group_policy')
+        self.peer_group.import_policies.add(group_policy, self.routing_policy_in)
+        self.session.import_policies.add(self.routing_policy_in)
+        self.session.export_policies.add(self.routing_policy_out)
+
+        self.assertEqual(
+            list(self.session.effective_policies.values_list('direction', 'source', 'policy__name')),
+            [
+                ('export', 'session', 'policy_out'),
+                ('import', 'session', 'policy_in'),
+                ('import', 'peer_group', 'group_policy'),
+            ]
+        )
+        self.assertEqual(
+            list(BGPSession.objects.filter(effective_policies__policy=group_policy)),
+            [self.session]
+        )
+
+        # Policies inherited from the peer group follow the group membership
+        self.session.peer_group = None
+        self.session.save()
+        self.assertFalse(
+            BGPSessionEffectivePolicy.objects.filter(policy=group_policy).exists()
+        )
+
+        # Clearing the relation from the policy side is tracked too
+        self.routing_policy_out.session_export_policies.clear()
+        self.assertEqual(
+            list(self.session.effective_policies.values_list('direction', 'policy__name')),
+            [('import', 'policy_in')]
+        )
+
+    def test_using_policy(self):
+        group_policy = RoutingPolicy.objects.create(name='group_policy')
+        self.peer_group.export_policies.add(group_policy)
+        self.session.import_policies.add(self.routing_policy_in)
+
+        self.assertEqual(list(BGPSession.objects.using_policy(self.routing_policy_in)), [self.session])
+        self.assertEqual(list(BGPSession.objects.using_policy(group_policy)), [self.session])
+        self.assertEqual(list(BGPSession.objects.using_policy(group_policy, direction='import')), [])
+        self.assertEqual(list(BGPSession.objects.using_policy(self.routing_policy_out)), [])
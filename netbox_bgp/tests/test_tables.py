@@ -0,0 +1,68 @@
+from django.test import TestCase
+
+from netbox.tables import NetBoxTable
+
+from netbox_bgp.models import BGPPeerGroup, BGPSession, RoutingPolicyRule
+from netbox_bgp.tables import BGPSessionTable, ColumnPrefetchMixin, RoutingPolicyRuleTable
+
+
+class PeerGroupTable(ColumnPrefetchMixin, NetBoxTable):
+
+    class Meta(NetBoxTable.Meta):
+        model = BGPPeerGroup
+        fields = ("pk", "name", "import_policies", "tags")
+        default_columns = ("name", "import_policies")
+
+
+class ColumnPrefetchTestCase(TestCase):
+
+    def test_visible_relations(self):
+        queryset = PeerGroupTable(BGPPeerGroup.objects.all()).data.data
+        self.assertEqual(queryset._prefetch_related_lookups, ("import_policies",))
+        # Only the relations are prefetched, the fields read are left as they are
+        self.assertEqual(queryset.query.deferred_loading, (frozenset(), True))
+
+
+class ColumnQuerysetTestCase(TestCase):
+
+    def test_visible_columns(self):
+        table = BGPSessionTable(BGPSession.objects.all())
+        queryset = table.data.data
+        self.assertEqual(
+            set(queryset.query.select_related),
+            {"device", "virtualmachine", "local_address", "local_as", "remote_address", "remote_as", "site", "tenant"}
+        )
+        self.assertNotIn("import_policies", queryset._prefetch_related_lookups)
+        fields, defer = queryset.query.deferred_loading
+        self.assertFalse(defer)
+        self.assertIn("name", fields)
+        self.assertNotIn("peer_group", fields)
+        self.assertNotIn("custom_field_data", fields)
+
+    def test_hidden_columns(self):
+        table = BGPSessionTable(BGPSession.objects.all())
+        table.columns.show("import_policies")
+        table.columns.show("peer_group")
+        columns = [column for column in table.columns.iterall() if column.visible]
+        queryset = table.optimize_queryset(BGPSession.objects.all(), columns)
+        self.assertIn("peer_group", queryset.query.select_related)
+        self.assertEqual(queryset._prefetch_related_lookups, ("import_policies",))
+
+    def test_column_fields(self):
+        table = RoutingPolicyRuleTable(RoutingPolicyRule.objects.all())
+        queryset = table.data.data
+        self.assertEqual(set(queryset.query.select_related), {"routing_policy"})
+        self.assertTrue(
+            {"match_community", "match_community_list", "match_ip_address", "match_ipv6_address"}.issubset(
+                queryset._prefetch_related_lookups
+            )
+        )
+        self.assertIn("set_actions", queryset.query.deferred_loading[0])
+
+    def test_export_reads_all_fields(self):
+        table = BGPSessionTable(BGPSession.objects.all())
+        table.as_values(exclude_columns=("pk", "actions"))
+        queryset = table.data.data
+        self.assertEqual(queryset.query.deferred_loading, (frozenset(), True))
+        self.assertIn("peer_group", queryset.query.select_related)
+        self.assertIn("tags", queryset._prefetch_related_lookups)
@@ -0,0 +1,199 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from utilities.testing import TestCase
+
+from dcim.models import Site, DeviceRole, DeviceType, Manufacturer, Device
+from ipam.models import IPAddress, ASN, RIR
+from tenancy.models import Tenant
+
+from netbox_bgp.counters import get_session_counts, invalidate_session_counts
+from netbox_bgp.importers import BGPSessionImporter
+from netbox_bgp.models import BGPPeerGroup, BGPSession, RoutingPolicy
+
+
+class DeviceBGPSessionPanelTestCase(TestCase):
+    """
+    The device sessions panel is loaded from the session list, one page at a
+    time, at a cost independent of the number of sessions.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        site = Site.objects.create(name="panel_site", slug="panel_site")
+        tenant = Tenant.objects.create(name="panel_tenant", slug="panel_tenant")
+        manufacturer = Manufacturer.objects.create(name="panel_vendor", slug="panel_vendor")
+        device_role = DeviceRole.objects.create(name="panel_role", slug="panel_role")
+        device_type = DeviceType.objects.create(
+            slug="panel_type", model="panel_type", manufacturer=manufacturer
+        )
+        cls.devices = [
+            Device.objects.create(device_type=device_type, name=name, role=device_role, site=site)
+            for name in ("panel_device1", "panel_device2")
+        ]
+        rir = RIR.objects.create(name="panel_rir", slug="panel_rir")
+        local_as = ASN.objects.create(asn=65130, rir=rir)
+        remote_as = ASN.objects.create(asn=65131, rir=rir)
+        local_ip = IPAddress.objects.create(address="10.130.0.1/32")
+        remote_ips = IPAddress.objects.bulk_create(
+            IPAddress(address=f"10.131.0.{i}/32") for i in range(1, 46)
+        )
+        peer_group = BGPPeerGroup.objects.create(name="panel_group")
+        BGPSession.objects.bulk_create(
+            BGPSession(
+                name=f"panel_session{i}",
+                site=site,
+                tenant=tenant,
+                # 5 sessions on the first device, 40 on the second one
+                device=cls.devices[0] if i < 5 else cls.devices[1],
+                local_address=local_ip,
+                remote_address=remote_ip,
+                local_as=local_as,
+                remote_as=remote_as,
+                peer_group=peer_group,
+            )
+            for i, remote_ip in enumerate(remote_ips)
+        )
+
+    def _get_panel(self, device):
+        url = reverse("plugins:netbox_bgp:bgpsession_list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                url, {"device_id": device.pk, "embedded": True, "per_page": 50}, HTTP_HX_REQUEST="true"
+            )
+        self.assertHttpStatus(response, 200)
+        return response, len(queries)
+
+    def test_device_panel(self):
+        self.add_permissions("netbox_bgp.view_bgpsession")
+        # Warm up per-request caches (user config, content types)
+        self._get_panel(self.devices[0])
+
+        response, few = self._get_panel(self.devices[0])
+        self.assertContains(response, "panel_session4")
+        self.assertNotContains(response, "panel_session5")
+        _, many = self._get_panel(self.devices[1])
+        self.assertEqual(few, many)
+
+
+class SessionCountsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        site = Site.objects.create(name="count_site", slug="count_site")
+        manufacturer = Manufacturer.objects.create(name="count_vendor", slug="count_vendor")
+        device_role = DeviceRole.objects.create(name="count_role", slug="count_role")
+        device_type = DeviceType.objects.create(
+            slug="count_type", model="count_type", manufacturer=manufacturer
+        )
+        cls.devices = [
+            Device.objects.create(device_type=device_type, name=name, role=device_role, site=site)
+            for name in ("count_device1", "count_device2")
+        ]
+        rir = RIR.objects.create(name="count_rir", slug="count_rir")
+        cls.local_as = ASN.objects.create(asn=65140, rir=rir)
+        cls.remote_as = ASN.objects.create(asn=65141, rir=rir)
+        cls.local_ip = IPAddress.objects.create(address="10.140.0.1/32")
+        for i in range(1, 4):
+            IPAddress.objects.create(address=f"10.141.0.{i}/32")
+
+    def setUp(self):
+        super().setUp()
+        # Counts cached by an earlier test run, reusing the primary keys
+        invalidate_session_counts(device_ids=[device.pk for device in self.devices])
+
+    def create_session(self, i, **kwargs):
+        return BGPSession.objects.create(
+            name=f"count_session{i}",
+            device=self.devices[0],
+            local_address=self.local_ip,
+            remote_address=IPAddress.objects.get(address=f"10.141.0.{i}/32"),
+            local_as=self.local_as,
+            remote_as=self.remote_as,
+            **kwargs
+        )
+
+    def test_counts_follow_changes(self):
+        device1, device2 = self.devices
+        self.assertEqual(get_session_counts(device1), {})
+        session = self.create_session(1, status="active")
+        self.create_session(2, status="offline")
+        self.assertEqual(get_session_counts(device1), {"active": 1, "offline": 1})
+        with self.assertNumQueries(0):
+            get_session_counts(device1)
+
+        session.status = "failed"
+        session.save()
+        self.assertEqual(get_session_counts(device1), {"failed": 1, "offline": 1})
+
+        session.device = device2
+        session.save()
+        self.assertEqual(get_session_counts(device1), {"offline": 1})
+        self.assertEqual(get_session_counts(device2), {"failed": 1})
+
+        session.delete()
+        self.assertEqual(get_session_counts(device2), {})
+
+    def test_counts_after_import(self):
+        device = self.devices[1]
+        self.assertEqual(get_session_counts(device), {})
+        importer = BGPSessionImporter()
+        sessions, errors = importer.clean([{
+            "device": "count_device2",
+            "local_address": "10.140.0.1/32",
+            "remote_address": "10.141.0.3/32",
+            "local_as": "65140",
+            "remote_as": "65141",
+        }])
+        importer.save(sessions)
+        self.assertEqual(get_session_counts(device), {"active": 1})
+
+    def test_device_page(self):
+        self.add_permissions("dcim.view_device")
+        self.create_session(1, status="active")
+        self.create_session(2, status="active")
+        self.create_session(3, status="failed")
+        response = self.client.get(reverse("dcim:device", kwargs={"pk": self.devices[0].pk}))
+        self.assertHttpStatus(response, 200)
+        self.assertContains(response, '<span class="badge text-bg-green" title="Active">2</span>', html=True)
+        self.assertContains(response, '<span class="badge text-bg-red" title="Failed">1</span>', html=True)
+        self.assertNotContains(response, 'title="Offline"')
+
+    def test_device_tab(self):
+        self.add_permissions("dcim.view_device", "netbox_bgp.view_bgpsession")
+        self.create_session(1)
+        response = self.client.get(reverse("dcim:device_bgpsessions", kwargs={"pk": self.devices[0].pk}))
+        self.assertHttpStatus(response, 200)
+        self.assertContains(response, "count_session1")
+
+
+class BGPPeerGroupListTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        policies = RoutingPolicy.objects.bulk_create(
+            RoutingPolicy(name=f"list_rp{i}") for i in range(4)
+        )
+        for i in range(20):
+            peer_group = BGPPeerGroup.objects.create(name=f"list_group{i}")
+            peer_group.import_policies.set(policies[:2])
+            peer_group.export_policies.set(policies[2:])
+
+    def _list(self, per_page):
+        url = reverse("plugins:netbox_bgp:bgppeergroup_list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"per_page": per_page})
+        self.assertHttpStatus(response, 200)
+        return response, len(queries)
+
+    def test_policy_columns_query_count(self):
+        self.add_permissions("netbox_bgp.view_bgppeergroup")
+        self.user.config.set(
+            "tables.BGPPeerGroupTable.columns", ["name", "import_policies", "export_policies"], commit=True
+        )
+        self._list(2)
+
+        response, few = self._list(2)
+        self.assertContains(response, "list_rp3")
+        _, many = self._list(20)
+        self.assertEqual(few, many)
@@ -1,9 +1,10 @@
-from django.db.models import Q
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, redirect, render, reverse
+from django.utils.html import format_html
 from django.utils.text import slugify
 from utilities.views import register_model_view, ViewTab
 from netbox.views import generic
+from dcim.models import Device
 from ipam.models import ASN
 from virtualization.models import VirtualMachine
 
@@ -13,9 +14,38 @@ from .models import (
     PrefixListRule, CommunityList, CommunityListRule
 )
 
+from .choices import PolicyDirectionChoices, PolicySourceChoices
+from .counters import get_session_counts
+from .jobs import BulkImportJob
 from . import filtersets, forms, tables
 
 
+class BackgroundImportMixin:
+    """
+    Imports requested as a background job are run by BulkImportJob, which
+    reads the data in chunks and commits it in batches, instead of the whole
+    request being replayed in a single transaction.
+    """
+
+    def post(self, request):
+        upload = request.FILES.get('upload_file')
+        data = request.POST.get('data', '')
+        if not request.POST.get('background_job') or not (upload or data.strip()):
+            return super().post(request)
+
+        job = BulkImportJob.enqueue_import(
+            self.queryset.model,
+            upload or data,
+            user=request.user,
+            data_format=request.POST.get('format') or 'auto',
+            csv_delimiter=request.POST.get('csv_delimiter') or 'auto',
+        )
+        messages.info(request, format_html(
+            'Created background job {}: <a href="{}">{}</a>', job.pk, job.get_absolute_url(), job.name
+        ))
+        return redirect(job.get_absolute_url())
+
+
 # Community
 
 @register_model_view(Community, "list", path="", detail=False)
@@ -54,7 +84,7 @@ class CommunityDeleteView(generic.ObjectDeleteView):
     default_return_url = 'plugins:netbox_bgp:community_list'
 
 @register_model_view(Community, "bulk_import", path="import", detail=False)
-class CommunityBulkImportView(generic.BulkImportView):
+class CommunityBulkImportView(BackgroundImportMixin, generic.BulkImportView):
     queryset = Community.objects.all()
     model_form = forms.CommunityImportForm
 
@@ -92,7 +122,7 @@ class CommListView(generic.ObjectView):
     template_name = 'netbox_bgp/communitylist.html'
 
     def get_extra_context(self, request, instance):
-        rprules = instance.cmrules.all()
+        rprules = instance.cmrules.select_related('routing_policy').prefetch_match_statements()
         rprules_table = tables.RoutingPolicyRuleTable(rprules)
         rules = instance.commlistrules.all()
         rules_table = tables.CommunityListRuleTable(rules)
@@ -107,7 +137,7 @@ class CommunityListDeleteView(generic.ObjectDeleteView):
     default_return_url = 'plugins:netbox_bgp:communitylist_list'
 
 @register_model_view(CommunityList, "bulk_import", path="import", detail=False)
-class CommunityListBulkImportView(generic.BulkImportView):
+class CommunityListBulkImportView(BackgroundImportMixin, generic.BulkImportView):
     queryset = CommunityList.objects.all()
     model_form = forms.CommunityListImportForm
 
@@ -164,7 +194,7 @@ class BGPSessionAddView(generic.ObjectEditView):
     form = forms.BGPSessionAddForm
 
 @register_model_view(BGPSession, "bulk_import", path="import", detail=False)
-class BGPSessionBulkImportView(generic.BulkImportView):
+class BGPSessionBulkImportView(BackgroundImportMixin, generic.BulkImportView):
     queryset = BGPSession.objects.all()
     model_form = forms.BGPSessionImportForm
 
@@ -186,19 +216,25 @@ class BGPSessionView(generic.ObjectView):
     template_name = 'netbox_bgp/bgpsession.html'
 
     def get_extra_context(self, request, instance):
-        import_policies_qs = instance.import_policies.all()
-        if not import_policies_qs and instance.peer_group:
-            import_policies_qs = instance.peer_group.import_policies.all()
-        export_policies_qs = instance.export_policies.all()
-        if not export_policies_qs and instance.peer_group:
-            export_policies_qs = instance.peer_group.export_policies.all()
+        # The session's own policies take precedence over the peer group ones
+        effective = {}
+        for row in instance.effective_policies.select_related('policy'):
+            effective.setdefault((row.direction, row.source), []).append(row.policy)
+        import_policies = (
+            effective.get((PolicyDirectionChoices.DIRECTION_IMPORT, PolicySourceChoices.SOURCE_SESSION))
+            or effective.get((PolicyDirectionChoices.DIRECTION_IMPORT, PolicySourceChoices.SOURCE_PEER_GROUP), [])
+        )
+        export_policies = (
+            effective.get((PolicyDirectionChoices.DIRECTION_EXPORT, PolicySourceChoices.SOURCE_SESSION))
+            or effective.get((PolicyDirectionChoices.DIRECTION_EXPORT, PolicySourceChoices.SOURCE_PEER_GROUP), [])
+        )
 
         import_policies_table = tables.RoutingPolicyTable(
-            import_policies_qs,
+            import_policies,
             orderable=False
         )
         export_policies_table = tables.RoutingPolicyTable(
-            export_policies_qs,
+            export_policies,
             orderable=False
         )
 
@@ -246,15 +282,10 @@ class RoutingPolicyView(generic.ObjectView):
     template_name = 'netbox_bgp/routingpolicy.html'
 
     def get_extra_context(self, request, instance):
-        sess = BGPSession.objects.filter(
-            Q(import_policies=instance)
-            | Q(export_policies=instance)
-            | Q(peer_group__in=instance.group_import_policies.all())
-            | Q(peer_group__in=instance.group_export_policies.all())
-        )
-        sess = sess.distinct()
+        sess = BGPSession.objects.restrict(request.user, 'view').using_policy(instance)
         sess_table = tables.BGPSessionTable(sess)
-        rules = instance.rules.all()
+        sess_table.configure(request)
+        rules = instance.rules.select_related('routing_policy').prefetch_match_statements()
         rules_table = tables.RoutingPolicyRuleTable(rules)
         return {
             'rules_table': rules_table,
@@ -267,7 +298,7 @@ class RoutingPolicyDeleteView(generic.ObjectDeleteView):
     default_return_url = 'plugins:netbox_bgp:routingpolicy_list'
 
 @register_model_view(RoutingPolicy, "bulk_import", path="import", detail=False)
-class RoutingPolicyBulkImportView(generic.BulkImportView):
+class RoutingPolicyBulkImportView(BackgroundImportMixin, generic.BulkImportView):
     queryset = RoutingPolicy.objects.all()
     model_form = forms.RoutingPolicyImportForm
 
@@ -319,7 +350,7 @@ class RoutingPolicyRuleView(generic.ObjectView):
 
 
 @register_model_view(RoutingPolicyRule, "bulk_import", path="import", detail=False)
-class RoutingPolicyRuleImportView(generic.BulkImportView):
+class RoutingPolicyRuleImportView(BackgroundImportMixin, generic.BulkImportView):
     queryset = RoutingPolicyRule.objects.all()
     model_form = forms.RoutingPolicyRuleImportForm
 
@@ -373,7 +404,7 @@ class BGPPeerGroupDeleteView(generic.ObjectDeleteView):
     default_return_url = 'plugins:netbox_bgp:bgppeergroup_list'
 
 @register_model_view(BGPPeerGroup, "bulk_import", path="import", detail=False)
-class BGPPeerGroupBulkImportView(generic.BulkImportView):
+class BGPPeerGroupBulkImportView(BackgroundImportMixin, generic.BulkImportView):
     queryset = BGPPeerGroup.objects.all()
     model_form = forms.BGPPeerGroupImportForm
 
@@ -418,7 +449,7 @@ class PrefixListView(generic.ObjectView):
     template_name = 'netbox_bgp/prefixlist.html'
 
     def get_extra_context(self, request, instance):
-        rprules = instance.plrules.all()
+        rprules = instance.plrules.select_related('routing_policy').prefetch_match_statements()
         rprules_table = tables.RoutingPolicyRuleTable(rprules)
         rules = instance.prefrules.all()
         rules_table = tables.PrefixListRuleTable(rules)
@@ -437,7 +468,7 @@ class PrefixListDeleteView(generic.ObjectDeleteView):
     default_return_url = 'plugins:netbox_bgp:prefixlist_list'
 
 @register_model_view(PrefixList, "bulk_import", path="import", detail=False)
-class PrefixListBulkImportView(generic.BulkImportView):
+class PrefixListBulkImportView(BackgroundImportMixin, generic.BulkImportView):
     queryset = PrefixList.objects.all()
     model_form = forms.PrefixListImportForm
 
@@ -475,24 +506,34 @@ class PrefixListRuleView(generic.ObjectView):
 
 
 @register_model_view(PrefixListRule, "bulk_import", path="import", detail=False)
-class PrefixListRuleViewImportView(generic.BulkImportView):
+class PrefixListRuleViewImportView(BackgroundImportMixin, generic.BulkImportView):
     queryset = PrefixListRule.objects.all()
     model_form = forms.PrefixListRuleImportForm
 
 
-# Viewtab for Virtual Machine
+# Viewtabs for Devices and Virtual Machines
 
-@register_model_view(VirtualMachine, name='bgpsessions', path='bgpsessions')
-class VMBGPSessionView(generic.ObjectChildrenView):
-    queryset = VirtualMachine.objects.all().prefetch_related('bgpsession_set')
+class BGPSessionChildrenView(generic.ObjectChildrenView):
     child_model = BGPSession
     table = tables.BGPSessionTable
     template_name = "generic/object_children.html"
     tab = ViewTab(
         label='BGP Sessions',
-        badge=lambda obj:  obj.bgpsession_set.count(),
-        hide_if_empty = True
+        badge=lambda obj: sum(get_session_counts(obj).values()),
+        hide_if_empty=True
     )
 
     def get_children(self, request, parent):
-        return parent.bgpsession_set.all()
+        return BGPSession.objects.restrict(request.user, 'view').filter(
+            **{parent._meta.model_name: parent}
+        )
+
+
+@register_model_view(Device, name='bgpsessions', path='bgpsessions')
+class DeviceBGPSessionView(BGPSessionChildrenView):
+    queryset = Device.objects.all()
+
+
+@register_model_view(VirtualMachine, name='bgpsessions', path='bgpsessions')
+class VMBGPSessionView(BGPSessionChildrenView):
+    queryset = VirtualMachine.objects.all()